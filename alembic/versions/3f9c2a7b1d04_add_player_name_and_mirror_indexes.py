@@ -0,0 +1,89 @@
+"""add player name and mirror indexes
+
+Columns and indexes added to tables that databases created by an earlier
+version of the bot already have. Tables that don't exist yet are left to
+Base.metadata.create_all, which creates them complete
+
+Revision ID: 3f9c2a7b1d04
+Revises:
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7b1d04"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = {
+    # linked player names are searchable, see the patreon_member_fts triggers
+    "player": [sa.Column("name", sa.String(), nullable=True)],
+    # resuming an interrupted full sync
+    "patreon_sync_state": [
+        sa.Column("resume_cursor", sa.String(), nullable=True),
+        sa.Column("resume_started_at", sa.DateTime(), nullable=True),
+    ],
+}
+
+PLEDGE_TABLE = "patreon_pledge_event_mirror"
+# a member's pledge history newest first is a range scan of this index
+PLEDGE_INDEX = "pledge_event_member_date"
+OLD_PLEDGE_INDEX = "ix_patreon_pledge_event_mirror_member_id"
+
+
+def _columns(inspector, table: str) -> set[str] | None:
+    if not inspector.has_table(table):
+        return None
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def _indexes(inspector, table: str) -> set[str]:
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    for table, columns in COLUMNS.items():
+        existing = _columns(inspector, table)
+        if existing is None:
+            continue
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+    if inspector.has_table(PLEDGE_TABLE):
+        indexes = _indexes(inspector, PLEDGE_TABLE)
+        if PLEDGE_INDEX not in indexes:
+            op.create_index(
+                PLEDGE_INDEX, PLEDGE_TABLE, ["member_id", sa.text("date DESC")]
+            )
+        if OLD_PLEDGE_INDEX in indexes:
+            op.drop_index(OLD_PLEDGE_INDEX, table_name=PLEDGE_TABLE)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if inspector.has_table(PLEDGE_TABLE):
+        indexes = _indexes(inspector, PLEDGE_TABLE)
+        if OLD_PLEDGE_INDEX not in indexes:
+            op.create_index(OLD_PLEDGE_INDEX, PLEDGE_TABLE, ["member_id"])
+        if PLEDGE_INDEX in indexes:
+            op.drop_index(PLEDGE_INDEX, table_name=PLEDGE_TABLE)
+
+    for table, columns in COLUMNS.items():
+        existing = _columns(inspector, table)
+        if existing is None:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                if column.name in existing:
+                    batch_op.drop_column(column.name)
@@ -0,0 +1,144 @@
+"""Compare the payload size and parse time of each FieldProfile
+
+Patreon is emulated by trimming a response built from the real samples down
+to what each profile asks for, the way the API applies sparse fieldsets.
+"legacy" is everything the bot used to ask for
+
+python -m benchmarks.field_profiles
+"""
+
+import copy
+import json
+import timeit
+from pathlib import Path
+
+from hll_patreon_bot.integrations.patreon.constants import FIELD_PROFILES, FieldProfile
+from hll_patreon_bot.integrations.patreon.parsers import parse_campaign_members_page
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+MEMBERS = 500
+PLEDGES_PER_MEMBER = 6
+
+LEGACY_PARAMS = {
+    "include": "campaign,address,currently_entitled_tiers,user,pledge_history",
+    "fields[campaign]": "url,image_url,show_earnings,discord_server_id,thanks_embed,pledge_url,thanks_msg,image_small_url,google_analytics_id,pay_per_name,is_nsfw,main_video_url,published_at,one_liner,thanks_video_url,is_charged_immediately,creation_name,has_sent_rss_notify,has_rss,rss_feed_title,main_video_embed,summary,rss_artwork_url,is_monthly,vanity,created_at,patron_count",
+    "fields[member]": "full_name,email,next_charge_date,last_charge_status,last_charge_date,pledge_cadence,note,will_pay_amount_cents,lifetime_support_cents,pledge_relationship_start,campaign_lifetime_support_cents,currently_entitled_amount_cents,is_follower,patron_status",
+    "fields[tier]": "url,image_url,unpublished_at,title,amount_cents,description,requires_shipping,edited_at,user_limit,published_at,created_at,post_count,patron_count,remaining,discord_role_ids",
+    "fields[address]": "phone_number,state,line_1,line_2,country,postal_code,addressee,city,created_at",
+    "fields[user]": "url,full_name,image_url,first_name,email,thumb_url,about,can_see_nsfw,hide_pledges,is_email_verified,like_count,vanity,social_connections,last_name,created",
+    "fields[pledge-event]": "payment_status,type,date,currency_code,tier_id,amount_cents,tier_title",
+}
+
+
+def resources() -> tuple[list[dict], dict[tuple[str, str], dict]]:
+    """Every member of a campaign with every field Patreon could send"""
+    sample = json.loads((SAMPLE_DATA / "members-update-real.json").read_bytes())
+    included = {obj["type"]: obj for obj in sample["included"]}
+    campaign, tier, user = included["campaign"], included["tier"], included["user"]
+
+    members, everything = [], {
+        ("campaign", campaign["id"]): campaign,
+        ("tier", tier["id"]): tier,
+    }
+    for idx in range(MEMBERS):
+        member = copy.deepcopy(sample["data"])
+        member["id"] = f"member-{idx}"
+        relationships = {
+            "campaign": {"data": {"id": campaign["id"], "type": "campaign"}},
+            "currently_entitled_tiers": {"data": [{"id": tier["id"], "type": "tier"}]},
+            "user": {"data": {"id": f"user-{idx}", "type": "user"}},
+            "address": {"data": {"id": f"address-{idx}", "type": "address"}},
+            "pledge_history": {"data": []},
+        }
+        everything["user", f"user-{idx}"] = dict(user, id=f"user-{idx}")
+        everything["address", f"address-{idx}"] = {
+            "type": "address",
+            "id": f"address-{idx}",
+            "attributes": {
+                "addressee": "A Patron",
+                "line_1": "1 Some Street",
+                "line_2": None,
+                "city": "Some City",
+                "state": None,
+                "postal_code": "12345",
+                "country": "US",
+                "phone_number": None,
+                "created_at": "2024-01-01T00:00:00.000+00:00",
+            },
+        }
+        for pledge in range(PLEDGES_PER_MEMBER):
+            pledge_id = f"subscription:{idx}{pledge}"
+            relationships["pledge_history"]["data"].append(
+                {"id": pledge_id, "type": "pledge-event"}
+            )
+            everything["pledge-event", pledge_id] = {
+                "type": "pledge-event",
+                "id": pledge_id,
+                "attributes": {
+                    "amount_cents": 500,
+                    "currency_code": "USD",
+                    "date": f"2024-01-{pledge + 1:02}T00:00:00.000+00:00",
+                    "payment_status": "Paid",
+                    "tier_id": tier["id"],
+                    "tier_title": tier["attributes"]["title"],
+                    "type": "subscription",
+                },
+            }
+        member["relationships"] = relationships
+        members.append(member)
+
+    return members, everything
+
+
+def sparse(resource: dict, params: dict[str, str]) -> dict:
+    fields = params.get(f"fields[{resource['type']}]")
+    if fields is None:
+        return resource
+    wanted = fields.split(",")
+    attributes = {k: v for k, v in resource["attributes"].items() if k in wanted}
+    return dict(resource, attributes=attributes)
+
+
+def response(
+    members: list[dict], everything: dict[tuple[str, str], dict], params: dict
+) -> bytes:
+    """What Patreon would send back for `params`"""
+    includes = params.get("include", "").split(",")
+    data, included = [], {}
+    for member in members:
+        relationships = {
+            name: rel
+            for name, rel in member["relationships"].items()
+            if name in includes
+        }
+        data.append(dict(sparse(member, params), relationships=relationships))
+        for rel in relationships.values():
+            refs = rel["data"] if isinstance(rel["data"], list) else [rel["data"]]
+            for ref in refs:
+                key = (ref["type"], ref["id"])
+                included[key] = sparse(everything[key], params)
+
+    doc = {"data": data, "included": list(included.values()), "links": {"next": None}}
+    return json.dumps(doc).encode()
+
+
+def main():
+    members, everything = resources()
+    profiles = {"legacy": LEGACY_PARAMS} | {
+        profile.name: FIELD_PROFILES[profile] for profile in FieldProfile
+    }
+
+    legacy = None
+    print(f"page of {MEMBERS} members with {PLEDGES_PER_MEMBER} pledge events each")
+    for name, params in profiles.items():
+        body = response(members, everything, params)
+        parse = timeit.timeit(lambda: parse_campaign_members_page(body), number=20) / 20
+        legacy = legacy or (len(body), parse)
+        print(
+            f"  {name:>6}: {len(body) / 1024:7.0f} KB ({len(body) / legacy[0]:4.0%}), "
+            f"parse {parse * 1000:6.1f}ms ({parse / legacy[1]:4.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
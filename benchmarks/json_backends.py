@@ -0,0 +1,56 @@
+"""Compare JSON backends decoding/encoding the sample webhook payloads
+
+python -m benchmarks.json_backends
+"""
+
+import json
+import timeit
+from pathlib import Path
+
+from hll_patreon_bot import serialization
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+
+
+def campaign_page(sample: dict, members: int = 100) -> dict:
+    """Approximate a full campaign members page from a single webhook"""
+    return {
+        "data": [sample["data"]] * members,
+        "included": sample.get("included", []) * members,
+        "links": {"next": "https://www.patreon.com/api/oauth2/v2/..."},
+    }
+
+
+def bench(name: str, body: bytes, number: int) -> None:
+    data = json.loads(body)
+    results = {
+        "json.loads": timeit.timeit(lambda: json.loads(body), number=number),
+        "json.dumps": timeit.timeit(lambda: json.dumps(data), number=number),
+        "msgspec.loads": timeit.timeit(
+            lambda: serialization.loads(body), number=number
+        ),
+        "msgspec.dumps": timeit.timeit(
+            lambda: serialization.dumps(data), number=number
+        ),
+    }
+
+    per_call = ", ".join(
+        f"{k} {v / number * 1_000_000:.1f}us" for k, v in results.items()
+    )
+    print(f"{name} ({len(body) / 1024:.0f} KB): {per_call}")
+    print(
+        f"    loads {results['json.loads'] / results['msgspec.loads']:.1f}x faster, "
+        f"dumps {results['json.dumps'] / results['msgspec.dumps']:.1f}x faster"
+    )
+
+
+def main():
+    for path in sorted(SAMPLE_DATA.glob("*.json")):
+        bench(path.name, path.read_bytes(), number=2_000)
+
+    sample = json.loads((SAMPLE_DATA / "members-pledge-create-real.json").read_bytes())
+    bench("campaign page", json.dumps(campaign_page(sample)).encode(), number=200)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Memory held by campaign members and VIPs as the structs in types.py vs.
+the dicts and pydantic models they replaced
+
+python -m benchmarks.memory
+"""
+
+import gc
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pydantic
+
+from hll_patreon_bot.integrations.crcon.types import VIP_IDS, VipPlayer
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatreonMember,
+    PatronStatus,
+    PledgeEventType,
+    PledgeHistory,
+)
+from hll_patreon_bot.serialization import dumps, loads
+
+PLEDGES = 6
+TIERS = ("4145981", "4145983", "4145984")
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+class LegacyVipPlayer(pydantic.BaseModel):
+    name: str
+    player_id: str
+    expiration_date: datetime | None
+
+
+def legacy_member(idx: int) -> dict:
+    return {
+        "id": f"member-{idx}",
+        "name": f"Patron {idx}",
+        "email": f"patron{idx}@example.com",
+        "currently_entitled_amount_cents": 500,
+        "last_charge_date": START + timedelta(days=idx % 365),
+        "last_charge_status": ChargeStatus.paid,
+        "next_charge_date": START + timedelta(days=idx % 365 + 30),
+        "patron_status": PatronStatus.active_patron,
+        "discord_user_id": 10**17 + idx,
+        "note": "",
+        "user_id": f"user-{idx}",
+        "thumb_url": f"https://c8.patreon.com/{idx}.png",
+        "pledge_ids": {f"subscription:{idx}:{n}" for n in range(PLEDGES)},
+        "pledge_history": [
+            {
+                "id": f"subscription:{idx}:{n}",
+                "type": PledgeEventType.subscription,
+                "amount_cents": 500,
+                "date": START + timedelta(days=30 * n),
+                "status": ChargeStatus.paid,
+                # a fresh string per pledge, like decoding it from a response
+                "tier_id": "".join(TIERS[n % len(TIERS)]),
+            }
+            for n in range(PLEDGES)
+        ],
+    }
+
+
+def member(idx: int) -> PatreonMember:
+    return PatreonMember(
+        id=f"member-{idx}",
+        name=f"Patron {idx}",
+        email=f"patron{idx}@example.com",
+        currently_entitled_amount_cents=500,
+        last_charge_date=START + timedelta(days=idx % 365),
+        last_charge_status=ChargeStatus.paid,
+        next_charge_date=START + timedelta(days=idx % 365 + 30),
+        patron_status=PatronStatus.active_patron,
+        discord_user_id=10**17 + idx,
+        note="",
+        user_id=f"user-{idx}",
+        thumb_url=f"https://c8.patreon.com/{idx}.png",
+        pledge_ids={f"subscription:{idx}:{n}" for n in range(PLEDGES)},
+        pledge_history=[
+            PledgeHistory(
+                id=f"subscription:{idx}:{n}",
+                type=PledgeEventType.subscription,
+                amount_cents=500,
+                date=START + timedelta(days=30 * n),
+                status=ChargeStatus.paid,
+                # interned by the parsers
+                tier_id=TIERS[n % len(TIERS)],
+            )
+            for n in range(PLEDGES)
+        ],
+    )
+
+
+def vip_ids(count: int) -> bytes:
+    return dumps(
+        {
+            "result": [
+                {
+                    "player_id": str(76561198000000000 + idx),
+                    "name": f"Player {idx}",
+                    "vip_expiration": "2024-03-01T00:00:00+00:00",
+                }
+                for idx in range(count)
+            ]
+        }
+    )
+
+
+def legacy_vips(body: bytes) -> dict:
+    return {
+        vip["player_id"]: LegacyVipPlayer(
+            player_id=vip["player_id"],
+            name=vip["name"],
+            expiration_date=vip["vip_expiration"],
+        )
+        for vip in loads(body)["result"]
+    }
+
+
+def vips(body: bytes) -> dict[str, VipPlayer]:
+    return {vip.player_id: vip for vip in VIP_IDS.decode(body).result}
+
+
+def held(build) -> int:
+    """Bytes still allocated by whatever `build` returns"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def report(name: str, before: int, after: int) -> None:
+    print(
+        f"  {name}: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB "
+        f"({after / before:.0%})"
+    )
+
+
+def main():
+    for count in (10_000, 100_000):
+        print(f"{count} members, {PLEDGES} pledge events each / {count} VIPs")
+        report(
+            "members",
+            held(lambda: [legacy_member(idx) for idx in range(count)]),
+            held(lambda: [member(idx) for idx in range(count)]),
+        )
+        body = vip_ids(count)
+        report("VIPs", held(lambda: legacy_vips(body)), held(lambda: vips(body)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Time crawling every campaign member page by page vs. with the next page prefetched
+
+Patreon is simulated with a fixed latency per request and the caller spends
+some time handling each page (like the mirror writing it to the database)
+
+python -m benchmarks.pagination
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from benchmarks.parsers import campaign_page, member_document
+from hll_patreon_bot.integrations.patreon.parsers import parse_campaign_members_page
+from hll_patreon_bot.integrations.patreon.patreon import iter_campaign_member_pages
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+URL = "https://patreon.test/campaigns/{campaign_id}/members"
+MEMBERS = 2_000
+LATENCY = 0.2
+# time the caller spends per member handling a page
+HANDLING = 0.0002
+
+
+def pages(template: dict, page_size: int, members: int = MEMBERS) -> dict[int, bytes]:
+    """Split a campaign page into pages of `page_size` by offset"""
+    included = {(obj["type"], obj["id"]): obj for obj in template["included"]}
+    bodies = {}
+    for offset in range(0, members, page_size):
+        data = template["data"][offset : offset + page_size]
+        refs = {
+            (ref["type"], ref["id"])
+            for member in data
+            for rel in member["relationships"].values()
+            for ref in (rel["data"] if isinstance(rel["data"], list) else [rel["data"]])
+            if ref
+        }
+        next_link = (
+            f"https://patreon.test/next?cursor={offset + page_size}"
+            if offset + page_size < members
+            else None
+        )
+        doc = {
+            "data": data,
+            "included": [included[ref] for ref in refs if ref in included],
+            "links": {"next": next_link},
+        }
+        bodies[offset] = json.dumps(doc).encode()
+    return bodies
+
+
+def client(bodies: dict[int, bytes]) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY)
+        return httpx.Response(
+            200, content=bodies[int(request.url.params.get("cursor", 0))]
+        )
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def sequential(client: httpx.AsyncClient, page_size: int) -> int:
+    """How get_campaign_members used to crawl"""
+    members = {}
+    next_link: str | None = URL.format(campaign_id=1)
+    while next_link:
+        res = await client.get(next_link, params={"page[count]": page_size})
+        page, next_link = parse_campaign_members_page(data=res.content)
+        members |= page
+        await asyncio.sleep(len(page) * HANDLING)
+    return len(members)
+
+
+async def pipelined(client: httpx.AsyncClient, page_size: int) -> int:
+    members = {}
+    async for page, _ in iter_campaign_member_pages(
+        client=client, url=URL, page_size=page_size
+    ):
+        members |= page
+        await asyncio.sleep(len(page) * HANDLING)
+    return len(members)
+
+
+def bench(crawl, bodies: dict[int, bytes], page_size: int) -> float:
+    start = time.perf_counter()
+    assert asyncio.run(crawl(client(bodies), page_size)) == MEMBERS
+    return time.perf_counter() - start
+
+
+def main():
+    logger.remove()
+    sample = json.loads((SAMPLE_DATA / "members-pledge-create-real.json").read_bytes())
+    template = campaign_page(member_document(sample), members=MEMBERS)
+
+    print(f"{MEMBERS} members, {LATENCY}s latency per request")
+    for page_size in (100, 500, 1000):
+        bodies = pages(template, page_size)
+        before = bench(sequential, bodies, page_size)
+        after = bench(pipelined, bodies, page_size)
+        print(
+            f"  page[count]={page_size}: sequential {before:.2f}s, "
+            f"pipelined {after:.2f}s ({before / after:.2f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
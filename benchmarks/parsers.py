@@ -0,0 +1,108 @@
+"""Time the Patreon parsers decoding the raw body vs. an already decoded dict
+
+python -m benchmarks.parsers
+"""
+
+import copy
+import json
+import timeit
+from pathlib import Path
+
+from hll_patreon_bot import serialization
+from hll_patreon_bot.integrations.patreon.parsers import (
+    parse_campaign_members,
+    parse_member,
+)
+from hll_patreon_bot.patreon_webhook.utils import (
+    parse_patreon_member_webhook,
+    parse_patreon_pledge_webhook,
+)
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+
+
+def member_document(sample: dict) -> dict:
+    """Approximate a member endpoint response from a webhook"""
+    doc = copy.deepcopy(sample)
+    doc["data"]["attributes"] |= {"full_name": "Name", "note": ""}
+    doc["data"]["relationships"]["pledge_history"] = {
+        "data": [{"id": "subscription:1", "type": "pledge-event"}]
+    }
+    doc["included"].append(
+        {
+            "id": "subscription:1",
+            "type": "pledge-event",
+            "attributes": {
+                "amount_cents": 500,
+                "date": "2024-02-01T00:00:00.000+00:00",
+                "payment_status": "Paid",
+                "tier_id": "1",
+                "type": "subscription",
+            },
+        }
+    )
+    return doc
+
+
+def campaign_page(sample: dict, members: int = 100) -> dict:
+    """Approximate a full campaign members page from a member document"""
+    data, included = [], []
+    for idx in range(members):
+        doc = copy.deepcopy(sample)
+        doc["data"]["id"] = f"member-{idx}"
+        doc["data"]["relationships"]["user"] = {
+            "data": {"id": f"user-{idx}", "type": "user"}
+        }
+        doc["data"]["relationships"]["pledge_history"]["data"][0]["id"] += f"{idx}"
+        for obj in doc["included"]:
+            if obj["type"] == "user":
+                obj["id"] = f"user-{idx}"
+            elif obj["type"] == "pledge-event":
+                obj["id"] += f"{idx}"
+        data.append(doc["data"])
+        included.extend(doc["included"])
+
+    return {"data": data, "included": included, "links": {"next": None}}
+
+
+def bench(name: str, parser, body: bytes, number: int) -> None:
+    data = serialization.loads(body)
+    from_dict = timeit.timeit(lambda: parser(serialization.loads(body)), number=number)
+    from_bytes = timeit.timeit(lambda: parser(body), number=number)
+    # the parsers must not care which one they're handed
+    assert parser(data) == parser(body)
+
+    print(
+        f"{name} ({len(body) / 1024:.0f} KB): "
+        f"loads + parse {from_dict / number * 1_000_000:.1f}us, "
+        f"parse bytes {from_bytes / number * 1_000_000:.1f}us "
+        f"({from_dict / from_bytes:.1f}x faster)"
+    )
+
+
+def main():
+    for path in sorted(SAMPLE_DATA.glob("*-real.json")):
+        parser = (
+            parse_patreon_pledge_webhook
+            if path.name.startswith("members-pledge")
+            else parse_patreon_member_webhook
+        )
+        try:
+            parser(path.read_bytes())
+        except KeyError:
+            continue
+        bench(path.name, parser, path.read_bytes(), number=2_000)
+
+    sample = json.loads((SAMPLE_DATA / "members-pledge-create-real.json").read_bytes())
+    member = member_document(sample)
+    bench("member", parse_member, json.dumps(member).encode(), number=2_000)
+    bench(
+        "campaign page",
+        parse_campaign_members,
+        json.dumps(campaign_page(member)).encode(),
+        number=200,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Time searching campaign members through MemberIndex vs. scanning them all
+
+python -m benchmarks.search
+"""
+
+import random
+import string
+import timeit
+from datetime import datetime, timezone
+
+from hll_patreon_bot.integrations.patreon.search import MemberIndex
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatreonMember,
+    PatronStatus,
+)
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+def members(count: int, seed: int = 0) -> list[PatreonMember]:
+    rng = random.Random(seed)
+    return [
+        PatreonMember(
+            id=f"member-{idx}",
+            name=f"{word(rng).title()} {word(rng).title()}",
+            email=f"{word(rng)}{idx}@example.com",
+            currently_entitled_amount_cents=500,
+            last_charge_date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            last_charge_status=ChargeStatus.paid,
+            next_charge_date=None,
+            patron_status=PatronStatus.active_patron,
+            discord_user_id=rng.randrange(10**17, 10**18),
+            note=" ".join(word(rng) for _ in range(rng.randint(0, 8))),
+            user_id=None,
+            thumb_url=None,
+            pledge_ids=set(),
+            pledge_history=[],
+        )
+        for idx in range(count)
+    ]
+
+
+def bench(name: str, indexed, scan, number: int = 200) -> None:
+    indexed_time = timeit.timeit(indexed, number=number) / number
+    scan_time = timeit.timeit(scan, number=number) / number
+    print(
+        f"  {name}: index {indexed_time * 1_000_000:.1f}us, "
+        f"scan {scan_time * 1_000_000:.1f}us ({scan_time / indexed_time:.0f}x faster)"
+    )
+
+
+def main():
+    for count in (1_000, 10_000, 50_000):
+        population = members(count)
+        target = population[count // 2]
+
+        start = timeit.default_timer()
+        index = MemberIndex(population)
+        print(f"{count} members (indexed in {timeit.default_timer() - start:.2f}s)")
+
+        bench(
+            "email",
+            lambda: index.find_email(target.email),
+            lambda: next(m for m in population if m.email == target.email),
+        )
+        bench(
+            "discord id",
+            lambda: index.find_discord_user(target.discord_user_id),  # type: ignore
+            lambda: next(
+                m for m in population if m.discord_user_id == target.discord_user_id
+            ),
+        )
+        name = target.name.split()[0].lower()
+        bench(
+            "name",
+            lambda: index.search_name(name),
+            lambda: [m for m in population if name in m.name.lower()][:5],
+        )
+        note = (target.note or "xyz")[:6]
+        bench(
+            "notes",
+            lambda: index.search_notes(note),
+            lambda: [m for m in population if note in m.note][:5],
+        )
+        update = timeit.timeit(lambda: index.add(target), number=200) / 200
+        print(f"  update: {update * 1_000_000:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Peak memory of reading every campaign member with get_campaign_members vs.
+stream_campaign_members as the campaign grows
+
+python -m benchmarks.streaming
+"""
+
+import asyncio
+import json
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from benchmarks.pagination import pages
+from benchmarks.parsers import campaign_page, member_document
+from hll_patreon_bot.integrations.patreon.patreon import (
+    get_campaign_members,
+    stream_campaign_members,
+)
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+URL = "https://patreon.test/campaigns/{campaign_id}/members"
+PAGE_SIZE = 500
+
+
+def client(bodies: dict[int, bytes]) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, content=bodies[int(request.url.params.get("cursor", 0))]
+        )
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def growing(client: httpx.AsyncClient) -> int:
+    async for members in get_campaign_members(client=client, url=URL):
+        pass
+    return len(members)
+
+
+async def streaming(client: httpx.AsyncClient) -> int:
+    count = 0
+    async for _ in stream_campaign_members(client=client, url=URL, page_size=PAGE_SIZE):
+        count += 1
+    return count
+
+
+def peak(read, bodies: dict[int, bytes], members: int) -> int:
+    tracemalloc.start()
+    assert asyncio.run(read(client(bodies))) == members
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    logger.remove()
+    sample = json.loads((SAMPLE_DATA / "members-pledge-create-real.json").read_bytes())
+
+    print(f"peak memory, {PAGE_SIZE} members per page")
+    for members in (1_000, 4_000, 16_000):
+        template = campaign_page(member_document(sample), members=members)
+        bodies = pages(template, PAGE_SIZE, members=members)
+        del template
+        before = peak(growing, bodies, members)
+        after = peak(streaming, bodies, members)
+        print(
+            f"  {members} members: get_campaign_members {before / 1024:.0f} KB, "
+            f"stream_campaign_members {after / 1024:.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,13 @@ then
     mkdir ./logs
 fi
 
+# Bring databases created by an older version up to date before anything
+# imports the models (which creates any missing tables)
+if [ -d "./db_data" ]
+then
+    poetry run alembic upgrade head
+fi
+
 if [ "$1" == 'web_server' ] 
 then
     PYTHONPATH=hll_patreon_bot poetry run hypercorn --log-file /code/logs/webserver.log --bind 0.0.0.0:8888 hll_patreon_bot.patreon_webhook.webhook_listener:app
@@ -16,4 +23,9 @@ fi
 if [ "$1" ==  'discord_bot' ]
 then
     poetry run python -m hll_patreon_bot.bot.main
-fi
\ No newline at end of file
+fi
+if [ "$1" ==  'replay' ]
+then
+    shift
+    poetry run python -m hll_patreon_bot.patreon_webhook.replay "$@"
+fi
@@ -1,5 +1,4 @@
 from datetime import datetime, timezone
-from functools import cached_property
 from pprint import pprint
 
 import discord
@@ -8,12 +7,8 @@ from discord.commands import ApplicationContext
 from discord.ext import commands
 from loguru import logger
 
-from hll_patreon_bot.bot.constants import API_KEY_FORMAT, CRCON_API_KEY, CRCON_URL
-from hll_patreon_bot.bot.utils import (
-    discord_name_as_user,
-    raise_on_4xx_5xx,
-    with_permission,
-)
+from hll_patreon_bot.bot.constants import CRCON_URL
+from hll_patreon_bot.bot.utils import discord_name_as_user, with_permission
 from hll_patreon_bot.database.models import enter_session
 from hll_patreon_bot.database.utils import (
     get_primary_crcon_record,
@@ -22,6 +17,7 @@ from hll_patreon_bot.database.utils import (
     link_sponsored_crcon_to_discord,
     unlink_primary_crcon_from_discord,
 )
+from hll_patreon_bot.integrations.clients import CLIENTS
 from hll_patreon_bot.integrations.crcon import crcon
 from hll_patreon_bot.integrations.crcon.types import PlayerProfileType, ServerDetails
 
@@ -31,19 +27,17 @@ def create_crcon_player_embed(
 ) -> discord.Embed:
     embed = discord.Embed()
     embed.title = "CRCON Player Record"
-    embed.add_field(name="Player ID", value=player["player_id"])
-    embed.add_field(
-        name="Name:", value=player["names"][0]["name"] if player["names"] else ""
-    )
-    akas = ", ".join(p["name"] for p in player["names"][1:])
+    embed.add_field(name="Player ID", value=player.player_id)
+    embed.add_field(name="Name:", value=player.names[0].name if player.names else "")
+    akas = ", ".join(p.name for p in player.names[1:])
     embed.add_field(name="AKA: ", value=akas)
-    if player["vips"]:
-        for vip in player["vips"]:
-            server = server_details.get(str(vip["server_number"]), {})
+    if player.vips:
+        for vip in player.vips:
+            server = server_details.get(str(vip.server_number), {})
             if server:
                 embed.add_field(
                     name=f"VIP Status Server: {server.get('name')}",
-                    value=f"Expires <t:{int(datetime.fromisoformat(vip['expiration']).timestamp())}:f>",
+                    value=f"Expires <t:{int(datetime.fromisoformat(vip.expiration).timestamp())}:f>",
                     inline=False,
                 )
     embed.timestamp = datetime.now(tz=timezone.utc)
@@ -65,18 +59,21 @@ async def _fetch_crcon_player_record(
     return crcon_record
 
 
+def _player_name(crcon_record: PlayerProfileType | None) -> str | None:
+    if crcon_record and crcon_record.names:
+        return crcon_record.names[0].name
+    return None
+
+
 class Crcon(commands.Cog):
     def __init__(self, bot, crcon_url: str | None = None) -> None:
         super().__init__()
         self.bot = bot
         self.crcon_url = crcon_url or CRCON_URL
 
-    @cached_property
+    @property
     def client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(
-            headers={"Authorization": API_KEY_FORMAT.format(api_key=CRCON_API_KEY)},
-            event_hooks={"response": [raise_on_4xx_5xx]},
-        )
+        return CLIENTS.crcon
 
     @property
     async def server_details(self) -> dict[str, ServerDetails]:
@@ -116,7 +113,10 @@ class Crcon(commands.Cog):
         previous_linked_discord = None
         with enter_session() as session:
             previous_linked_discord = link_primary_crcon_to_discord(
-                session=session, player_id=player_id, discord_name=discord_user.name
+                session=session,
+                player_id=player_id,
+                discord_name=discord_user.name,
+                player_name=_player_name(crcon_record),
             )
 
         embed.title = "Primary"
@@ -203,7 +203,10 @@ class Crcon(commands.Cog):
 
         with enter_session() as session:
             previous_linked_discord = link_sponsored_crcon_to_discord(
-                session=session, discord_name=discord_user.name, player_id=player_id
+                session=session,
+                discord_name=discord_user.name,
+                player_id=player_id,
+                player_name=_player_name(crcon_record),
             )
 
         embed.description = f"Player ID `{player_id}` Linked to {discord_user.mention}"
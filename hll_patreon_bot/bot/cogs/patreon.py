@@ -2,23 +2,32 @@ import locale
 from datetime import datetime, timezone
 
 import discord
-import httpx
-from cachetools import TTLCache, cached, cachedmethod
 from discord.commands import ApplicationContext
 from discord.ext import commands
 from loguru import logger
 
-from hll_patreon_bot.bot.utils import discord_name_as_user, one_or_none, with_permission
+from hll_patreon_bot.bot.constants import PATREON_PAGE_SIZE
+from hll_patreon_bot.bot.utils import discord_name_as_user, with_permission
 from hll_patreon_bot.database.models import enter_session
 from hll_patreon_bot.database.utils import (
     get_set_discord_record,
     link_patreon_to_discord,
+    search_patreon_members,
     unlink_patreon_from_discord,
 )
+from hll_patreon_bot.integrations.clients import CLIENTS
+from hll_patreon_bot.integrations.patreon.constants import FieldProfile
+from hll_patreon_bot.integrations.patreon.mirror import (
+    MIRROR,
+    load_member,
+    load_member_synced_at,
+    store_member,
+)
 from hll_patreon_bot.integrations.patreon.patreon import (
-    get_campaign_members,
     get_member,
+    stream_campaign_members,
 )
+from hll_patreon_bot.integrations.patreon.search import MemberIndex
 from hll_patreon_bot.integrations.patreon.types import PatreonMember, PledgeHistory
 
 locale.setlocale(locale.LC_ALL, "")
@@ -30,9 +39,10 @@ def create_patreon_search_embed(
     discord_user: discord.User | None = None,
     name: str | None = None,
     notes: str | None = None,
+    anything: str | None = None,
 ):
     embed = discord.Embed()
-    embed.title = "Searching Patreon, this may take 5-10 seconds"
+    embed.title = "Searching Patreon"
     embed.add_field(
         name="Discord", value=discord_user.name if discord_user else "", inline=False
     )
@@ -42,6 +52,7 @@ def create_patreon_search_embed(
     )
     embed.add_field(name="Name", value=name if name else "", inline=False)
     embed.add_field(name="Notes", value=notes if notes else "", inline=False)
+    embed.add_field(name="Anything", value=anything if anything else "", inline=False)
 
     embed.timestamp = datetime.now(tz=timezone.utc)
     return embed
@@ -55,18 +66,18 @@ def create_pledge_history_embed(
     embed.title = "Pledge History (up to last 5)"
     for p in pledge_histories[:5]:
         embed.add_field(
-            name="Date:", value=f"<t:{int(p['date'].timestamp())}:f>", inline=True
+            name="Date:", value=f"<t:{int(p.date.timestamp())}:f>", inline=True
         )
         embed.add_field(
             name="Amount: ",
             value=(
-                locale.currency(p["amount_cents"] / 100, symbol=True, grouping=True)
+                locale.currency(p.amount_cents / 100, symbol=True, grouping=True)
                 if p
                 else ""
             ),
             inline=True,
         )
-        embed.add_field(name="Status", value=str(p["status"]), inline=True)
+        embed.add_field(name="Status", value=str(p.status), inline=True)
 
     embed.timestamp = datetime.now(tz=timezone.utc)
 
@@ -76,6 +87,7 @@ def create_pledge_history_embed(
 def create_patreon_embed(
     member: PatreonMember,
     discord_user: discord.User | None = None,
+    synced_at: datetime | None = None,
 ) -> discord.Embed:
     embed = discord.Embed()
 
@@ -85,35 +97,33 @@ def create_patreon_embed(
             value=f"{discord_user.mention}",
         )
 
-    embed.add_field(name="Patreon ID", value=member["id"], inline=False)
-    embed.add_field(name="Email", value=member["email"])
-    embed.add_field(name="Name", value=member["name"] if member["name"] else "")
+    embed.add_field(name="Patreon ID", value=member.id, inline=False)
+    embed.add_field(name="Email", value=member.email if member.email else "")
+    embed.add_field(name="Name", value=member.name if member.name else "")
     embed.add_field(
         name="Patron Status",
-        value=member["patron_status"].value if member["patron_status"].value else "",
+        value=member.patron_status.value if member.patron_status.value else "",
     )
     embed.add_field(
         name="Last Charge Status",
         value=(
-            member["last_charge_status"].value
-            if member["last_charge_status"].value
-            else ""
+            member.last_charge_status.value if member.last_charge_status.value else ""
         ),
         inline=False,
     )
     embed.add_field(
         name="Last Charge (or attempted charge) Date",
         value=(
-            f"<t:{int(member['last_charge_date'].timestamp())}:f>"
-            if member["last_charge_date"]
+            f"<t:{int(member.last_charge_date.timestamp())}:f>"
+            if member.last_charge_date
             else ""
         ),
     )
     embed.add_field(
         name="Next Charge Date",
         value=(
-            f"<t:{int(member['next_charge_date'].timestamp())}:f>"
-            if member["next_charge_date"]
+            f"<t:{int(member.next_charge_date.timestamp())}:f>"
+            if member.next_charge_date
             else ""
         ),
         inline=False,
@@ -122,21 +132,24 @@ def create_patreon_embed(
         name="Currently Entitled Amount",
         value=(
             locale.currency(
-                member["currently_entitled_amount_cents"] / 100,
+                member.currently_entitled_amount_cents / 100,
                 symbol=True,
                 grouping=True,
             )
         ),
     )
 
-    embed.add_field(
-        name="Patreon Notes", value=member["note"] if member["note"] else ""
-    )
+    embed.add_field(name="Patreon Notes", value=member.note if member.note else "")
 
-    if member["thumb_url"]:
-        embed.url = member["thumb_url"]
+    if member.thumb_url:
+        embed.url = member.thumb_url
 
-    embed.timestamp = datetime.now(tz=timezone.utc)
+    if synced_at:
+        # served from the local mirror rather than fetched from Patreon just now
+        embed.set_footer(text="Last synced from Patreon")
+        embed.timestamp = synced_at
+    else:
+        embed.timestamp = datetime.now(tz=timezone.utc)
 
     # TODO: Include payment history
 
@@ -150,17 +163,6 @@ class Patreon(commands.Cog):
         super().__init__()
         self.bot = bot
 
-    # TODO: Figure out how to cache these results
-    # @cachedmethod(operator.attrgetter("cache"))
-    async def fetch_members(self):
-        async with httpx.AsyncClient() as client:
-            # get_campaign_members yields successfully more populated dicts per page
-            # so we can just take the last value when we're getting everyone
-            async for members in get_campaign_members(client=client):
-                pass
-
-        return members
-
     @discord.slash_command(description="Show the user's status on Patreon")
     async def show_patreon(self, ctx: ApplicationContext, discord_user: discord.User):
         if not with_permission(ctx):
@@ -176,17 +178,32 @@ class Patreon(commands.Cog):
                     f"No Patreon account found for {discord_user.mention}"
                 )
             else:
-                async with httpx.AsyncClient() as client:
-                    patreon_member = await get_member(
-                        client=client, member_id=discord_record.patreon.patreon_id
+                patreon_id = discord_record.patreon.patreon_id
+                mirrored = load_member_synced_at(member_id=patreon_id, pledge_limit=5)
+                if mirrored is None:
+                    # never seen them before, fetch them once and mirror them
+                    fetched = await get_member(
+                        client=CLIENTS.patreon,
+                        member_id=patreon_id,
+                        profile=FieldProfile.full,
                     )
-
-                if patreon_member:
+                    if fetched:
+                        store_member(fetched)
+                        mirrored = load_member_synced_at(
+                            member_id=patreon_id, pledge_limit=5
+                        )
+
+                if mirrored:
+                    # this row's own freshness, a webhook may have updated it
+                    # since the last full sync
+                    patreon_member, synced_at = mirrored
                     patreon_embed = create_patreon_embed(
-                        member=patreon_member, discord_user=discord_user
+                        member=patreon_member,
+                        discord_user=discord_user,
+                        synced_at=synced_at,
                     )
                     pledge_embed = create_pledge_history_embed(
-                        pledge_histories=patreon_member["pledge_history"]
+                        pledge_histories=patreon_member.pledge_history
                     )
                     await ctx.respond(embeds=[patreon_embed, pledge_embed])
 
@@ -197,8 +214,10 @@ class Patreon(commands.Cog):
         if not with_permission(ctx):
             return
 
-        async with httpx.AsyncClient() as client:
-            patreon_member = await get_member(client=client, member_id=patreon_id)
+        # only checking the member exists
+        patreon_member = await get_member(
+            client=CLIENTS.patreon, member_id=patreon_id, profile=FieldProfile.vip
+        )
 
         if patreon_member is None:
             await ctx.respond(f"No Patreon account found for Patreon ID `{patreon_id}`")
@@ -260,6 +279,7 @@ class Patreon(commands.Cog):
         discord_user: discord.User | None,
         name: str | None,
         notes: str | None,
+        anything: str | None,
     ):
         if not with_permission(ctx):
             return
@@ -271,6 +291,7 @@ class Patreon(commands.Cog):
                 discord_user=discord_user,
                 name=name,
                 notes=notes,
+                anything=anything,
             )
         )
 
@@ -279,52 +300,64 @@ class Patreon(commands.Cog):
         found_discord_user: PatreonMember | None = None
         possible_names: list[PatreonMember] = []
         possible_notes: list[PatreonMember] = []
+        possible_matches: list[PatreonMember] = []
 
-        # members = await self.fetch_members()
-        async with httpx.AsyncClient() as client:
-            # get_campaign_members yields successfully more populated dicts per page
-            # so we can just take the last value when we're getting everyone
+        synced_at: datetime | None = None
+        if snapshot := MIRROR.snapshot():
+            index, synced_at = snapshot
+            await ctx.respond(
+                f"Searching {len(index)} members, last synced <t:{int(synced_at.timestamp())}:R>"
+            )
+        else:
+            # The mirror hasn't finished its first sync yet, fetch everyone
             msg: discord.WebhookMessage = await ctx.respond(f"Fetching members")
-            async for members in get_campaign_members(client=client):
-                await msg.edit(f"Fetching members ({len(members)} found so far)")
-                print(f"Fetching members ({len(members)} found so far)")
-
-        # TODO: do we have exactly 500 members? seems unlikely, are we being capped or what
-        # logger.warning(f"{json.dumps(members)}")
-        print(f"{len(members)=}")
-        for key, value in members.items():
-            # print(f"members[0]={value}")
-            break
+            index = MemberIndex()
+            async for member in stream_campaign_members(
+                client=CLIENTS.patreon, profile=FieldProfile.search
+            ):
+                index.add(member)
+                if len(index) % PATREON_PAGE_SIZE == 0:
+                    await msg.edit(f"Fetching members ({len(index)} found so far)")
 
         # https://www.patreon.com/api/pledge-events?filter[patron.id]=44516775&filter[escape_pagination]=true&include=subscription.null,pledge.campaign.null&fields[campaign]=pay_per_name&fields[subscription]=amount_cents&fields[pledge_event]=pledge_payment_status,payment_status,date,type,tier_title&fields[pledge]=amount_cents,currency,status,cadence&json-api-version=1.0&json-api-use-default-includes=false
         # https://www.patreon.com/api/members/cd68584c-cc42-4b3b-b7b7-1ea49b29df1a?include=reward%2Crecent_charges%2Cuser%2Crecent_charges.post%2Crecent_charges.campaign.null&fields[user]=full_name%2Cthumb_url%2Curl%2Cis_follower%2Cpatron_status&fields[campaign]=has_annual_pledge&fields[member]=pledge_relationship_start%2Cnote%2Ccan_be_messaged%2Cdiscord_vanity&fields[post]=title&fields[charge]=date%2Camount_cents%2Ccurrency%2Cstatus%2Cis_refundable%2Cpartial_annual_refund_data%2Cunderlying_charge_type%2Cunderlying_charge_id%2Csupported_period_start%2Csupported_period_end&json-api-use-default-includes=false&json-api-version=1.0
 
         if email:
-            found_email = one_or_none(lambda x: x["email"] == email, members.values())
+            found_email = index.find_email(email)
+            if found_email and snapshot is None:
+                # fetched with the search profile, which leaves out pledge
+                # history, fetch it for this one and mirror them like show_patreon
+                if member := await get_member(
+                    client=CLIENTS.patreon,
+                    member_id=found_email.id,
+                    profile=FieldProfile.full,
+                ):
+                    store_member(member)
+                    found_email = (
+                        load_member(member_id=member.id, pledge_limit=5) or member
+                    )
 
         if patreon_id:
-            found_patreon_id = members.get(patreon_id)
+            found_patreon_id = index.get(patreon_id)
 
         if discord_user:
-            for member in members.values():
-                if member["email"] == "eric58391@gmail.com":
-                    print(f"{member['email']} id={member['discord_user_id']}")
-            found_discord_user = one_or_none(
-                lambda x: x["discord_user_id"] == discord_user.id, members.values()
-            )
+            found_discord_user = index.find_discord_user(discord_user.id)
 
         if notes:
-            for member in members.values():
-                if notes in member["note"]:
-                    possible_notes.append(member)
-
-        name_chunks = name.split() if name else []
-        possible_names = list(
-            filter(
-                lambda x: any(chunk in x["name"] for chunk in name_chunks),
-                members.values(),
-            )
-        )
+            possible_notes = index.search_notes(notes, limit=5)
+
+        if name:
+            possible_names = index.search_name(name, limit=5)
+
+        if anything:
+            # typo tolerant search of names, emails, notes and player names
+            with enter_session() as session:
+                matches = search_patreon_members(
+                    session=session, query=anything, limit=5
+                )
+                possible_matches = [
+                    member for m in matches if (member := index.get(m.member_id))
+                ]
 
         # TODO: include pledge history again
         if found_email:
@@ -351,32 +384,44 @@ class Patreon(commands.Cog):
 
             await ctx.respond(
                 embeds=[
-                    create_patreon_embed(found_email),
+                    create_patreon_embed(found_email, synced_at=synced_at),
                     create_pledge_history_embed(
-                        pledge_histories=found_email["pledge_history"]
+                        pledge_histories=found_email.pledge_history
                     ),
                 ]
             )
         elif found_patreon_id:
-            await ctx.respond(embed=create_patreon_embed(found_patreon_id))
+            await ctx.respond(
+                embed=create_patreon_embed(found_patreon_id, synced_at=synced_at)
+            )
         elif found_discord_user:
             user = discord.utils.get(
-                ctx.guild.members, id=found_discord_user["discord_user_id"]
+                ctx.guild.members, id=found_discord_user.discord_user_id
             )
             await ctx.respond(
-                embed=create_patreon_embed(found_discord_user, discord_user=user)
+                embed=create_patreon_embed(
+                    found_discord_user, discord_user=user, synced_at=synced_at
+                )
             )
+        elif possible_matches:
+            await ctx.respond(f"Showing up to 5 best matches:")
+            for match in possible_matches:
+                await ctx.respond(
+                    embed=create_patreon_embed(match, synced_at=synced_at)
+                )
         elif possible_names:
             await ctx.respond(f"Showing up to 5 matches by name: ")
             for poss_name in possible_names:
-                await ctx.respond(embed=create_patreon_embed(poss_name))
+                await ctx.respond(
+                    embed=create_patreon_embed(poss_name, synced_at=synced_at)
+                )
         elif possible_notes:
             await ctx.respond(f"Showing up to 5 matches by notes:")
             for note in possible_notes:
-                await ctx.respond(embed=create_patreon_embed(note))
+                await ctx.respond(embed=create_patreon_embed(note, synced_at=synced_at))
         else:
             await ctx.respond(
-                f"No patreon member (searched {len(members)} members) found."
+                f"No patreon member (searched {len(index)} members) found."
             )
 
 
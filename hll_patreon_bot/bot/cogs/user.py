@@ -1,5 +1,3 @@
-from functools import cached_property
-
 import discord
 import httpx
 from discord.commands import ApplicationContext
@@ -7,19 +5,15 @@ from discord.ext import commands
 from loguru import logger
 
 from hll_patreon_bot.bot.cogs.crcon import create_crcon_player_embed
-from hll_patreon_bot.bot.constants import (
-    API_KEY_FORMAT,
-    CRCON_API_KEY,
-    EMPTY_EMBED_FIELD,
-)
+from hll_patreon_bot.bot.constants import EMPTY_EMBED_FIELD
 from hll_patreon_bot.bot.utils import (
     add_blank_embed_field,
     discord_name_as_user,
-    raise_on_4xx_5xx,
     with_permission,
 )
 from hll_patreon_bot.database.models import DiscordPlayers, enter_session
 from hll_patreon_bot.database.utils import get_set_discord_record
+from hll_patreon_bot.integrations.clients import CLIENTS
 from hll_patreon_bot.integrations.crcon import crcon
 from hll_patreon_bot.integrations.crcon.crcon import fetch_players
 from hll_patreon_bot.integrations.crcon.types import PlayerProfileType, ServerDetails
@@ -51,7 +45,7 @@ def create_status_embed(
         )
         embed.add_field(
             name="Your Player Name" if own_status else "Primary Player Name",
-            value=player_profiles[p.player.player_id]["names"][0]["name"],
+            value=player_profiles[p.player.player_id].names[0].name,
             inline=False,
         )
         # TODO: Include expiration dates somehow
@@ -81,7 +75,7 @@ def create_status_embed(
         )
         embed.add_field(
             name="Player Name",
-            value=player_profiles[p.player.player_id]["names"][0]["name"],
+            value=player_profiles[p.player.player_id].names[0].name,
             inline=False,
         )
 
@@ -93,12 +87,9 @@ class User(commands.Cog):
         super().__init__()
         self.bot = bot
 
-    @cached_property
+    @property
     def client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(
-            headers={"Authorization": API_KEY_FORMAT.format(api_key=CRCON_API_KEY)},
-            event_hooks={"response": [raise_on_4xx_5xx]},
-        )
+        return CLIENTS.crcon
 
     @property
     async def server_details(self) -> dict[str, ServerDetails]:
@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+import discord
+from discord.commands import ApplicationContext
+from discord.ext import commands
+
+from hll_patreon_bot.bot.utils import with_permission
+from hll_patreon_bot.database.models import WebhookDeadLetter, enter_session
+from hll_patreon_bot.database.utils import (
+    get_webhook_dead_letters,
+    requeue_webhook_dead_letters,
+)
+
+# Discord allows at most 25 fields per embed
+MAX_DEAD_LETTERS_SHOWN = 25
+
+
+def create_dead_letters_embed(dead_letters: list[WebhookDeadLetter]) -> discord.Embed:
+    embed = discord.Embed()
+    embed.title = "Failed Webhook Actions"
+    if not dead_letters:
+        embed.description = "No dead letters"
+
+    for dead_letter in dead_letters[:MAX_DEAD_LETTERS_SHOWN]:
+        # sqlite hands back naive UTC timestamps
+        failed_at = dead_letter.failed_at.replace(tzinfo=timezone.utc)
+        error = (dead_letter.error or "")[:200]
+        embed.add_field(
+            name=f"#{dead_letter.id} Patreon ID {dead_letter.member_id}",
+            value=f"{dead_letter.attempts} attempts, last failed <t:{int(failed_at.timestamp())}:R>\n`{error}`",
+            inline=False,
+        )
+
+    embed.timestamp = datetime.now(tz=timezone.utc)
+    return embed
+
+
+class Webhook(commands.Cog):
+    def __init__(self, bot) -> None:
+        super().__init__()
+        self.bot = bot
+
+    @discord.slash_command(
+        description="List Patreon webhook actions that ran out of retries"
+    )
+    async def list_dead_letters(
+        self, ctx: ApplicationContext, limit: int = MAX_DEAD_LETTERS_SHOWN
+    ):
+        if not with_permission(ctx):
+            return
+
+        with enter_session() as session:
+            dead_letters = get_webhook_dead_letters(
+                session=session, limit=min(limit, MAX_DEAD_LETTERS_SHOWN)
+            )
+            embed = create_dead_letters_embed(dead_letters)
+
+        await ctx.respond(embed=embed)
+
+    @discord.slash_command(
+        description="Retry failed Patreon webhook actions (comma separated IDs, all if empty)"
+    )
+    async def retry_dead_letters(
+        self, ctx: ApplicationContext, dead_letter_ids: str | None = None
+    ):
+        if not with_permission(ctx):
+            return
+
+        ids: list[int] | None = None
+        if dead_letter_ids:
+            try:
+                ids = [int(id_.strip()) for id_ in dead_letter_ids.split(",")]
+            except ValueError:
+                await ctx.respond(f"Invalid dead letter IDs `{dead_letter_ids}`")
+                return
+
+        # The webhook listener picks these up on its next retry poll
+        with enter_session() as session:
+            retry_ids = requeue_webhook_dead_letters(
+                session=session, dead_letter_ids=ids
+            )
+
+        await ctx.respond(f"Requeued {len(retry_ids)} failed webhook actions")
+
+
+def setup(bot):  # this is called by Pycord to setup the cog
+    bot.add_cog(Webhook(bot))  # add the cog to the bot
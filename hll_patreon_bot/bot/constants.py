@@ -21,6 +21,31 @@ AUTHORIZED_DISCORD_ROLES = DISCORD_ADMIN_ROLE_IDS.split(",")
 PATREON_ACCESS_TOKEN = os.getenv("PATREON_ACCESS_TOKEN", "")
 PATREON_HOST_NAME = os.getenv("PATREON_HOST_NAME", "")
 PATREON_CAMPAIGN_ID = os.getenv("PATREON_CAMPAIGN_ID", "")
+PATREON_WEBHOOK_SECRET = os.getenv("PATREON_WEBHOOK_SECRET", "")
+# Seconds between full syncs of the local Patreon member mirror
+PATREON_SYNC_INTERVAL = float(os.getenv("PATREON_SYNC_INTERVAL", 3600))
+# Seconds between catching the bot's in memory member snapshot up with the
+# mirror (picks up webhooks between full syncs)
+PATREON_SNAPSHOT_INTERVAL = float(os.getenv("PATREON_SNAPSHOT_INTERVAL", 60))
+# Members per page when listing the campaign members, Patreon allows up to 1000
+PATREON_PAGE_SIZE = int(os.getenv("PATREON_PAGE_SIZE", 500))
+
+# Outbound HTTP connection pools shared by every CRCON/Patreon/Discord call
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2 = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+# Bodies kept (per client) to revalidate GETs with ETag/Last-Modified instead of
+# downloading them again
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+CRCON_TIMEOUT = float(os.getenv("CRCON_TIMEOUT", 10))
+PATREON_TIMEOUT = float(os.getenv("PATREON_TIMEOUT", 30))
+DISCORD_TIMEOUT = float(os.getenv("DISCORD_TIMEOUT", 10))
+# Requests per second (with bursts of up to PATREON_RATE_BURST) shared by every
+# Patreon API call, throttled (429) requests are retried up to PATREON_MAX_RETRIES
+PATREON_RATE_LIMIT = float(os.getenv("PATREON_RATE_LIMIT", 5))
+PATREON_RATE_BURST = int(os.getenv("PATREON_RATE_BURST", 10))
+PATREON_MAX_RETRIES = int(os.getenv("PATREON_MAX_RETRIES", 3))
 
 CRCON_SUCCESS = "SUCCESS"
 
@@ -7,6 +7,8 @@ import discord
 from loguru import logger
 
 from ..database.models import engine
+from ..integrations.clients import CLIENTS
+from ..integrations.patreon.mirror import MIRROR
 from .constants import (
     API_KEY_FORMAT,
     CRCON_API_KEY,
@@ -74,13 +76,21 @@ headers = {"Authorization": API_KEY_FORMAT.format(api_key=CRCON_API_KEY)}
 async def on_ready():
     logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")  # type: ignore
     logger.info("------")
+    await MIRROR.warm()
 
 
 async def main():
-    pass
+    load_all_cogs()
+    await CLIENTS.start()
+    await MIRROR.start()
+    try:
+        await bot.start(DISCORD_BOT_TOKEN)
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        await MIRROR.stop()
+        await CLIENTS.aclose()
 
 
 if __name__ == "__main__":
     asyncio.run(main())
-    load_all_cogs()
-    bot.run(DISCORD_BOT_TOKEN)
@@ -1,13 +1,28 @@
+import enum
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from typing import Any, Generator, Optional
 
 import sqlalchemy.orm.exc
 from loguru import logger
-from sqlalchemy import CheckConstraint, Column, ForeignKey, Index, Table, create_engine
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    ForeignKey,
+    Index,
+    Table,
+    create_engine,
+    text,
+)
 from sqlalchemy.event import listens_for
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship
 
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatronStatus,
+    PledgeEventType,
+)
+
 engine = create_engine("sqlite:///file:db_data/db.sqlite?mode=rwc&uri=true", echo=True)
 
 
@@ -109,6 +124,8 @@ class Player(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     player_id: Mapped[str] = mapped_column(unique=True)
+    # most recent name CRCON knew the player by when they were linked
+    name: Mapped[str | None]
     created_at: Mapped[datetime] = mapped_column(default=datetime.now(tz=timezone.utc))
     modified_at: Mapped[datetime] = mapped_column(
         default=datetime.now(tz=timezone.utc),
@@ -120,7 +137,10 @@ class Player(Base):
     def __repr__(self) -> str:
         return self._repr(
             fields=dict(
-                id=self.id, player_id=self.player_id, num_discords=len(self.discords)
+                id=self.id,
+                player_id=self.player_id,
+                name=self.name,
+                num_discords=len(self.discords),
             )
         )
 
@@ -149,6 +169,319 @@ class Patreon(Base):
         )
 
 
+class WebhookStatus(enum.Enum):
+    received = "received"
+    processed = "processed"
+    failed = "failed"
+
+
+class WebhookEvent(Base):
+    """Append only journal of every accepted Patreon webhook
+
+    The raw body is kept as received so events can be replayed later
+    """
+
+    __tablename__ = "webhook_event"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    event: Mapped[str]
+    # sha256 of the event header and raw body, see patreon_webhook.dedupe
+    digest: Mapped[str]
+    signature: Mapped[str | None]
+    body: Mapped[bytes]
+    received_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(tz=timezone.utc), index=True
+    )
+    status: Mapped[WebhookStatus] = mapped_column(default=WebhookStatus.received)
+    processed_at: Mapped[datetime | None]
+    error: Mapped[str | None]
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                id=self.id,
+                event=self.event,
+                received_at=self.received_at,
+                status=self.status,
+            )
+        )
+
+    # Patreon redelivering an event we've already accepted fails to insert
+    __table_args__ = (Index("unique_webhook_event", "event", "digest", unique=True),)
+
+
+class WebhookRetry(Base):
+    """Webhook actions that failed and are waiting to be retried
+
+    `payload` holds the parsed events and their journal IDs as JSON, see
+    patreon_webhook.retry
+    """
+
+    __tablename__ = "webhook_retry"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    member_id: Mapped[str] = mapped_column(index=True)
+    payload: Mapped[str]
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(index=True)
+    error: Mapped[str | None]
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(tz=timezone.utc)
+    )
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                id=self.id,
+                member_id=self.member_id,
+                attempts=self.attempts,
+                next_attempt_at=self.next_attempt_at,
+            )
+        )
+
+
+class WebhookDeadLetter(Base):
+    """Webhook actions that ran out of retries, retried manually from Discord"""
+
+    __tablename__ = "webhook_dead_letter"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    member_id: Mapped[str] = mapped_column(index=True)
+    payload: Mapped[str]
+    attempts: Mapped[int]
+    error: Mapped[str | None]
+    created_at: Mapped[datetime]
+    failed_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(tz=timezone.utc)
+    )
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                id=self.id,
+                member_id=self.member_id,
+                attempts=self.attempts,
+                failed_at=self.failed_at,
+            )
+        )
+
+
+class PatreonMemberMirror(Base):
+    """Local copy of a Patreon campaign member
+
+    Kept up to date by the periodic full sync in the bot and every webhook the
+    listener receives, see integrations.patreon.mirror
+    """
+
+    __tablename__ = "patreon_member_mirror"
+
+    member_id: Mapped[str] = mapped_column(primary_key=True)
+    user_id: Mapped[str | None] = mapped_column(index=True)
+    email: Mapped[str | None] = mapped_column(index=True)
+    name: Mapped[str | None]
+    currently_entitled_amount_cents: Mapped[int | None]
+    last_charge_date: Mapped[datetime | None]
+    last_charge_status: Mapped[ChargeStatus]
+    next_charge_date: Mapped[datetime | None]
+    patron_status: Mapped[PatronStatus]
+    note: Mapped[str | None]
+    # when we last saw this member in a full sync or a webhook
+    synced_at: Mapped[datetime] = mapped_column(index=True)
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                member_id=self.member_id,
+                user_id=self.user_id,
+                patron_status=self.patron_status,
+                synced_at=self.synced_at,
+            )
+        )
+
+
+class PatreonUserMirror(Base):
+    """Local copy of the Patreon user behind a campaign member"""
+
+    __tablename__ = "patreon_user_mirror"
+
+    user_id: Mapped[str] = mapped_column(primary_key=True)
+    discord_user_id: Mapped[int | None] = mapped_column(index=True)
+    thumb_url: Mapped[str | None]
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(user_id=self.user_id, discord_user_id=self.discord_user_id)
+        )
+
+
+class PatreonPledgeEventMirror(Base):
+    """Local copy of a campaign members pledge history
+
+    Events are only ever added (or updated by ID), a members history is a
+    single range scan of the (member_id, date) index, newest first
+    """
+
+    __tablename__ = "patreon_pledge_event_mirror"
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    member_id: Mapped[str]
+    type: Mapped[PledgeEventType]
+    amount_cents: Mapped[int]
+    date: Mapped[datetime]
+    status: Mapped[ChargeStatus]
+    tier_id: Mapped[str | None]
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                id=self.id, member_id=self.member_id, date=self.date, status=self.status
+            )
+        )
+
+    __table_args__ = (
+        Index("pledge_event_member_date", "member_id", text("date DESC")),
+    )
+
+
+class PatreonSyncState(Base):
+    """How fresh the Patreon mirror is, a single row"""
+
+    __tablename__ = "patreon_sync_state"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    last_full_sync_at: Mapped[datetime | None]
+    last_full_sync_seconds: Mapped[float | None]
+    last_delta_at: Mapped[datetime | None]
+    member_count: Mapped[int] = mapped_column(default=0)
+    # where an interrupted full sync picks up from, and when that sync started
+    resume_cursor: Mapped[str | None]
+    resume_started_at: Mapped[datetime | None]
+
+    def __repr__(self) -> str:
+        return self._repr(
+            fields=dict(
+                last_full_sync_at=self.last_full_sync_at,
+                last_delta_at=self.last_delta_at,
+                member_count=self.member_count,
+            )
+        )
+
+
+def _member_search_document(where: str) -> str:
+    """Insert the search document of every mirrored member matching `where`"""
+    return f"""
+        INSERT INTO patreon_member_fts(rowid, member_id, name, email, note, player_names)
+        SELECT m.rowid, m.member_id, m.name, m.email, m.note, (
+            SELECT group_concat(player.name, ' ')
+            FROM patreon
+            JOIN discords_players ON discords_players.discord_id = patreon.discord_id
+            JOIN player ON player.id = discords_players.player_id
+            WHERE patreon.patreon_id = m.member_id
+        )
+        FROM patreon_member_mirror m
+        WHERE {where};
+    """
+
+
+def _refresh_member_search(where: str) -> str:
+    return f"""
+        DELETE FROM patreon_member_fts WHERE rowid IN (
+            SELECT m.rowid FROM patreon_member_mirror m WHERE {where}
+        );
+        {_member_search_document(where)}
+    """
+
+
+def _linked_to_discords(discord_ids: str) -> str:
+    return f"m.member_id IN (SELECT patreon_id FROM patreon WHERE discord_id IN ({discord_ids}))"
+
+
+_MEMBER_SEARCH_TRIGGERS = {
+    "patreon_member_fts_insert": f"""
+        AFTER INSERT ON patreon_member_mirror BEGIN
+            {_member_search_document("m.rowid = new.rowid")}
+        END
+    """,
+    "patreon_member_fts_update": f"""
+        AFTER UPDATE ON patreon_member_mirror
+        WHEN old.name IS NOT new.name
+            OR old.email IS NOT new.email
+            OR old.note IS NOT new.note
+        BEGIN
+            DELETE FROM patreon_member_fts WHERE rowid = old.rowid;
+            {_member_search_document("m.rowid = new.rowid")}
+        END
+    """,
+    "patreon_member_fts_delete": """
+        AFTER DELETE ON patreon_member_mirror BEGIN
+            DELETE FROM patreon_member_fts WHERE rowid = old.rowid;
+        END
+    """,
+    "player_fts_update": f"""
+        AFTER UPDATE OF name ON player BEGIN
+            {_refresh_member_search(_linked_to_discords(
+                "SELECT discord_id FROM discords_players WHERE player_id = new.id"
+            ))}
+        END
+    """,
+    "discords_players_fts_insert": f"""
+        AFTER INSERT ON discords_players BEGIN
+            {_refresh_member_search(_linked_to_discords("new.discord_id"))}
+        END
+    """,
+    "discords_players_fts_update": f"""
+        AFTER UPDATE ON discords_players BEGIN
+            {_refresh_member_search(_linked_to_discords("old.discord_id"))}
+            {_refresh_member_search(_linked_to_discords("new.discord_id"))}
+        END
+    """,
+    "discords_players_fts_delete": f"""
+        AFTER DELETE ON discords_players BEGIN
+            {_refresh_member_search(_linked_to_discords("old.discord_id"))}
+        END
+    """,
+    "patreon_fts_insert": f"""
+        AFTER INSERT ON patreon BEGIN
+            {_refresh_member_search("m.member_id = new.patreon_id")}
+        END
+    """,
+    "patreon_fts_update": f"""
+        AFTER UPDATE ON patreon BEGIN
+            {_refresh_member_search("m.member_id = old.patreon_id")}
+            {_refresh_member_search("m.member_id = new.patreon_id")}
+        END
+    """,
+    "patreon_fts_delete": f"""
+        AFTER DELETE ON patreon BEGIN
+            {_refresh_member_search("m.member_id = old.patreon_id")}
+        END
+    """,
+}
+
+
+@listens_for(Base.metadata, "after_create")
+def _create_member_search(target, connection, **kw):
+    """Full text search over the mirrored members, see database.utils.search_patreon_members
+
+    Trigram tokenized so any 3+ character fragment of a name, email, note or
+    linked player name matches, kept up to date by triggers
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'patreon_member_fts'"
+    ).scalar()
+    if not exists:
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE patreon_member_fts USING fts5("
+            "member_id UNINDEXED, name, email, note, player_names, "
+            "tokenize = 'trigram')"
+        )
+        # members mirrored before the search table existed
+        connection.exec_driver_sql(_member_search_document("1"))
+
+    for name, trigger in _MEMBER_SEARCH_TRIGGERS.items():
+        connection.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {trigger}")
+
+
 Base.metadata.create_all(engine)
 
 if __name__ == "__main__":
@@ -1,8 +1,28 @@
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
 from loguru import logger
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from hll_patreon_bot.database.models import Discord, DiscordPlayers, Patreon, Player
+from hll_patreon_bot.database.models import (
+    Base,
+    Discord,
+    DiscordPlayers,
+    Patreon,
+    PatreonMemberMirror,
+    PatreonPledgeEventMirror,
+    PatreonSyncState,
+    PatreonUserMirror,
+    Player,
+    WebhookDeadLetter,
+    WebhookEvent,
+    WebhookRetry,
+    WebhookStatus,
+)
+from hll_patreon_bot.integrations.patreon.types import PatreonMember
+from hll_patreon_bot.patreon_webhook.types import PatreonMemberWH, PatreonPledgeWH
 
 
 def _get_discord_record(session: Session, discord_user_name: str) -> Discord | None:
@@ -61,16 +81,21 @@ def get_crcon_record(session: Session, player_id: str) -> Player | None:
 
 
 def get_set_crcon_record(
-    session: Session, discord_record: Discord, player_id: str
+    session: Session,
+    discord_record: Discord,
+    player_id: str,
+    player_name: str | None = None,
 ) -> Player:
     player_record = _get_crcon_record(session=session, player_id=player_id)
 
     if not player_record:
-        player_record = Player(player_id=player_id)
+        player_record = Player(player_id=player_id, name=player_name)
         logger.warning(
             f"Creating new player record {player_record} for {discord_record}"
         )
         session.add(player_record)
+    elif player_name:
+        player_record.name = player_name
 
     return player_record
 
@@ -131,7 +156,7 @@ def unlink_patreon_from_discord(session: Session, discord_name: str) -> str | No
 
 
 def link_primary_crcon_to_discord(
-    session: Session, player_id: str, discord_name: str
+    session: Session, player_id: str, discord_name: str, player_name: str | None = None
 ) -> str | None:
     previous_linked_discord: str | None = None
 
@@ -143,6 +168,7 @@ def link_primary_crcon_to_discord(
         session=session,
         discord_record=discord_record,
         player_id=player_id,
+        player_name=player_name,
     )
 
     stmt = (
@@ -198,7 +224,7 @@ def unlink_primary_crcon_from_discord(
 
 
 def link_sponsored_crcon_to_discord(
-    session: Session, discord_name: str, player_id: str
+    session: Session, discord_name: str, player_id: str, player_name: str | None = None
 ) -> str | None:
     previous_linked_discord: str | None = None
 
@@ -210,6 +236,7 @@ def link_sponsored_crcon_to_discord(
         session=session,
         discord_record=discord_record,
         player_id=player_id,
+        player_name=player_name,
     )
 
     stmt = (
@@ -264,3 +291,481 @@ def unlink_sponsored_crcon_from_discord(
         logger.warning(
             f"Tried to unlink {player_record} from {discord_record} but it was not linked"
         )
+
+
+def add_webhook_event(
+    session: Session,
+    event: str,
+    digest: str,
+    signature: str | None,
+    body: bytes,
+    status: WebhookStatus = WebhookStatus.received,
+) -> int:
+    """Journal a raw webhook and return its ID
+
+    Raises IntegrityError if this event/digest was already journaled
+    """
+    stmt = (
+        insert(WebhookEvent)
+        .values(
+            event=event,
+            digest=digest,
+            signature=signature,
+            body=body,
+            received_at=datetime.now(tz=timezone.utc),
+            status=status,
+        )
+        .returning(WebhookEvent.id)
+    )
+    return session.execute(stmt).scalar_one()
+
+
+def set_webhook_event_status(
+    session: Session,
+    event_id: int,
+    status: WebhookStatus,
+    error: str | None = None,
+) -> None:
+    stmt = (
+        update(WebhookEvent)
+        .where(WebhookEvent.id == event_id)
+        .values(status=status, error=error, processed_at=datetime.now(tz=timezone.utc))
+    )
+    session.execute(stmt)
+
+
+def get_webhook_events(
+    session: Session,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    status: WebhookStatus | None = None,
+    event_id: int | None = None,
+) -> list[WebhookEvent]:
+    stmt = select(WebhookEvent).order_by(WebhookEvent.received_at)
+
+    if event_id is not None:
+        stmt = stmt.where(WebhookEvent.id == event_id)
+    if start is not None:
+        stmt = stmt.where(WebhookEvent.received_at >= start)
+    if end is not None:
+        stmt = stmt.where(WebhookEvent.received_at < end)
+    if status is not None:
+        stmt = stmt.where(WebhookEvent.status == status)
+
+    return list(session.scalars(stmt))
+
+
+def add_webhook_retry(
+    session: Session,
+    member_id: str,
+    payload: str,
+    error: str,
+    next_attempt_at: datetime,
+    attempts: int = 1,
+) -> int:
+    stmt = (
+        insert(WebhookRetry)
+        .values(
+            member_id=member_id,
+            payload=payload,
+            attempts=attempts,
+            error=error,
+            next_attempt_at=next_attempt_at,
+            created_at=datetime.now(tz=timezone.utc),
+        )
+        .returning(WebhookRetry.id)
+    )
+    return session.execute(stmt).scalar_one()
+
+
+def get_due_webhook_retries(
+    session: Session, now: datetime, limit: int | None = None
+) -> list[WebhookRetry]:
+    stmt = (
+        select(WebhookRetry)
+        .where(WebhookRetry.next_attempt_at <= now)
+        .order_by(WebhookRetry.next_attempt_at)
+        .limit(limit)
+    )
+    return list(session.scalars(stmt))
+
+
+def get_retrying_webhook_event_ids(session: Session) -> set[int]:
+    """IDs of the journaled events whose actions are waiting to be retried, either
+    automatically or from the dead letters
+    """
+    stmt = text(
+        "SELECT journal_id.value FROM webhook_retry, "
+        "json_each(webhook_retry.payload, '$.journal_ids') AS journal_id "
+        "UNION "
+        "SELECT journal_id.value FROM webhook_dead_letter, "
+        "json_each(webhook_dead_letter.payload, '$.journal_ids') AS journal_id"
+    )
+    return set(session.scalars(stmt))
+
+
+def reschedule_webhook_retry(
+    session: Session,
+    retry_id: int,
+    error: str,
+    next_attempt_at: datetime,
+    payload: str | None = None,
+) -> None:
+    """`payload` replaces the stored one, e.g. to record progress made"""
+    values: dict[str, Any] = {
+        "attempts": WebhookRetry.attempts + 1,
+        "error": error,
+        "next_attempt_at": next_attempt_at,
+    }
+    if payload is not None:
+        values["payload"] = payload
+
+    session.execute(
+        update(WebhookRetry).where(WebhookRetry.id == retry_id).values(**values)
+    )
+
+
+def delete_webhook_retry(session: Session, retry_id: int) -> None:
+    session.execute(delete(WebhookRetry).where(WebhookRetry.id == retry_id))
+
+
+def dead_letter_webhook_retry(
+    session: Session, retry_id: int, error: str, payload: str | None = None
+) -> int:
+    """Move a retry that has run out of attempts to the dead letter table"""
+    retry = session.get_one(WebhookRetry, retry_id)
+    stmt = (
+        insert(WebhookDeadLetter)
+        .values(
+            member_id=retry.member_id,
+            payload=payload if payload is not None else retry.payload,
+            attempts=retry.attempts + 1,
+            error=error,
+            created_at=retry.created_at,
+            failed_at=datetime.now(tz=timezone.utc),
+        )
+        .returning(WebhookDeadLetter.id)
+    )
+    dead_letter_id = session.execute(stmt).scalar_one()
+    session.delete(retry)
+    return dead_letter_id
+
+
+def get_webhook_dead_letters(
+    session: Session, limit: int | None = None
+) -> list[WebhookDeadLetter]:
+    stmt = select(WebhookDeadLetter).order_by(WebhookDeadLetter.failed_at).limit(limit)
+    return list(session.scalars(stmt))
+
+
+def requeue_webhook_dead_letters(
+    session: Session, dead_letter_ids: list[int] | None = None
+) -> list[int]:
+    """Move dead letters (all of them by default) back to be retried immediately
+
+    Returns the new retry IDs
+    """
+    stmt = select(WebhookDeadLetter)
+    if dead_letter_ids is not None:
+        stmt = stmt.where(WebhookDeadLetter.id.in_(dead_letter_ids))
+
+    now = datetime.now(tz=timezone.utc)
+    retry_ids = []
+    for dead_letter in session.scalars(stmt):
+        retry_ids.append(
+            add_webhook_retry(
+                session=session,
+                member_id=dead_letter.member_id,
+                payload=dead_letter.payload,
+                error=dead_letter.error or "",
+                next_attempt_at=now,
+                attempts=0,
+            )
+        )
+        session.delete(dead_letter)
+
+    return retry_ids
+
+
+def _upsert(
+    session: Session,
+    model: type[Base],
+    rows: list[dict[str, Any]],
+    key: str,
+    columns: Iterable[str] | None = None,
+) -> None:
+    """Insert rows, updating `columns` (everything but the key by default) on conflict"""
+    if not rows:
+        return
+
+    stmt = sqlite_insert(model).values(rows)
+    columns = columns if columns is not None else [c for c in rows[0] if c != key]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key], set_={c: stmt.excluded[c] for c in columns}
+    )
+    session.execute(stmt)
+
+
+def _get_patreon_sync_state(session: Session) -> PatreonSyncState:
+    state = session.get(PatreonSyncState, 1)
+    if state is None:
+        state = PatreonSyncState(id=1, member_count=0)
+        session.add(state)
+    return state
+
+
+def get_patreon_sync_state(session: Session) -> PatreonSyncState | None:
+    return session.get(PatreonSyncState, 1)
+
+
+def upsert_patreon_members(
+    session: Session, members: Iterable[PatreonMember], synced_at: datetime
+) -> int:
+    """Write a page of a full sync (or members fetched one at a time) to the mirror
+
+    Members are replaced wholesale, pledge events are added to their history
+    (updating any already stored by ID) so history Patreon stops sending is kept
+    """
+    member_rows = []
+    user_rows = []
+    pledge_rows = []
+    for member in members:
+        member_rows.append(
+            {
+                "member_id": member.id,
+                "user_id": member.user_id,
+                "email": member.email,
+                "name": member.name,
+                "currently_entitled_amount_cents": member.currently_entitled_amount_cents,
+                "last_charge_date": member.last_charge_date,
+                "last_charge_status": member.last_charge_status,
+                "next_charge_date": member.next_charge_date,
+                "patron_status": member.patron_status,
+                "note": member.note,
+                "synced_at": synced_at,
+            }
+        )
+        if member.user_id:
+            user_rows.append(
+                {
+                    "user_id": member.user_id,
+                    "discord_user_id": member.discord_user_id,
+                    "thumb_url": member.thumb_url,
+                }
+            )
+        pledge_rows.extend(
+            {
+                "id": pledge.id,
+                "member_id": member.id,
+                "type": pledge.type,
+                "amount_cents": pledge.amount_cents,
+                "date": pledge.date,
+                "status": pledge.status,
+                "tier_id": pledge.tier_id,
+            }
+            for pledge in member.pledge_history
+        )
+
+    _upsert(session, PatreonMemberMirror, member_rows, key="member_id")
+    _upsert(session, PatreonUserMirror, user_rows, key="user_id")
+    _upsert(session, PatreonPledgeEventMirror, pledge_rows, key="id")
+    return len(member_rows)
+
+
+def apply_patreon_member_delta(
+    session: Session, data: PatreonMemberWH | PatreonPledgeWH, synced_at: datetime
+) -> bool:
+    """Apply a parsed webhook to the mirror
+
+    Webhooks only carry some of a members fields, anything they don't have
+    (name, note, pledge history) is left alone until the next full sync
+
+    Returns False if the webhook had no member ID and was skipped
+    """
+    if not data.get("id"):
+        logger.warning("Not mirroring a webhook without a member ID")
+        return False
+
+    row: dict[str, Any] = {
+        "member_id": data["id"],
+        "currently_entitled_amount_cents": data["currently_entitled_amount_cents"] or 0,
+        "last_charge_status": data["last_charge_status"],
+        "patron_status": data["patron_status"],
+        "synced_at": synced_at,
+    }
+    if data.get("user_id"):
+        row["user_id"] = data["user_id"]
+    if data.get("email"):
+        row["email"] = data["email"]
+    if data["last_charge_date"]:
+        row["last_charge_date"] = data["last_charge_date"]
+    if "next_charge_date" in data:
+        row["next_charge_date"] = data["next_charge_date"]  # type: ignore
+    _upsert(session, PatreonMemberMirror, [row], key="member_id")
+
+    if data.get("user_id"):
+        discord_user_id = data["discord_user_id"]
+        _upsert(
+            session,
+            PatreonUserMirror,
+            [
+                {
+                    "user_id": data["user_id"],
+                    "discord_user_id": int(discord_user_id)
+                    if discord_user_id
+                    else None,
+                }
+            ],
+            key="user_id",
+        )
+
+    _get_patreon_sync_state(session).last_delta_at = synced_at
+    return True
+
+
+def prune_patreon_mirror(session: Session, synced_before: datetime) -> list[str]:
+    """Remove members a full sync started at `synced_before` didn't see
+
+    Returns the IDs of the removed members
+    """
+    removed = list(
+        session.scalars(
+            select(PatreonMemberMirror.member_id).where(
+                PatreonMemberMirror.synced_at < synced_before
+            )
+        )
+    )
+    session.execute(
+        delete(PatreonPledgeEventMirror).where(
+            PatreonPledgeEventMirror.member_id.in_(removed)
+        )
+    )
+    session.execute(
+        delete(PatreonMemberMirror).where(PatreonMemberMirror.member_id.in_(removed))
+    )
+    session.execute(
+        delete(PatreonUserMirror).where(
+            PatreonUserMirror.user_id.not_in(
+                select(PatreonMemberMirror.user_id).where(
+                    PatreonMemberMirror.user_id.is_not(None)
+                )
+            )
+        )
+    )
+    return removed
+
+
+def checkpoint_patreon_full_sync(
+    session: Session, started_at: datetime, cursor: str | None
+) -> None:
+    """Remember the next page of a full sync in case it gets interrupted"""
+    state = _get_patreon_sync_state(session)
+    state.resume_cursor = cursor
+    state.resume_started_at = started_at
+
+
+def finish_patreon_full_sync(
+    session: Session, started_at: datetime, finished_at: datetime
+) -> PatreonSyncState:
+    state = _get_patreon_sync_state(session)
+    state.last_full_sync_at = finished_at
+    state.last_full_sync_seconds = (finished_at - started_at).total_seconds()
+    state.resume_cursor = state.resume_started_at = None
+    state.member_count = session.scalar(
+        select(func.count()).select_from(PatreonMemberMirror)
+    )
+    return state
+
+
+def get_mirrored_members(
+    session: Session,
+    member_id: str | None = None,
+    synced_since: datetime | None = None,
+) -> list[tuple[PatreonMemberMirror, PatreonUserMirror | None]]:
+    stmt = select(PatreonMemberMirror, PatreonUserMirror).outerjoin(
+        PatreonUserMirror, PatreonMemberMirror.user_id == PatreonUserMirror.user_id
+    )
+    if member_id is not None:
+        stmt = stmt.where(PatreonMemberMirror.member_id == member_id)
+    if synced_since is not None:
+        stmt = stmt.where(PatreonMemberMirror.synced_at >= synced_since)
+
+    return [(member, user) for member, user in session.execute(stmt)]
+
+
+def get_mirrored_pledge_events(
+    session: Session,
+    member_id: str | None = None,
+    member_ids: Iterable[str] | None = None,
+    limit: int | None = None,
+) -> list[PatreonPledgeEventMirror]:
+    """Newest first, `limit` is only useful with a single `member_id`"""
+    stmt = select(PatreonPledgeEventMirror).order_by(
+        PatreonPledgeEventMirror.date.desc()
+    )
+    if member_id is not None:
+        stmt = stmt.where(PatreonPledgeEventMirror.member_id == member_id)
+    if member_ids is not None:
+        stmt = stmt.where(PatreonPledgeEventMirror.member_id.in_(member_ids))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    return list(session.scalars(stmt))
+
+
+# bm25 weights for member_id (unindexed), name, email, note and player_names
+_MEMBER_SEARCH_WEIGHTS = "0.0, 4.0, 4.0, 1.0, 2.0"
+
+
+def _trigram_query(query: str) -> str:
+    """OR together every trigram of `query` so near misses still match
+
+    A typo only breaks the few trigrams it overlaps, so the closer a member is
+    to the query the more trigrams they match and the better they rank
+    """
+    query = query.lower()
+    trigrams = dict.fromkeys(query[idx : idx + 3] for idx in range(len(query) - 2))
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in trigrams)
+
+
+def search_patreon_members(
+    session: Session, query: str, limit: int = 10
+) -> list[PatreonMemberMirror]:
+    """Mirrored members best matching `query`, best first
+
+    Searches names, emails, notes and the names of linked CRCON players and
+    tolerates typos, see database.models._create_member_search
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    if len(query) < 3:
+        # too short to have any trigrams
+        pattern = (
+            "%"
+            + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            + "%"
+        )
+        stmt = text(
+            "SELECT member_id FROM patreon_member_fts "
+            "WHERE name LIKE :pattern ESCAPE '\\' OR email LIKE :pattern ESCAPE '\\' "
+            "OR note LIKE :pattern ESCAPE '\\' OR player_names LIKE :pattern ESCAPE '\\' "
+            "LIMIT :limit"
+        ).bindparams(pattern=pattern, limit=limit)
+    else:
+        stmt = text(
+            "SELECT member_id FROM patreon_member_fts WHERE patreon_member_fts MATCH :query "
+            f"ORDER BY bm25(patreon_member_fts, {_MEMBER_SEARCH_WEIGHTS}) LIMIT :limit"
+        ).bindparams(query=_trigram_query(query), limit=limit)
+
+    member_ids = list(session.scalars(stmt))
+    members = {
+        member.member_id: member
+        for member in session.scalars(
+            select(PatreonMemberMirror).where(
+                PatreonMemberMirror.member_id.in_(member_ids)
+            )
+        )
+    }
+    return [members[id_] for id_ in member_ids if id_ in members]
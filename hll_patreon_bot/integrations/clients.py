@@ -0,0 +1,122 @@
+import aiohttp
+import httpx
+from loguru import logger
+
+from hll_patreon_bot.bot.constants import (
+    API_KEY_FORMAT,
+    CRCON_API_KEY,
+    CRCON_TIMEOUT,
+    DISCORD_TIMEOUT,
+    HTTP2,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    PATREON_MAX_RETRIES,
+    PATREON_RATE_BURST,
+    PATREON_RATE_LIMIT,
+    PATREON_TIMEOUT,
+)
+from hll_patreon_bot.bot.utils import raise_on_4xx_5xx
+from hll_patreon_bot.integrations.httpcache import CachingTransport
+from hll_patreon_bot.integrations.ratelimit import RateLimitedTransport, TokenBucket
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def create_crcon_client() -> httpx.AsyncClient:
+    transport = CachingTransport(
+        httpx.AsyncHTTPTransport(limits=_limits(), http2=HTTP2),
+        name="crcon",
+        max_bytes=HTTP_CACHE_MAX_BYTES,
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        headers={"Authorization": API_KEY_FORMAT.format(api_key=CRCON_API_KEY)},
+        event_hooks={"response": [raise_on_4xx_5xx]},
+        timeout=httpx.Timeout(CRCON_TIMEOUT),
+    )
+
+
+def create_patreon_client() -> httpx.AsyncClient:
+    # every Patreon call (the mirror's crawl, slash commands) shares one bucket,
+    # revalidating a cached body still costs a token
+    transport = CachingTransport(
+        RateLimitedTransport(
+            httpx.AsyncHTTPTransport(limits=_limits(), http2=HTTP2),
+            bucket=TokenBucket(rate=PATREON_RATE_LIMIT, capacity=PATREON_RATE_BURST),
+            name="patreon",
+            max_retries=PATREON_MAX_RETRIES,
+        ),
+        name="patreon",
+        max_bytes=HTTP_CACHE_MAX_BYTES,
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(PATREON_TIMEOUT),
+    )
+
+
+def create_discord_session() -> aiohttp.ClientSession:
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=HTTP_MAX_CONNECTIONS, keepalive_timeout=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=aiohttp.ClientTimeout(total=DISCORD_TIMEOUT),
+    )
+
+
+class ClientRegistry:
+    """One long lived connection pool per outbound service
+
+    Shared by the bot and the webhook listener so every call reuses warm
+    connections, call `start()`/`aclose()` from the app/bot lifecycle
+    """
+
+    def __init__(self) -> None:
+        self._crcon: httpx.AsyncClient | None = None
+        self._patreon: httpx.AsyncClient | None = None
+        self._discord: aiohttp.ClientSession | None = None
+
+    @property
+    def crcon(self) -> httpx.AsyncClient:
+        if self._crcon is None or self._crcon.is_closed:
+            self._crcon = create_crcon_client()
+        return self._crcon
+
+    @property
+    def patreon(self) -> httpx.AsyncClient:
+        if self._patreon is None or self._patreon.is_closed:
+            self._patreon = create_patreon_client()
+        return self._patreon
+
+    @property
+    def discord(self) -> aiohttp.ClientSession:
+        """Must first be used from inside a running event loop"""
+        if self._discord is None or self._discord.closed:
+            self._discord = create_discord_session()
+        return self._discord
+
+    async def start(self) -> None:
+        # Create the pools up front instead of on the first request
+        self.crcon, self.patreon, self.discord
+        logger.info(f"Opened shared HTTP clients {HTTP2=} {HTTP_MAX_CONNECTIONS=}")
+
+    async def aclose(self) -> None:
+        if self._crcon is not None:
+            await self._crcon.aclose()
+        if self._patreon is not None:
+            await self._patreon.aclose()
+        if self._discord is not None:
+            await self._discord.close()
+        self._crcon = self._patreon = self._discord = None
+        logger.info("Closed shared HTTP clients")
+
+
+CLIENTS = ClientRegistry()
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import urllib
 from datetime import datetime
 from pprint import pprint
@@ -7,8 +6,10 @@ from typing import Any
 from urllib.parse import urljoin
 
 import httpx
+import msgspec
 from loguru import logger
 
+from hll_patreon_bot import serialization
 from hll_patreon_bot.bot.constants import (
     CRCON_SERVER_NUMBER,
     CRCON_URL,
@@ -16,12 +17,15 @@ from hll_patreon_bot.bot.constants import (
 )
 from hll_patreon_bot.bot.utils import one_or_none
 from hll_patreon_bot.integrations.crcon.types import (
+    PLAYER_PROFILE,
+    VIP_IDS,
     PlayerProfileType,
     PlayerVIPType,
     RconAPIResponse,
     ServerDetails,
     VipPlayer,
 )
+from hll_patreon_bot.integrations.httpcache import parse_cached
 
 
 async def add_vip(
@@ -44,7 +48,7 @@ async def add_vip(
         f"Adding/updating VIP expiration for {player_id=} {description=} {expiration_timestamp=}"
     )
     res = await client.post(url=url, data=payload)
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = serialization.loads(res.content)
     return res_body
 
 
@@ -60,7 +64,7 @@ async def remove_vip(
     }
 
     res = await client.post(url=url, data=payload)
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = serialization.loads(res.content)
     return res_body
 
 
@@ -77,7 +81,7 @@ async def add_flag(
 
     res = await client.post(url=url, data=payload)
     # res.raise_for_status()
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = serialization.loads(res.content)
     return res_body
 
 
@@ -94,7 +98,7 @@ async def remove_flag(
     payload = {"flag_id": flag_id}
 
     res = await client.post(url=url, data=payload)
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = serialization.loads(res.content)
     return res_body
 
 
@@ -107,15 +111,7 @@ async def fetch_current_vips(
     url = urljoin(server_url, endpoint)
     response = await client.get(url=url)
 
-    raw_vips = response.json()["result"]
-    return {
-        vip["player_id"]: VipPlayer(
-            player_id=vip["player_id"],
-            name=vip["name"],
-            expiration_date=vip["vip_expiration"],
-        )
-        for vip in raw_vips
-    }
+    return {vip.player_id: vip for vip in VIP_IDS.decode(response.content).result}
 
 
 async def fetch_player(
@@ -128,8 +124,7 @@ async def fetch_player(
     url = urljoin(rcon_url, endpoint)
     res = await client.get(url=url, params=params)
 
-    res_body: RconAPIResponse = res.json()
-    return res_body["result"]
+    return parse_cached(res, PLAYER_PROFILE.decode).result
 
 
 async def fetch_players(
@@ -152,13 +147,12 @@ async def fetch_current_expiration(
     profile = await fetch_player(client=client, player_id=player_id)
 
     if profile:
-        vip_info = one_or_none(
-            lambda p: p["server_number"] == server_number, profile["vips"]
-        )
-        if vip_info and profile["names"] and len(profile["names"]) > 0:
-            vip_info["vip_name"] = profile["names"][0]["name"]
+        vip_info = one_or_none(lambda p: p.server_number == server_number, profile.vips)
+        # the profile can be shared with other callers through the HTTP cache
+        if vip_info and profile.names and len(profile.names) > 0:
+            vip_info = msgspec.structs.replace(vip_info, vip_name=profile.names[0].name)
         elif vip_info:
-            vip_info["vip_name"] = MISSING_PLAYER_NAME
+            vip_info = msgspec.structs.replace(vip_info, vip_name=MISSING_PLAYER_NAME)
 
         return vip_info
 
@@ -171,7 +165,7 @@ async def fetch_primary_server_details(
     url = urljoin(rcon_url, endpoint)
     res = await client.get(url=url)
 
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = parse_cached(res, serialization.loads)
 
     return {
         "name": res_body["result"]["name"],
@@ -188,7 +182,7 @@ async def fetch_secondary_server_details(
     url = urljoin(rcon_url, endpoint)
     res = await client.get(url=url)
 
-    res_body: RconAPIResponse = res.json()
+    res_body: RconAPIResponse = parse_cached(res, serialization.loads)
 
     return {
         str(v["server_number"]): {
@@ -1,15 +1,15 @@
 from datetime import datetime
 from typing import Any, Literal, Optional, TypedDict
 
-import pydantic
+import msgspec
 
 
-class PlayerNameType(TypedDict):
-    id: int
+class PlayerNameType(msgspec.Struct, kw_only=True, gc=False):
     name: str
-    player_id: str
-    created: datetime
-    last_seen: datetime
+    id: int | None = None
+    player_id: str | None = None
+    created: datetime | None = None
+    last_seen: datetime | None = None
 
 
 class PlayerSessionType(TypedDict):
@@ -106,28 +106,26 @@ class SteamInfoType(TypedDict):
     has_bans: bool
 
 
-class PlayerVIPType(TypedDict):
+class PlayerVIPType(msgspec.Struct, kw_only=True, gc=False):
     server_number: int
     expiration: str
-    vip_name: str
+    # not part of the CRCON response, filled in by fetch_current_expiration
+    vip_name: str | None = None
 
 
-class PlayerProfileType(TypedDict):
-    id: int
+class PlayerProfileType(msgspec.Struct, kw_only=True):
+    """The parts of a CRCON player profile the bot uses
+
+    The rest of the profile (sessions, received_actions, penalty_count,
+    blacklist, flags, watchlist and steaminfo, see the types above) is skipped
+    while decoding rather than kept around
+    """
+
     player_id: str
-    created: datetime
-    names: list[PlayerNameType]
-    sessions: list[PlayerSessionType]
-    sessions_count: int
-    total_playtime_seconds: int
-    current_playtime_seconds: int
-    received_actions: list[PlayerActionType]
-    penalty_count: PenaltyCountType
-    blacklist: Optional[BlackListType]
-    flags: list[PlayerFlagType]
-    watchlist: Optional[WatchListType]
-    steaminfo: Optional[SteamInfoType]
-    vips: list[PlayerVIPType]
+    id: int | None = None
+    created: datetime | None = None
+    names: list[PlayerNameType] = []
+    vips: list[PlayerVIPType] = []
 
 
 class RconAPIResponse(TypedDict):
@@ -139,13 +137,27 @@ class RconAPIResponse(TypedDict):
     forwards_results: bool
 
 
-class VipPlayer(pydantic.BaseModel):
+class VipPlayer(msgspec.Struct, kw_only=True, gc=False):
     name: str
     player_id: str
-    expiration_date: datetime | None
+    expiration_date: datetime | None = msgspec.field(
+        default=None, name="vip_expiration"
+    )
 
 
 class ServerDetails(TypedDict):
     name: str
     server_number: int
     link: str
+
+
+class PlayerProfileResponse(msgspec.Struct, kw_only=True):
+    result: PlayerProfileType | None = None
+
+
+class VipIdsResponse(msgspec.Struct, kw_only=True):
+    result: list[VipPlayer] = []
+
+
+PLAYER_PROFILE = msgspec.json.Decoder(PlayerProfileResponse)
+VIP_IDS = msgspec.json.Decoder(VipIdsResponse)
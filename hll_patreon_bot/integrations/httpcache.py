@@ -0,0 +1,171 @@
+"""Conditional GETs for the shared API clients
+
+Responses carrying an ETag or Last-Modified are kept (up to `max_bytes` of
+bodies, least recently used dropped first) and the next GET of the same URL
+is sent with If-None-Match/If-Modified-Since. A 304 is turned back into the
+cached 200 so callers never see it, parse_cached() also skips parsing the
+body again
+"""
+
+import re
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+import httpx
+
+from hll_patreon_bot import metrics
+
+T = TypeVar("T")
+
+# the cache entry a response was stored in or served from
+CACHE_ENTRY = "hll_patreon_bot.cache_entry"
+# decoded bodies are stored, so the encoding headers no longer apply
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+# path segments that are IDs (campaign IDs, Patreon member UUIDs)
+_ID_SEGMENT = re.compile(r"(?<=/)(?:\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+
+
+@dataclass
+class CacheEntry:
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    # (parser, what it returned) see parse_cached
+    parsed: tuple[Callable[[bytes], Any], Any] | None = None
+
+
+@dataclass
+class EndpointStats:
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def endpoint(url: httpx.URL) -> str:
+    """The URL path with its IDs taken out, for reporting"""
+    return _ID_SEGMENT.sub("{id}", url.path)
+
+
+def parse_cached(response: httpx.Response, parse: Callable[[bytes], T]) -> T:
+    """parse(response.content), reusing the result from the last time it was
+    parsed if the response came out of the cache unchanged
+
+    Callers share the returned object so must not change it
+    """
+    entry: CacheEntry | None = response.extensions.get(CACHE_ENTRY)
+    if entry is None:
+        return parse(response.content)
+
+    if entry.parsed is None or entry.parsed[0] != parse:
+        entry.parsed = (parse, parse(response.content))
+    return entry.parsed[1]
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Wrap a transport to revalidate GETs instead of downloading them again"""
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, name: str, max_bytes: int
+    ) -> None:
+        self._transport = transport
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._size = 0
+        self.stats: defaultdict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        self._evict(key)
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self._size += len(entry.body)
+        while self._size > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
+
+    def _record(self, request: httpx.Request, hit: bool, saved: int = 0) -> None:
+        name = endpoint(request.url)
+        stats = self.stats[name]
+        if hit:
+            stats.hits += 1
+            stats.bytes_saved += saved
+            metrics.incr(f"{self.name}.cache.{name}.hits")
+            metrics.incr(f"{self.name}.cache.{name}.bytes_saved", saved)
+        else:
+            stats.misses += 1
+            metrics.incr(f"{self.name}.cache.{name}.misses")
+        metrics.set_gauge(f"{self.name}.cache.{name}.hit_ratio", stats.hit_ratio)
+
+    def _response(self, entry: CacheEntry, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            status_code=entry.status_code,
+            headers=entry.headers,
+            content=entry.body,
+            request=request,
+            extensions={CACHE_ENTRY: entry},
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = str(request.url)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            if cached.etag and "If-None-Match" not in request.headers:
+                request.headers["If-None-Match"] = cached.etag
+            if cached.last_modified and "If-Modified-Since" not in request.headers:
+                request.headers["If-Modified-Since"] = cached.last_modified
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and cached is not None:
+            await response.aclose()
+            self._record(request, hit=True, saved=len(cached.body))
+            return self._response(cached, request)
+
+        self._record(request, hit=False)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return response
+        if "no-store" in response.headers.get("Cache-Control", ""):
+            self._evict(key)
+            return response
+
+        body = await response.aread()
+        await response.aclose()
+        entry = CacheEntry(
+            status_code=response.status_code,
+            headers=[
+                (k, v)
+                for k, v in response.headers.multi_items()
+                if k.lower() not in _DROPPED_HEADERS
+            ],
+            body=body,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        self._store(key, entry)
+        return self._response(entry, request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,45 @@
+from collections import defaultdict
+from typing import Iterable
+
+from hll_patreon_bot.integrations.patreon.schemas import Resource, ToMany, ToOne
+
+
+class Resolver:
+    """Index the included resources of a JSON:API document by (type, id)
+
+    Built once per document so relationship lookups stay O(1) however large
+    the page is, relationships are only resolved when a parser asks for them.
+    Relationships to resources that weren't included resolve to None (or are
+    skipped for to-many relationships) instead of raising
+    """
+
+    def __init__(self, included: Iterable[Resource]) -> None:
+        self._index: dict[tuple[str, str], Resource] = {}
+        self._by_type: defaultdict[str, list[Resource]] = defaultdict(list)
+
+        for obj in included:
+            self._index[obj.type, obj.id] = obj
+            self._by_type[obj.type].append(obj)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, type_: str, id_: str) -> Resource | None:
+        return self._index.get((type_, id_))
+
+    def of_type(self, type_: str) -> list[Resource]:
+        return self._by_type.get(type_, [])
+
+    def one(self, relationship: ToOne | None) -> Resource | None:
+        if relationship is None or relationship.data is None:
+            return None
+        return self._index.get((relationship.data.type, relationship.data.id))
+
+    def many(self, relationship: ToMany | None) -> list[Resource]:
+        if relationship is None:
+            return []
+        return [
+            obj
+            for ref in relationship.data
+            if (obj := self._index.get((ref.type, ref.id))) is not None
+        ]
@@ -0,0 +1,378 @@
+"""Local SQLite mirror of the Patreon campaign members
+
+The bot runs a full sync of every campaign member in the background and the
+webhook listener applies each webhook it parses on top of that, so searching
+members never has to page through the whole campaign on Patreon
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, overload
+
+import httpx
+from loguru import logger
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.bot.constants import (
+    PATREON_SNAPSHOT_INTERVAL,
+    PATREON_SYNC_INTERVAL,
+)
+from hll_patreon_bot.database.models import (
+    PatreonMemberMirror,
+    PatreonPledgeEventMirror,
+    PatreonUserMirror,
+    enter_session,
+)
+from hll_patreon_bot.database.utils import (
+    apply_patreon_member_delta,
+    checkpoint_patreon_full_sync,
+    finish_patreon_full_sync,
+    get_mirrored_members,
+    get_mirrored_pledge_events,
+    get_patreon_sync_state,
+    prune_patreon_mirror,
+    upsert_patreon_members,
+)
+from hll_patreon_bot.integrations.clients import CLIENTS
+from hll_patreon_bot.integrations.patreon.constants import FieldProfile
+from hll_patreon_bot.integrations.patreon.patreon import iter_campaign_member_pages
+from hll_patreon_bot.integrations.patreon.search import MemberIndex
+from hll_patreon_bot.integrations.patreon.types import PatreonMember, PledgeHistory
+from hll_patreon_bot.integrations.ratelimit import background
+from hll_patreon_bot.patreon_webhook.types import PatreonMemberWH, PatreonPledgeWH
+
+
+@overload
+def _utc(timestamp: datetime) -> datetime:
+    ...
+
+
+@overload
+def _utc(timestamp: datetime | None) -> datetime | None:
+    ...
+
+
+def _utc(timestamp: datetime | None) -> datetime | None:
+    # sqlite hands back naive UTC timestamps
+    if timestamp is None or timestamp.tzinfo is not None:
+        return timestamp
+    return timestamp.replace(tzinfo=timezone.utc)
+
+
+def _pledge_history(pledge: PatreonPledgeEventMirror) -> PledgeHistory:
+    return PledgeHistory(
+        id=pledge.id,
+        type=pledge.type,
+        amount_cents=pledge.amount_cents,
+        date=_utc(pledge.date),
+        status=pledge.status,
+        tier_id=sys.intern(pledge.tier_id) if pledge.tier_id else None,
+    )
+
+
+def _patreon_member(
+    member: PatreonMemberMirror,
+    user: PatreonUserMirror | None,
+    pledges: list[PatreonPledgeEventMirror],
+) -> PatreonMember:
+    return PatreonMember(
+        id=member.member_id,
+        name=member.name,
+        email=member.email,
+        currently_entitled_amount_cents=member.currently_entitled_amount_cents or 0,
+        last_charge_date=_utc(member.last_charge_date),
+        last_charge_status=member.last_charge_status,
+        next_charge_date=_utc(member.next_charge_date),
+        patron_status=member.patron_status,
+        note=member.note,
+        user_id=member.user_id,
+        discord_user_id=user.discord_user_id if user else None,
+        thumb_url=user.thumb_url if user else None,
+        pledge_ids={pledge.id for pledge in pledges},
+        pledge_history=[_pledge_history(pledge) for pledge in pledges],
+    )
+
+
+def load_members(synced_since: datetime | None = None) -> dict[str, PatreonMember]:
+    """Every mirrored member (or only those synced since) by member ID"""
+    with enter_session() as session:
+        rows = get_mirrored_members(session=session, synced_since=synced_since)
+        pledges: dict[str, list[PatreonPledgeEventMirror]] = {}
+        for pledge in get_mirrored_pledge_events(
+            session=session,
+            member_ids=(
+                [member.member_id for member, _ in rows] if synced_since else None
+            ),
+        ):
+            pledges.setdefault(pledge.member_id, []).append(pledge)
+
+        return {
+            member.member_id: _patreon_member(
+                member, user, pledges.get(member.member_id, [])
+            )
+            for member, user in rows
+        }
+
+
+def load_member(
+    member_id: str, pledge_limit: int | None = None
+) -> PatreonMember | None:
+    """A mirrored member with only their newest `pledge_limit` pledge events"""
+    if mirrored := load_member_synced_at(
+        member_id=member_id, pledge_limit=pledge_limit
+    ):
+        return mirrored[0]
+    return None
+
+
+def load_member_synced_at(
+    member_id: str, pledge_limit: int | None = None
+) -> tuple[PatreonMember, datetime] | None:
+    """Like `load_member` but also when that member's row was last synced"""
+    with enter_session() as session:
+        rows = get_mirrored_members(session=session, member_id=member_id)
+        if not rows:
+            return None
+
+        member, user = rows[0]
+        pledges = get_mirrored_pledge_events(
+            session=session, member_id=member_id, limit=pledge_limit
+        )
+        return _patreon_member(member, user, pledges), _utc(member.synced_at)
+
+
+def store_member(member: PatreonMember) -> None:
+    """Mirror a member fetched on its own so it's served locally from then on"""
+    with enter_session() as session:
+        upsert_patreon_members(
+            session=session, members=[member], synced_at=datetime.now(tz=timezone.utc)
+        )
+
+
+def last_full_sync_at() -> datetime | None:
+    """When the last full sync finished, webhooks applied since don't count"""
+    with enter_session() as session:
+        state = get_patreon_sync_state(session=session)
+        return _utc(state.last_full_sync_at) if state else None
+
+
+def apply_webhooks(events: Iterable[PatreonMemberWH | PatreonPledgeWH]) -> None:
+    """Apply parsed webhooks (oldest first) on top of the last full sync"""
+    now = datetime.now(tz=timezone.utc)
+    with enter_session() as session:
+        for data in events:
+            if not apply_patreon_member_delta(
+                session=session, data=data, synced_at=now
+            ):
+                metrics.incr("patreon.mirror.delta_skipped")
+    metrics.incr("patreon.mirror.deltas")
+
+
+class PatreonMirror:
+    """Periodically copy every campaign member to the local mirror
+
+    Members are written a page at a time as they come in, anyone the sync
+    didn't see (and that no webhook touched in the meantime) is removed once
+    it has gone through every page. `index` is kept in step with the mirror
+    for searching, webhooks the listener mirrored are picked up every
+    `snapshot_interval`
+
+    Commands read the last good snapshot() straight away, an overdue one is
+    still served while a sync is asked for in the background
+    """
+
+    # webhooks are mirrored by the webhook listener, so rows can commit with a
+    # synced_at a little older than the last time we caught the index up
+    refresh_overlap = timedelta(minutes=1)
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient | None = None,
+        interval: float = 3600.0,
+        snapshot_interval: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._stopping = False
+        self.index = MemberIndex()
+        self._indexed_at: datetime | None = None
+        # when the last full sync finished, None until `index` holds one
+        self.synced_at: datetime | None = None
+
+    async def refresh_index(self) -> MemberIndex:
+        """Catch the index up with members the mirror has changed since the last call
+
+        The mirror is read off the event loop so the bot stays responsive
+        """
+        now = datetime.now(tz=timezone.utc)
+        since = self._indexed_at - self.refresh_overlap if self._indexed_at else None
+        changed = await asyncio.to_thread(load_members, synced_since=since)
+        synced_at = await asyncio.to_thread(last_full_sync_at)
+        self.index.update(changed.values())
+        self._indexed_at = now
+        if synced_at and (self.synced_at is None or synced_at > self.synced_at):
+            self.synced_at = synced_at
+        metrics.set_gauge("patreon.mirror.indexed", len(self.index))
+        return self.index
+
+    async def warm(self) -> None:
+        """Load the snapshot left by the last sync, if there isn't one yet
+
+        The mirror is read off the event loop so the bot stays responsive
+        """
+        if self._indexed_at is not None:
+            return
+
+        now = datetime.now(tz=timezone.utc)
+        synced_at = await asyncio.to_thread(last_full_sync_at)
+        if synced_at is None:
+            # never fully synced, the first sync fills the index as it goes
+            return
+        members = await asyncio.to_thread(load_members)
+        # anything the running sync already indexed is newer than the mirror
+        self.index.update(m for m in members.values() if m.id not in self.index)
+        self._indexed_at = now
+        self.synced_at = self.synced_at or synced_at
+        metrics.set_gauge("patreon.mirror.indexed", len(self.index))
+        logger.info(f"Warmed Patreon snapshot with {len(self.index)} members")
+
+    def snapshot(self) -> tuple[MemberIndex, datetime] | None:
+        """The indexed members and when they were synced, None before the first
+        sync or warm()"""
+        if self.synced_at is None:
+            return None
+
+        age = datetime.now(tz=timezone.utc) - self.synced_at
+        metrics.set_gauge("patreon.mirror.snapshot_age", age.total_seconds())
+        if age.total_seconds() > self.interval and not self._lock.locked():
+            # serve it stale and catch up in the background
+            self.request_sync()
+        return self.index, self.synced_at
+
+    async def _crawl(
+        self, cursor: str | None, started_at: datetime, seen: set[str]
+    ) -> None:
+        # slash commands looking members up go ahead of the crawl
+        with background():
+            async for page, next_link in iter_campaign_member_pages(
+                client=self.client or CLIENTS.patreon,
+                cursor=cursor,
+                profile=FieldProfile.sync,
+            ):
+                with enter_session() as session:
+                    upsert_patreon_members(
+                        session=session, members=page.values(), synced_at=started_at
+                    )
+                    checkpoint_patreon_full_sync(
+                        session=session, started_at=started_at, cursor=next_link
+                    )
+                self.index.update(page.values())
+                seen.update(page)
+
+    async def sync(self) -> int:
+        """Run a full sync, returns the number of members mirrored
+
+        Picks up from the last page written if the previous sync was interrupted
+        """
+        async with self._lock:
+            now = datetime.now(tz=timezone.utc)
+            start = time.perf_counter()
+            seen: set[str] = set()
+
+            with enter_session() as session:
+                state = get_patreon_sync_state(session=session)
+                cursor = state.resume_cursor if state else None
+                started_at = (
+                    _utc(state.resume_started_at) if state and cursor else None
+                ) or now
+
+            if cursor:
+                logger.info(f"Resuming Patreon sync started at {started_at}")
+            try:
+                await self._crawl(cursor=cursor, started_at=started_at, seen=seen)
+            except httpx.HTTPStatusError as e:
+                if cursor is None or not e.response.is_client_error:
+                    raise
+                # Patreon no longer accepts the cursor, start over
+                logger.warning(f"Restarting Patreon sync, can't resume: {e}")
+                started_at = now
+                seen.clear()
+                await self._crawl(cursor=None, started_at=started_at, seen=seen)
+
+            finished_at = datetime.now(tz=timezone.utc)
+            with enter_session() as session:
+                removed = prune_patreon_mirror(
+                    session=session, synced_before=started_at
+                )
+                finish_patreon_full_sync(
+                    session=session, started_at=now, finished_at=finished_at
+                )
+
+            for member_id in removed:
+                self.index.remove(member_id)
+            self.synced_at = finished_at
+            # the crawl indexed every member, only changes since need loading
+            self._indexed_at = self._indexed_at or started_at
+
+            metrics.observe("patreon.mirror.sync", time.perf_counter() - start)
+            metrics.set_gauge("patreon.mirror.members", len(seen))
+            logger.info(
+                f"Mirrored {len(seen)} Patreon members ({len(removed)} removed)"
+            )
+            return len(seen)
+
+    def request_sync(self) -> None:
+        """Run a full sync as soon as possible instead of waiting for the interval"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self.sync()
+            except Exception as e:
+                metrics.incr("patreon.mirror.sync_failed")
+                logger.exception(f"Syncing Patreon members failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _refresh(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.refresh_index()
+            except Exception as e:
+                metrics.incr("patreon.mirror.refresh_failed")
+                logger.exception(f"Refreshing the Patreon snapshot failed: {e}")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="patreon-mirror")
+        self._refresh_task = asyncio.create_task(
+            self._refresh(), name="patreon-snapshot"
+        )
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in (self._task, self._refresh_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._refresh_task = None
+
+
+MIRROR = PatreonMirror(
+    interval=PATREON_SYNC_INTERVAL, snapshot_interval=PATREON_SNAPSHOT_INTERVAL
+)
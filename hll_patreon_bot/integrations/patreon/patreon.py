@@ -1,22 +1,37 @@
-import json
-from typing import Any
+import asyncio
+import contextlib
+from itertools import islice
+from typing import AsyncGenerator
 
 import httpx
 from loguru import logger
 
-from hll_patreon_bot.bot.constants import PATREON_ACCESS_TOKEN, PATREON_CAMPAIGN_ID
+from hll_patreon_bot import metrics
+from hll_patreon_bot.bot.constants import (
+    PATREON_ACCESS_TOKEN,
+    PATREON_CAMPAIGN_ID,
+    PATREON_PAGE_SIZE,
+)
+from hll_patreon_bot.integrations.httpcache import parse_cached
 from hll_patreon_bot.integrations.patreon.constants import (
     CAMPAIGN_MEMBERS_PARAMS,
     CAMPAIGN_MEMBERS_URL,
+    FIELD_PROFILES,
     MEMBER_BY_ID_PARAMS,
     MEMBER_BY_ID_URL,
+    FieldProfile,
 )
 from hll_patreon_bot.integrations.patreon.parsers import (
-    parse_campaign_members,
+    iter_campaign_members_page,
+    parse_campaign_members_page,
     parse_member,
+    parse_next_link,
 )
 from hll_patreon_bot.integrations.patreon.types import PatreonMember
 
+# members stream_campaign_members decodes per trip to a worker thread
+STREAM_CHUNK_SIZE = 50
+
 
 def get_auth_header():
     return {"Authorization": f"Bearer {PATREON_ACCESS_TOKEN}"}
@@ -27,19 +42,124 @@ async def get_member(
     member_id: str,
     url: str = MEMBER_BY_ID_URL,
     includes: dict[str, str] = MEMBER_BY_ID_PARAMS,
+    profile: FieldProfile | None = None,
 ):
+    """`profile` picks the fields to ask for, overriding `includes`"""
+    if profile is not None:
+        includes = FIELD_PROFILES[profile]
+
     res = await client.get(
         url=url.format(member_id=member_id), params=includes, headers=get_auth_header()
     )
-    # logger.error(f"{url=}")
-    # logger.error(f"{json.dumps(includes)}")
-    content = res.json()
-    # logger.warning(f"{json.dumps(content)}")
-
     if res.status_code == 404:
         return None
+    res.raise_for_status()
+
+    return parse_cached(res, parse_member)
+
+
+async def _fetch_page(client: httpx.AsyncClient, url: str, params: dict[str, str]):
+    with metrics.timed("patreon.campaign_members.page"):
+        res = await client.get(url=url, params=params, headers=get_auth_header())
+    res.raise_for_status()
+    return res.content
+
 
-    return parse_member(data=content)
+async def _iter_page_bodies(
+    client: httpx.AsyncClient, url: str, params: dict[str, str]
+) -> AsyncGenerator[tuple[bytes, str | None], None]:
+    """Yield each raw page body starting from `url` and the link to the next page
+
+    The next page is requested as soon as its link has been read out of the
+    current one, so it downloads while the current page is handled
+    """
+    fetch: asyncio.Task[bytes] | None = asyncio.create_task(
+        _fetch_page(client, url, params)
+    )
+
+    try:
+        while fetch is not None:
+            body = await fetch
+            next_link = parse_next_link(data=body)
+            fetch = None
+            if next_link:
+                logger.info(
+                    f"Fetching next page of campaign members next_link={next_link[-10:]}"
+                )
+                fetch = asyncio.create_task(_fetch_page(client, next_link, params))
+
+            yield body, next_link
+    finally:
+        # the caller stopped early, don't leave the prefetch running
+        if fetch is not None:
+            fetch.cancel()
+            # nor its exception unretrieved if it had already failed
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await fetch
+
+
+async def iter_campaign_member_pages(
+    client: httpx.AsyncClient,
+    cursor: str | None = None,
+    campaign_id: str = PATREON_CAMPAIGN_ID,
+    url: str = CAMPAIGN_MEMBERS_URL,
+    includes: dict[str, str] = CAMPAIGN_MEMBERS_PARAMS,
+    page_size: int = PATREON_PAGE_SIZE,
+    profile: FieldProfile | None = None,
+) -> AsyncGenerator[tuple[dict[str, PatreonMember], str | None], None]:
+    """Yield each page of campaign members and the link to the page after it
+
+    The next page downloads while the current page is parsed and handled by
+    the caller. Pass a previously yielded link as `cursor` to resume from
+    that page. `profile` picks the fields to ask for, overriding `includes`
+    """
+    if profile is not None:
+        includes = FIELD_PROFILES[profile]
+    params = includes | {"page[count]": str(page_size)}
+
+    bodies = _iter_page_bodies(
+        client, cursor or url.format(campaign_id=campaign_id), params
+    )
+    try:
+        async for body, next_link in bodies:
+            page, _ = await asyncio.to_thread(parse_campaign_members_page, data=body)
+            yield page, next_link
+    finally:
+        await bodies.aclose()
+
+
+async def stream_campaign_members(
+    client: httpx.AsyncClient,
+    campaign_id: str = PATREON_CAMPAIGN_ID,
+    url: str = CAMPAIGN_MEMBERS_URL,
+    includes: dict[str, str] = CAMPAIGN_MEMBERS_PARAMS,
+    page_size: int = PATREON_PAGE_SIZE,
+    profile: FieldProfile | None = None,
+) -> AsyncGenerator[PatreonMember, None]:
+    """Yield every campaign member one at a time
+
+    Unlike get_campaign_members nothing is kept once it has been yielded, at
+    most the page being read and the prefetched next one are held in memory
+    however large the campaign is. Pledge events are only ever included on
+    the same page as the member they belong to, so they're joined per page.
+    `profile` picks the fields to ask for, overriding `includes`
+    """
+    if profile is not None:
+        includes = FIELD_PROFILES[profile]
+    params = includes | {"page[count]": str(page_size)}
+
+    bodies = _iter_page_bodies(client, url.format(campaign_id=campaign_id), params)
+    try:
+        async for body, _ in bodies:
+            # decoded off the event loop a few members at a time
+            members, _ = await asyncio.to_thread(iter_campaign_members_page, data=body)
+            while chunk := await asyncio.to_thread(
+                list, islice(members, STREAM_CHUNK_SIZE)
+            ):
+                for member in chunk:
+                    yield member
+    finally:
+        await bodies.aclose()
 
 
 async def get_campaign_members(
@@ -48,29 +168,21 @@ async def get_campaign_members(
     campaign_id: str = PATREON_CAMPAIGN_ID,
     url: str = CAMPAIGN_MEMBERS_URL,
     includes: dict[str, str] = CAMPAIGN_MEMBERS_PARAMS,
+    profile: FieldProfile | None = None,
 ):
-    url = url.format(campaign_id=campaign_id)
-    res = await client.get(url=url, params=includes, headers=get_auth_header())
-    content: dict[str, Any] = res.json()
     members: dict[str, PatreonMember] = {}
 
-    # logger.error(f"{url=}")
-    # logger.warning(f"{includes=}")
-    # logger.error(f"{res.url=}")
-
-    # logger.warning(f"{json.dumps(content)}")
-    members |= parse_campaign_members(data=content)
-    yield members
-
-    while (
-        next_link := content.get("links", {}).get("next")
-    ) and member_id not in members:
-        logger.info(
-            f"Fetching next page of campaign members next_link={next_link[-10:]}"
-        )
-        res = await client.get(
-            url=next_link, params=includes, headers=get_auth_header()
-        )
-        content: dict[str, Any] = res.json()
-        members |= parse_campaign_members(data=content)
+    pages = iter_campaign_member_pages(
+        client=client,
+        campaign_id=campaign_id,
+        url=url,
+        includes=includes,
+        profile=profile,
+    )
+    async for page, _ in pages:
+        members |= page
         yield members
+
+        if member_id in members:
+            await pages.aclose()
+            break
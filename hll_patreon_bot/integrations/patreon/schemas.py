@@ -0,0 +1,212 @@
+"""Declarative schemas for the Patreon JSON:API documents we consume
+
+Decoders are compiled once per document type and decode the raw bytes straight
+into these structs, anything not declared here (most of the included campaign
+and tier objects) is skipped without ever being built into Python objects
+"""
+
+from datetime import datetime
+from typing import Any, TypeVar
+
+import msgspec
+
+from hll_patreon_bot.integrations.patreon.types import ChargeStatus, PatronStatus
+
+T = TypeVar("T")
+
+
+class SchemaError(KeyError):
+    """A payload is missing required fields or has the wrong types
+
+    A KeyError since that's what the dict walking parsers used to raise
+    """
+
+
+class ResourceId(msgspec.Struct, kw_only=True):
+    id: str
+    type: str
+
+
+class ToOne(msgspec.Struct, kw_only=True):
+    data: ResourceId | None = None
+
+
+class ToMany(msgspec.Struct, kw_only=True):
+    data: list[ResourceId] = []
+
+
+class Relationships(msgspec.Struct, kw_only=True):
+    user: ToOne | None = None
+    pledge_history: ToMany | None = None
+
+    @property
+    def user_id(self) -> str | None:
+        return self.user.data.id if self.user and self.user.data else None
+
+    @property
+    def pledge_ids(self) -> set[str]:
+        if self.pledge_history is None:
+            return set()
+        return {obj.id for obj in self.pledge_history.data}
+
+
+class DiscordConnection(msgspec.Struct, kw_only=True):
+    user_id: str | None = None
+
+
+class SocialConnections(msgspec.Struct, kw_only=True):
+    discord: DiscordConnection | None = None
+
+
+class IncludedAttributes(msgspec.Struct, kw_only=True):
+    """The attributes we use of every included type we care about
+
+    user: social_connections, thumb_url
+    pledge-event: type, amount_cents, date, payment_status, tier_id
+    """
+
+    social_connections: SocialConnections | None = None
+    thumb_url: str | None = None
+    type: str | None = None
+    amount_cents: int | None = None
+    date: datetime | None = None
+    payment_status: str | None = None
+    tier_id: str | None = None
+
+    @property
+    def discord_user_id(self) -> str | None:
+        if self.social_connections and self.social_connections.discord:
+            return self.social_connections.discord.user_id
+        return None
+
+
+class Resource(msgspec.Struct, kw_only=True):
+    type: str
+    id: str
+    attributes: IncludedAttributes = msgspec.field(default_factory=IncludedAttributes)
+
+
+class Document(msgspec.Struct, kw_only=True):
+    included: list[Resource] = []
+
+
+class MemberWebhookAttributes(msgspec.Struct, kw_only=True):
+    email: str | None
+    last_charge_date: datetime | None
+    last_charge_status: str | None
+    patron_status: str | None
+    currently_entitled_amount_cents: int | None = None
+
+
+class MemberWebhookData(msgspec.Struct, kw_only=True):
+    id: str | None
+    attributes: MemberWebhookAttributes
+    relationships: Relationships = msgspec.field(default_factory=Relationships)
+
+
+class MemberWebhookDocument(Document):
+    data: MemberWebhookData
+
+
+class PledgeWebhookAttributes(msgspec.Struct, kw_only=True):
+    last_charge_date: datetime
+    last_charge_status: str | None
+    patron_status: str
+    email: str | None = None
+    currently_entitled_amount_cents: int | None = None
+    next_charge_date: datetime | None = None
+
+
+class PledgeWebhookData(msgspec.Struct, kw_only=True):
+    id: str | None
+    attributes: PledgeWebhookAttributes
+    relationships: Relationships = msgspec.field(default_factory=Relationships)
+
+
+class PledgeWebhookDocument(Document):
+    data: PledgeWebhookData
+
+
+class MemberAttributes(msgspec.Struct, kw_only=True):
+    # anything can be left out of the response, see constants.FIELD_PROFILES
+    email: str | None = None
+    full_name: str | None = None
+    last_charge_date: datetime | None = None
+    last_charge_status: str | None = None
+    patron_status: str | None = None
+    note: str | None = None
+    currently_entitled_amount_cents: int | None = 0
+    next_charge_date: datetime | None = None
+
+
+class MemberData(msgspec.Struct, kw_only=True):
+    id: str
+    attributes: MemberAttributes
+    relationships: Relationships = msgspec.field(default_factory=Relationships)
+
+
+class MemberDocument(Document):
+    data: MemberData
+
+
+class Links(msgspec.Struct, kw_only=True):
+    next: str | None = None
+
+
+class PageLinks(msgspec.Struct, kw_only=True):
+    """Only the pagination links of a document, everything else is skipped"""
+
+    links: Links | None = None
+
+    @property
+    def next_link(self) -> str | None:
+        return self.links.next if self.links else None
+
+
+class CampaignMembersDocument(Document):
+    data: list[MemberData]
+    links: Links | None = None
+
+    @property
+    def next_link(self) -> str | None:
+        return self.links.next if self.links else None
+
+
+class CampaignMembersStream(Document):
+    """A campaign members page with each member left undecoded until it's read"""
+
+    data: list[msgspec.Raw]
+    links: Links | None = None
+
+    @property
+    def next_link(self) -> str | None:
+        return self.links.next if self.links else None
+
+
+MEMBER_WEBHOOK = msgspec.json.Decoder(MemberWebhookDocument)
+PLEDGE_WEBHOOK = msgspec.json.Decoder(PledgeWebhookDocument)
+MEMBER = msgspec.json.Decoder(MemberDocument)
+CAMPAIGN_MEMBERS = msgspec.json.Decoder(CampaignMembersDocument)
+CAMPAIGN_MEMBERS_STREAM = msgspec.json.Decoder(CampaignMembersStream)
+MEMBER_DATA = msgspec.json.Decoder(MemberData)
+PAGE_LINKS = msgspec.json.Decoder(PageLinks)
+
+
+def decode(
+    decoder: msgspec.json.Decoder[T], data: dict[str, Any] | bytes | str | msgspec.Raw
+) -> T:
+    """Decode a raw body, or validate an already decoded document"""
+    try:
+        if isinstance(data, (bytes, str, msgspec.Raw)):
+            return decoder.decode(data)
+        return msgspec.convert(data, decoder.type)
+    except msgspec.ValidationError as e:
+        raise SchemaError(str(e)) from e
+
+
+def charge_status(value: str | None) -> ChargeStatus:
+    return ChargeStatus[value.lower()] if value else ChargeStatus.none
+
+
+def patron_status(value: str | None) -> PatronStatus:
+    return PatronStatus[value] if value else PatronStatus.none
@@ -0,0 +1,181 @@
+"""In memory search index over the campaign members
+
+Exact lookups (member ID, email, Discord ID) are hash maps, names are
+searched through an inverted index of their words and notes through an index
+of their trigrams, so searching never has to scan every member
+"""
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from hll_patreon_bot.integrations.patreon.types import PatreonMember
+
+_WORD = re.compile(r"\w+")
+NGRAM_SIZE = 3
+
+_EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def tokenize(text: str | None) -> set[str]:
+    return set(_WORD.findall(text.lower())) if text else set()
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> set[str]:
+    return {text[idx : idx + size] for idx in range(len(text) - size + 1)}
+
+
+def _rank(member: PatreonMember) -> tuple[bool, float, str]:
+    """Sort key that puts active patrons and then the most recently charged first"""
+    return (
+        not member.patron_status.is_successful(),
+        -(member.last_charge_date or _EPOCH).timestamp(),
+        member.id,
+    )
+
+
+def _add(index: dict, key, member_id: str) -> None:
+    index[key].add(member_id)
+
+
+def _discard(index: dict, key, member_id: str) -> None:
+    ids = index.get(key)
+    if ids is None:
+        return
+    ids.discard(member_id)
+    if not ids:
+        del index[key]
+
+
+class MemberIndex:
+    """Campaign members indexed by every field search_patreon looks them up by
+
+    Members can be added, replaced and removed one at a time as they change
+    """
+
+    def __init__(self, members: Iterable[PatreonMember] = ()) -> None:
+        self._members: dict[str, PatreonMember] = {}
+        self._emails: defaultdict[str, set[str]] = defaultdict(set)
+        self._discord_ids: defaultdict[int, set[str]] = defaultdict(set)
+        self._words: defaultdict[str, set[str]] = defaultdict(set)
+        self._ngrams: defaultdict[str, set[str]] = defaultdict(set)
+        self._notes: dict[str, str] = {}
+        # sorted copy of self._words for prefix searches, rebuilt when a search
+        # needs it after a member brought in new words
+        self._vocabulary: list[str] | None = None
+        self.update(members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __contains__(self, member_id: object) -> bool:
+        return member_id in self._members
+
+    def __iter__(self) -> Iterator[PatreonMember]:
+        return iter(self._members.values())
+
+    def get(self, member_id: str) -> PatreonMember | None:
+        return self._members.get(member_id)
+
+    def add(self, member: PatreonMember) -> None:
+        """Index a member, replacing any previous version of it"""
+        member_id = member.id
+        self.remove(member_id)
+        self._members[member_id] = member
+
+        if member.email:
+            _add(self._emails, member.email.lower(), member_id)
+        if member.discord_user_id is not None:
+            _add(self._discord_ids, member.discord_user_id, member_id)
+        for word in tokenize(member.name):
+            if word not in self._words:
+                self._vocabulary = None
+            _add(self._words, word, member_id)
+        if member.note:
+            note = member.note.lower()
+            self._notes[member_id] = note
+            for ngram in ngrams(note):
+                _add(self._ngrams, ngram, member_id)
+
+    def update(self, members: Iterable[PatreonMember]) -> None:
+        for member in members:
+            self.add(member)
+
+    def remove(self, member_id: str) -> PatreonMember | None:
+        member = self._members.pop(member_id, None)
+        if member is None:
+            return None
+
+        if member.email:
+            _discard(self._emails, member.email.lower(), member_id)
+        if member.discord_user_id is not None:
+            _discard(self._discord_ids, member.discord_user_id, member_id)
+        for word in tokenize(member.name):
+            _discard(self._words, word, member_id)
+            if word not in self._words:
+                self._vocabulary = None
+        note = self._notes.pop(member_id, None)
+        if note:
+            for ngram in ngrams(note):
+                _discard(self._ngrams, ngram, member_id)
+
+        return member
+
+    def _best(self, member_ids: set[str] | None) -> PatreonMember | None:
+        if not member_ids:
+            return None
+        return min((self._members[id_] for id_ in member_ids), key=_rank)
+
+    def find_email(self, email: str) -> PatreonMember | None:
+        return self._best(self._emails.get(email.lower()))
+
+    def find_discord_user(self, discord_user_id: int) -> PatreonMember | None:
+        return self._best(self._discord_ids.get(discord_user_id))
+
+    def _words_starting_with(self, prefix: str) -> Iterator[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._words)
+
+        idx = bisect_left(self._vocabulary, prefix)
+        while idx < len(self._vocabulary) and self._vocabulary[idx].startswith(prefix):
+            yield self._vocabulary[idx]
+            idx += 1
+
+    def search_name(self, query: str, limit: int | None = 5) -> list[PatreonMember]:
+        """Members with a word in their name starting with any word in `query`
+
+        Members matching more of the query (whole words counting double) rank
+        first
+        """
+        scores: defaultdict[str, int] = defaultdict(int)
+        for chunk in tokenize(query):
+            for word in self._words_starting_with(chunk):
+                for member_id in self._words[word]:
+                    scores[member_id] += 2 if word == chunk else 1
+
+        ranked = sorted(
+            scores,
+            key=lambda id_: (-scores[id_], _rank(self._members[id_])),
+        )
+        return [self._members[id_] for id_ in ranked[:limit]]
+
+    def search_notes(self, query: str, limit: int | None = 5) -> list[PatreonMember]:
+        """Members whose note contains `query`, ignoring case"""
+        query = query.lower()
+        if not query:
+            return []
+
+        if len(query) < NGRAM_SIZE:
+            candidates: Iterable[str] = self._notes
+        else:
+            postings = sorted(
+                (self._ngrams.get(ngram, set()) for ngram in ngrams(query)), key=len
+            )
+            candidates = set.intersection(*postings)
+
+        matches = [
+            self._members[id_] for id_ in candidates if query in self._notes[id_]
+        ]
+        return sorted(matches, key=_rank)[:limit]
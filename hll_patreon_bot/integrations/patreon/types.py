@@ -2,6 +2,8 @@ import enum
 from datetime import datetime
 from typing import TypedDict
 
+import msgspec
+
 
 class PatronStatus(enum.Enum):
     active_patron = "Active"
@@ -41,49 +43,51 @@ class PledgeEventType(enum.Enum):
         return self.value.replace("_", " ").title()
 
 
-class PledgeHistory(TypedDict):
+# Members and their pledges are held for the whole campaign (the mirror's
+# search index, the search fallback) so they're compact structs rather than
+# dicts. gc=False is safe since they never reference each other
+class PledgeHistory(msgspec.Struct, kw_only=True, gc=False):
     id: str
     type: PledgeEventType
     amount_cents: int
     date: datetime
     status: ChargeStatus
-    tier_id: str
+    tier_id: str | None
 
 
-# TODO: include pledge history again
-class PatreonMember(TypedDict):
+class PatreonMember(msgspec.Struct, kw_only=True, gc=False):
     id: str
-    name: str
-    email: str
+    name: str | None
+    email: str | None
     currently_entitled_amount_cents: int
     last_charge_date: datetime | None
     last_charge_status: ChargeStatus
     next_charge_date: datetime | None
     patron_status: PatronStatus
     discord_user_id: int | None
-    note: str
+    note: str | None
+    user_id: str | None
     thumb_url: str | None  # user
     pledge_ids: set[str]
     pledge_history: list[PledgeHistory]
 
 
-# TODO: include pledge history again
 class PatreonCampaignMember(TypedDict):
     id: str
-    name: str
-    email: str
+    name: str | None
+    email: str | None
     currently_entitled_amount_cents: int
     last_charge_date: datetime | None
     last_charge_status: ChargeStatus
     next_charge_date: datetime | None
     patron_status: PatronStatus
-    note: str
+    note: str | None
 
     # includes
-    user_id: str
+    user_id: str | None
     pledge_ids: set[str]
 
 
 class PatreonUserAttributes(TypedDict):
-    thumb_url: str
+    thumb_url: str | None
     discord_user_id: int | None
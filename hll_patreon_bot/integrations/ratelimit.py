@@ -0,0 +1,252 @@
+"""Client side rate limiting for outbound API calls
+
+Every request through a RateLimitedTransport takes a token from a shared
+TokenBucket first, interactive requests (slash commands) are handed tokens
+before background ones (the mirror's crawl) whenever they're both waiting.
+Throttled responses are retried after the Retry-After the API asked for, or
+a jittered exponential backoff when it didn't say
+"""
+
+import asyncio
+import enum
+import heapq
+import itertools
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Generator
+
+import httpx
+from loguru import logger
+
+from hll_patreon_bot import metrics
+
+THROTTLED = (429, 503)
+# only requests that are safe to send twice are retried
+RETRYABLE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Priority(enum.IntEnum):
+    interactive = 0
+    background = 1
+
+
+PRIORITY: ContextVar[Priority] = ContextVar("PRIORITY", default=Priority.interactive)
+
+
+@contextmanager
+def background() -> Generator[None, None, None]:
+    """Send any request made inside this block (and tasks it starts) as background"""
+    token = PRIORITY.set(Priority.background)
+    try:
+        yield
+    finally:
+        PRIORITY.reset(token)
+
+
+class TokenBucket:
+    """`rate` tokens a second, up to `capacity` saved up for bursts
+
+    Waiters are served by priority and then in the order they arrived
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        # nothing is handed out until then, see pause()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _refill(self) -> float:
+        now = self._clock()
+        # nothing accrues while paused so we don't burst straight after
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = now
+        return now
+
+    def _take(self) -> bool:
+        now = self._refill()
+        if now < self._paused_until or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters:
+            *_, waiter = self._waiters[0]
+            if waiter.done():
+                # cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take():
+                break
+            heapq.heappop(self._waiters)
+            waiter.set_result(None)
+
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if not self._waiters or self._timer is not None:
+            return
+
+        now = self._refill()
+        ready_at = max(now, self._paused_until) + max(0.0, 1 - self._tokens) / self.rate
+        delay = ready_at - now
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: Priority = Priority.interactive) -> float:
+        """Wait for a token, returns how many seconds that took"""
+        if not self._waiters and self._take():
+            return 0.0
+
+        start = self._clock()
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        self._schedule()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # we were handed a token just as we got cancelled, pass it on
+                self._tokens += 1
+                self._dispatch()
+            raise
+        return self._clock() - start
+
+    def paused_for(self) -> float:
+        """Seconds left before tokens are handed out again after a pause()"""
+        return max(0.0, self._paused_until - self._clock())
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for `seconds`, after the API told us to back off"""
+        self._refill()
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0.0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            self._schedule()
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """Seconds the Retry-After header asks us to wait, if it's there"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+def backoff(attempts: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with equal jitter, so clients throttled together
+    don't all come back at once"""
+    delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Wrap a transport so every request goes through `bucket`
+
+    Throttled GETs are retried up to `max_retries` times, after that the
+    throttled response is returned to the caller. Waits are capped at
+    `max_delay` whatever Retry-After says, and interactive requests are
+    throttled straight back rather than waiting longer than
+    `max_interactive_wait` (Discord gives slash commands 3 seconds to respond)
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        bucket: TokenBucket,
+        name: str,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        max_interactive_wait: float = 2.0,
+    ) -> None:
+        self._transport = transport
+        self.bucket = bucket
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_interactive_wait = max_interactive_wait
+
+    def _too_long(self, priority: Priority, delay: float) -> bool:
+        return priority == Priority.interactive and delay > self.max_interactive_wait
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        priority = PRIORITY.get()
+        attempts = 0
+        while True:
+            attempts += 1
+            if self._too_long(priority, paused := self.bucket.paused_for()):
+                # still backing off from an earlier throttle
+                metrics.incr(f"{self.name}.throttled.interactive")
+                return httpx.Response(
+                    429,
+                    headers={"Retry-After": str(math.ceil(paused))},
+                    request=request,
+                )
+
+            waited = await self.bucket.acquire(priority)
+            if waited:
+                metrics.observe(f"{self.name}.throttle_wait.{priority.name}", waited)
+
+            response = await self._transport.handle_async_request(request)
+            if (
+                response.status_code not in THROTTLED
+                or request.method not in RETRYABLE_METHODS
+                or attempts > self.max_retries
+            ):
+                return response
+
+            delay = retry_after(response)
+            if delay is None:
+                delay = backoff(attempts, self.base_delay, self.max_delay)
+            delay = min(delay, self.max_delay)
+
+            metrics.incr(f"{self.name}.throttled")
+            self.bucket.pause(delay)
+            if self._too_long(priority, delay):
+                # hand it back, background requests still wait it out
+                metrics.incr(f"{self.name}.throttled.interactive")
+                return response
+
+            await response.aclose()
+            logger.warning(
+                f"{self.name} throttled {request.url.path} ({response.status_code}), "
+                f"retrying in {delay:.1f}s"
+            )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
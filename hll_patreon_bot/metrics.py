@@ -0,0 +1,71 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Generator
+
+# Simple process local metrics, read through `snapshot()` by whatever wants to
+# expose them (the webhook listeners /stats route, bot commands, logs)
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+COUNTERS: Counter[str] = Counter()
+GAUGES: dict[str, float] = {}
+TIMINGS: defaultdict[str, Timing] = defaultdict(Timing)
+
+
+def incr(name: str, amount: int = 1) -> None:
+    COUNTERS[name] += amount
+
+
+def set_gauge(name: str, value: float) -> None:
+    GAUGES[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    TIMINGS[name].observe(seconds)
+
+
+@contextmanager
+def timed(name: str) -> Generator[None, None, None]:
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - start)
+
+
+def snapshot() -> dict[str, Any]:
+    return {
+        "counters": dict(COUNTERS),
+        "gauges": dict(GAUGES),
+        "timings": {
+            name: {
+                "count": t.count,
+                "mean": t.mean,
+                "max": t.max,
+            }
+            for name, t in TIMINGS.items()
+        },
+    }
+
+
+def reset() -> None:
+    COUNTERS.clear()
+    GAUGES.clear()
+    TIMINGS.clear()
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
 
 import httpx
 from loguru import logger
@@ -12,6 +13,12 @@ from hll_patreon_bot.integrations.crcon.crcon import (
     fetch_current_vips,
 )
 from hll_patreon_bot.patreon_webhook.types import (
+    MEMBER_CREATE,
+    MEMBER_DELETE,
+    MEMBER_UPDATE,
+    PLEDGE_CREATE,
+    PLEDGE_DELETE,
+    PLEDGE_UPDATE,
     PatreonMemberWH,
     PatreonPledgeWH,
     PatreonTriggerAction,
@@ -77,12 +84,22 @@ async def handle_pledge_delete(client: httpx.AsyncClient, data: PatreonPledgeWH)
     pass
 
 
-async def handle_pledge_update(client: httpx.AsyncClient, data: PatreonPledgeWH):
+async def handle_pledge_update(
+    client: httpx.AsyncClient,
+    data: PatreonPledgeWH,
+    completed: set[str] | None = None,
+):
     # If they are a current patron and payment status is paid
     # add the difference between their next charge date and now to their current VIP expiration
     # or if no expiration, set it the next charge date
     # logger.info(f"{data=}")
 
+    # Players are added to `completed` as their VIP is extended and skipped if
+    # they're already in it, so retrying after a partial failure can't extend
+    # anyone twice
+    if completed is None:
+        completed = set()
+
     patreon_id = data["id"]
     patreon_status = data["patron_status"]
     last_charge_status = data["last_charge_status"]
@@ -118,6 +135,10 @@ async def handle_pledge_update(client: httpx.AsyncClient, data: PatreonPledgeWH)
                 for discord_player in patreon_record.discord.players:
                     modified_players = True
                     player_id = discord_player.player.player_id
+                    if player_id in completed:
+                        logger.info(f"VIP already extended for {player_id=}")
+                        continue
+
                     vip_info = current_vips.get(player_id)
                     vip_name = vip_info.name if vip_info else MISSING_PLAYER_NAME
                     current_expiration = await fetch_current_expiration(
@@ -127,7 +148,7 @@ async def handle_pledge_update(client: httpx.AsyncClient, data: PatreonPledgeWH)
                     new_expiration = calc_vip_expiration_timestamp(
                         earned=earned_time,
                         current_expiration=(
-                            current_expiration["expiration"]
+                            current_expiration.expiration
                             if current_expiration
                             else None
                         ),
@@ -142,6 +163,7 @@ async def handle_pledge_update(client: httpx.AsyncClient, data: PatreonPledgeWH)
                         description=vip_name,
                         expiration_timestamp=new_expiration,
                     )
+                    completed.add(player_id)
 
                 if not modified_players:
                     logger.warning(
@@ -149,15 +171,31 @@ async def handle_pledge_update(client: httpx.AsyncClient, data: PatreonPledgeWH)
                     )
 
 
+PARSERS: dict[
+    PatreonWebhook, Callable[[dict[str, Any]], PatreonMemberWH | PatreonPledgeWH]
+] = {
+    MEMBER_CREATE: parse_patreon_member_webhook,
+    MEMBER_UPDATE: parse_patreon_member_webhook,
+    MEMBER_DELETE: parse_patreon_member_webhook,
+    PLEDGE_CREATE: parse_patreon_pledge_webhook,
+    PLEDGE_UPDATE: parse_patreon_pledge_webhook,
+    PLEDGE_DELETE: parse_patreon_pledge_webhook,
+}
+
+ACTIONS: dict[PatreonWebhook, Callable[..., Awaitable[Any]]] = {
+    MEMBER_CREATE: handle_member_create,
+    MEMBER_UPDATE: handle_member_update,
+    MEMBER_DELETE: handle_member_delete,
+    PLEDGE_CREATE: handle_pledge_create,
+    PLEDGE_UPDATE: handle_pledge_update,
+    PLEDGE_DELETE: handle_pledge_delete,
+}
+
+
 def lookup_parser(event: PatreonWebhook):
-    if event.sub_resource is None:
-        return parse_patreon_member_webhook
-    elif (
-        event.resource == PatreonTriggerResource.MEMBER
-        and event.sub_resource == PatreonTriggerResource.PLEDGE
-    ):
-        return parse_patreon_pledge_webhook
-    else:
+    try:
+        return PARSERS[event]
+    except KeyError:
         raise ValueError(f"No parser found for {event=}")
 
 
@@ -166,38 +204,63 @@ async def lookup_action(
     client: httpx.AsyncClient,
     data: PatreonMemberWH | PatreonPledgeWH,
 ):
-    if event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.CREATE,
-    ):
-        return await handle_member_create(client=client, data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.DELETE,
-    ):
-        return await handle_member_delete(client=client, data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.UPDATE,
-    ):
-        return await handle_member_update(client=client, data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.CREATE,
-    ):
-        return await handle_pledge_create(client=client, data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.DELETE,
-    ):
-        return await handle_pledge_delete(client=client, data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.UPDATE,
-    ):
-        return await handle_pledge_update(client=client, data=data)  # type: ignore
-    else:
+    try:
+        action = ACTIONS[event]
+    except KeyError:
         raise ValueError(f"Unmatched {event}")
+
+    return await action(client=client, data=data)
+
+
+async def process_event(
+    event: PatreonWebhook, client: httpx.AsyncClient, data: dict[str, Any] | bytes
+) -> PatreonMemberWH | PatreonPledgeWH:
+    """Parse a raw webhook payload and run its action"""
+    parser = lookup_parser(event=event)
+    parsed_data = parser(data)
+    await lookup_action(event=event, client=client, data=parsed_data)
+    return parsed_data
+
+
+def merge_member_events(
+    events: list[tuple[PatreonWebhook, PatreonMemberWH | PatreonPledgeWH]],
+) -> tuple[PatreonMemberWH | PatreonPledgeWH | None, PatreonPledgeWH | None]:
+    """Collapse a burst of webhooks for one member into a single effective state
+
+    Patreon fires member:create, members:pledge:create and member:update together
+    for a single signup, returns the latest member data with a linked Discord
+    account and the pledge data with the latest last_charge_date (and therefore
+    patron status), later events win ties
+    """
+    link_data: PatreonMemberWH | PatreonPledgeWH | None = None
+    pledge_data: PatreonPledgeWH | None = None
+
+    for event, data in events:
+        if event.action == PatreonTriggerAction.DELETE:
+            continue
+
+        if event.sub_resource is None:
+            if data["discord_user_id"]:
+                link_data = data
+        elif event.sub_resource == PatreonTriggerResource.PLEDGE:
+            if (
+                pledge_data is None
+                or data["last_charge_date"] >= pledge_data["last_charge_date"]  # type: ignore
+            ):
+                pledge_data = data  # type: ignore
+
+    return link_data, pledge_data
+
+
+async def handle_member_events(
+    client: httpx.AsyncClient,
+    events: list[tuple[PatreonWebhook, PatreonMemberWH | PatreonPledgeWH]],
+    completed: set[str] | None = None,
+):
+    """Run at most one Discord link and one VIP update for a burst of events"""
+    link_data, pledge_data = merge_member_events(events)
+
+    if link_data:
+        await handle_member_update(client=client, data=link_data)  # type: ignore
+    if pledge_data:
+        await handle_pledge_update(client=client, data=pledge_data, completed=completed)
@@ -1,3 +1,5 @@
+import os
+
 PATREON_HEADERS = ("X-Patreon-Event", "X-Patreon-Signature")
 PATREON_TRIGGER_DELIMITER = ":"
 
@@ -7,3 +9,35 @@ RESOURCE_PLEDGE = "pledge"
 ACTION_CREATE = "create"
 ACTION_UPDATE = "update"
 ACTION_DELETE = "delete"
+
+# Number of background tasks parsing/processing accepted webhooks
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+
+# Back-pressure, once this many webhooks are queued or being processed new ones
+# get a 503 with Retry-After so Patreon redelivers them later
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", 200))
+WEBHOOK_SHED_RETRY_AFTER = int(os.getenv("WEBHOOK_SHED_RETRY_AFTER", 60))
+
+# Bearer token required to read /stats, the endpoint is disabled while unset
+WEBHOOK_STATS_TOKEN = os.getenv("WEBHOOK_STATS_TOKEN", "")
+
+# How many recent webhook identities to remember in memory for deduplication
+WEBHOOK_DEDUPE_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_CACHE_SIZE", 10_000))
+
+# Max seconds a webhook embed waits to be batched with others before forwarding
+DISCORD_FORWARD_INTERVAL = float(os.getenv("DISCORD_FORWARD_INTERVAL", 2.0))
+# Embeds kept while Discord is unreachable, the oldest are dropped past this
+DISCORD_FORWARD_MAX_BUFFERED = int(os.getenv("DISCORD_FORWARD_MAX_BUFFERED", 1000))
+
+# Seconds to wait for more webhooks for the same member before acting on them
+WEBHOOK_COALESCE_WINDOW = float(os.getenv("WEBHOOK_COALESCE_WINDOW", 2.0))
+
+# Failed webhook actions are retried with an exponential backoff starting at
+# WEBHOOK_RETRY_BASE_DELAY seconds, after WEBHOOK_RETRY_MAX_ATTEMPTS they are dead lettered
+WEBHOOK_RETRY_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_RETRY_MAX_ATTEMPTS", 8))
+WEBHOOK_RETRY_BASE_DELAY = float(os.getenv("WEBHOOK_RETRY_BASE_DELAY", 30))
+WEBHOOK_RETRY_MAX_DELAY = float(os.getenv("WEBHOOK_RETRY_MAX_DELAY", 3600))
+# How often to check for due retries (and dead letters requeued from Discord)
+WEBHOOK_RETRY_POLL_INTERVAL = float(os.getenv("WEBHOOK_RETRY_POLL_INTERVAL", 5))
+WEBHOOK_RETRY_CONCURRENCY = int(os.getenv("WEBHOOK_RETRY_CONCURRENCY", 2))
@@ -0,0 +1,43 @@
+import hashlib
+
+from cachetools import LRUCache
+
+from hll_patreon_bot import metrics
+
+
+def event_identity(event_header: str, body: bytes) -> str:
+    """Identify a webhook delivery without parsing it
+
+    The member ID, last_charge_date etc. are all part of the body, so a digest of
+    the trigger plus the raw body changes whenever any of them do, while
+    Patreon redelivering the same event produces the same identity
+    """
+    digest = hashlib.sha256(event_header.encode())
+    digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class WebhookDeduplicator:
+    """Recently seen webhook identities
+
+    Only a cache in front of the unique index on the webhook journal, which is
+    what catches duplicates across restarts or once they have been evicted here
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self._seen: LRUCache[str, bool] = LRUCache(maxsize=maxsize)
+
+    def seen(self, identity: str) -> bool:
+        if identity in self._seen:
+            metrics.incr("webhook.dedupe.hit")
+            return True
+
+        metrics.incr("webhook.dedupe.miss")
+        return False
+
+    def add(self, identity: str) -> None:
+        self._seen[identity] = True
+
+    def __len__(self) -> int:
+        return len(self._seen)
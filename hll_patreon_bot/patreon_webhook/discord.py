@@ -1,8 +1,13 @@
+import asyncio
+from collections import deque
 from datetime import datetime, timezone
 from typing import Callable, Type
 
+import aiohttp
 import discord
+from loguru import logger
 
+from hll_patreon_bot import metrics
 from hll_patreon_bot.bot.utils import cents_as_currency
 from hll_patreon_bot.patreon_webhook.constants import (
     ACTION_CREATE,
@@ -14,10 +19,14 @@ from hll_patreon_bot.patreon_webhook.constants import (
     RESOURCE_PLEDGE,
 )
 from hll_patreon_bot.patreon_webhook.types import (
+    MEMBER_CREATE,
+    MEMBER_DELETE,
+    MEMBER_UPDATE,
+    PLEDGE_CREATE,
+    PLEDGE_DELETE,
+    PLEDGE_UPDATE,
     PatreonMemberWH,
     PatreonPledgeWH,
-    PatreonTriggerAction,
-    PatreonTriggerResource,
     PatreonWebhook,
 )
 
@@ -107,41 +116,164 @@ def create_pledge_update_embed(
     return embed
 
 
+EMBEDS: dict[
+    PatreonWebhook,
+    Callable[[PatreonMemberWH | PatreonPledgeWH], discord.Embed],
+] = {
+    MEMBER_CREATE: create_member_creation_embed,  # type: ignore
+    MEMBER_UPDATE: create_member_update_embed,  # type: ignore
+    MEMBER_DELETE: create_member_deletion_embed,  # type: ignore
+    PLEDGE_CREATE: create_pledge_creation_embed,  # type: ignore
+    PLEDGE_UPDATE: create_pledge_update_embed,  # type: ignore
+    PLEDGE_DELETE: create_pledge_deletion_embed,  # type: ignore
+}
+
+
 def lookup_action_embed(
     event: PatreonWebhook, data: PatreonMemberWH | PatreonPledgeWH
 ) -> discord.Embed:
-    if event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.CREATE,
-    ):
-        return create_member_creation_embed(data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.DELETE,
-    ):
-        return create_member_deletion_embed(data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        action=PatreonTriggerAction.UPDATE,
-    ):
-        return create_member_update_embed(data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.CREATE,
-    ):
-        return create_pledge_creation_embed(data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.DELETE,
-    ):
-        return create_pledge_deletion_embed(data=data)  # type: ignore
-    elif event == PatreonWebhook(
-        resource=PatreonTriggerResource.MEMBER,
-        sub_resource=PatreonTriggerResource.PLEDGE,
-        action=PatreonTriggerAction.UPDATE,
-    ):
-        return create_pledge_update_embed(data=data)  # type: ignore
-    else:
+    try:
+        create_embed = EMBEDS[event]
+    except KeyError:
         raise ValueError(f"Unmatched {event}")
+
+    return create_embed(data)
+
+
+# Discord rejects messages with more embeds/total embed characters than this
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_EMBED_CHARACTERS = 6000
+
+
+def _retry_after(error: Exception) -> float | None:
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        try:
+            return float(error.response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+    return None
+
+
+class EmbedForwarder:
+    """Buffer webhook embeds and forward them to Discord in batches
+
+    Embeds are packed into as few messages as Discord allows and flushed once a
+    message is full or every `flush_interval` seconds. The webhook adapter already
+    waits on Discord's rate limit bucket headers, failed sends are retried here
+    with a backoff (or the 429 Retry-After) without blocking webhook processing
+
+    At most `max_buffered` embeds wait to be sent, during a long Discord outage
+    the oldest are dropped to make room
+    """
+
+    def __init__(
+        self,
+        get_webhook: Callable[[], discord.Webhook],
+        flush_interval: float = 2.0,
+        max_attempts: int = 5,
+        max_buffered: int = 1000,
+    ) -> None:
+        self.get_webhook = get_webhook
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._buffer: deque[discord.Embed] = deque(maxlen=max_buffered)
+        self._overflowed = 0
+        self._batch_ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def forward(self, embed: discord.Embed) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            # appending pushes the oldest out
+            self._overflowed += 1
+            metrics.incr("discord.forward.overflowed")
+        self._buffer.append(embed)
+        metrics.incr("discord.forward.buffered")
+        metrics.set_gauge("discord.forward.buffer_size", len(self._buffer))
+
+        if len(self._buffer) >= DISCORD_MAX_EMBEDS:
+            self._batch_ready.set()
+
+    def _next_batch(self) -> list[discord.Embed]:
+        batch: list[discord.Embed] = []
+        characters = 0
+        while self._buffer and len(batch) < DISCORD_MAX_EMBEDS:
+            embed_characters = len(self._buffer[0])
+            if batch and characters + embed_characters > DISCORD_MAX_EMBED_CHARACTERS:
+                break
+            batch.append(self._buffer.popleft())
+            characters += embed_characters
+
+        metrics.set_gauge("discord.forward.buffer_size", len(self._buffer))
+        return batch
+
+    async def flush(self) -> None:
+        if self._overflowed:
+            logger.warning(
+                f"Dropped the {self._overflowed} oldest embeds, the buffer was full"
+            )
+            self._overflowed = 0
+
+        while batch := self._next_batch():
+            try:
+                await self._send(batch)
+            except Exception as e:
+                # e.g. no webhook configured, keep the loop going either way
+                metrics.incr("discord.forward.dropped", len(batch))
+                logger.exception(f"Dropping {len(batch)} embeds: {e}")
+
+    async def _send(self, embeds: list[discord.Embed]) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.get_webhook().send(embeds=embeds)
+            except (
+                discord.HTTPException,
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+            ) as e:
+                if (
+                    isinstance(e, discord.HTTPException)
+                    and e.status < 500
+                    and e.status != 429
+                ):
+                    # our fault (bad webhook URL/payload), retrying won't help
+                    break
+                if attempt == self.max_attempts:
+                    break
+
+                delay = _retry_after(e) or 2**attempt
+                metrics.incr("discord.forward.retries")
+                logger.warning(
+                    f"Forwarding {len(embeds)} embeds failed ({attempt=}), retrying in {delay}s: {e}"
+                )
+                await asyncio.sleep(delay)
+            else:
+                metrics.incr("discord.forward.messages")
+                metrics.incr("discord.forward.embeds", len(embeds))
+                return
+
+        metrics.incr("discord.forward.dropped", len(embeds))
+        logger.error(f"Dropping {len(embeds)} embeds that could not be forwarded")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._batch_ready.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="discord-forwarder")
+
+    async def stop(self) -> None:
+        """Forward anything still buffered and stop the flush loop"""
+        self._stopping = True
+        self._batch_ready.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
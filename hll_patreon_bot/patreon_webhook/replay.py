@@ -0,0 +1,175 @@
+"""Re-run journaled webhooks through their parser/action
+
+python -m hll_patreon_bot.patreon_webhook.replay --event-id 42
+python -m hll_patreon_bot.patreon_webhook.replay --start 2024-02-01 --end 2024-02-02
+
+Only failed events are replayed unless --status says otherwise, processed ones
+also need --include-processed since replaying them extends VIP again. Events
+still waiting to be retried (or dead lettered) are skipped, the listener runs
+them again on its own
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from hll_patreon_bot import serialization
+from hll_patreon_bot.database.models import WebhookEvent, WebhookStatus, enter_session
+from hll_patreon_bot.database.utils import (
+    get_retrying_webhook_event_ids,
+    get_webhook_events,
+    set_webhook_event_status,
+)
+from hll_patreon_bot.integrations.clients import CLIENTS
+from hll_patreon_bot.patreon_webhook.actions import process_event
+from hll_patreon_bot.patreon_webhook.utils import parse_event_header
+
+
+async def replay_event(client: httpx.AsyncClient, event: WebhookEvent) -> bool:
+    """Run a single journaled event, recording the outcome on the journal"""
+    try:
+        await process_event(
+            event=parse_event_header(event.event),
+            client=client,
+            data=event.body,
+        )
+    except Exception as e:
+        logger.exception(f"Replaying {event} failed: {e}")
+        with enter_session() as session:
+            set_webhook_event_status(
+                session=session,
+                event_id=event.id,
+                status=WebhookStatus.failed,
+                error=repr(e),
+            )
+        return False
+
+    with enter_session() as session:
+        set_webhook_event_status(
+            session=session, event_id=event.id, status=WebhookStatus.processed
+        )
+    logger.info(f"Replayed {event}")
+    return True
+
+
+def _member_id(event: WebhookEvent) -> str:
+    try:
+        return serialization.loads(event.body)["data"]["id"]
+    except Exception:
+        # replayed on its own, it will fail to parse again
+        return f"event:{event.id}"
+
+
+async def replay_events(
+    client: httpx.AsyncClient, events: list[WebhookEvent], concurrency: int = 4
+) -> dict[int, bool]:
+    """Replay events with at most `concurrency` members in flight, returns success
+    by ID
+
+    A member's events run one at a time in the order they were received, like the
+    listener they would otherwise race to extend the same VIP
+    """
+    by_member: defaultdict[str, list[WebhookEvent]] = defaultdict(list)
+    for event in sorted(events, key=lambda e: (e.received_at, e.id)):
+        by_member[_member_id(event)].append(event)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[int, bool] = {}
+
+    async def _replay(member_events: list[WebhookEvent]) -> None:
+        async with semaphore:
+            for event in member_events:
+                results[event.id] = await replay_event(client=client, event=event)
+
+    async with asyncio.TaskGroup() as tg:
+        for member_events in by_member.values():
+            tg.create_task(_replay(member_events))
+
+    return {event.id: results[event.id] for event in events}
+
+
+def get_replayable_events(
+    session: Session,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    status: WebhookStatus | None = WebhookStatus.failed,
+    event_id: int | None = None,
+) -> list[WebhookEvent]:
+    """Journaled events to replay, without the ones the listener will retry"""
+    events = get_webhook_events(
+        session=session, start=start, end=end, status=status, event_id=event_id
+    )
+    retrying = get_retrying_webhook_event_ids(session=session)
+
+    if skipped := [event.id for event in events if event.id in retrying]:
+        # replaying them as well would extend VIP twice
+        logger.warning(f"Skipping events waiting to be retried {skipped=}")
+        events = [event for event in events if event.id not in retrying]
+
+    return events
+
+
+def _as_utc(value: str) -> datetime:
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--event-id", type=int, help="Replay a single journal entry")
+    parser.add_argument("--start", type=_as_utc, help="ISO timestamp (inclusive)")
+    parser.add_argument("--end", type=_as_utc, help="ISO timestamp (exclusive)")
+    parser.add_argument(
+        "--status",
+        type=WebhookStatus,
+        choices=list(WebhookStatus),
+        default=WebhookStatus.failed,
+        help="Only replay events with this status (default: failed)",
+    )
+    parser.add_argument(
+        "--include-processed",
+        action="store_true",
+        help="Allow replaying processed events, their VIP is extended again",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.event_id is None and args.start is None and args.end is None:
+        parser.error("One of --event-id, --start or --end is required")
+    if args.status == WebhookStatus.processed and not args.include_processed:
+        parser.error("Replaying processed events requires --include-processed")
+
+    with enter_session() as session:
+        events = get_replayable_events(
+            session=session,
+            start=args.start,
+            end=args.end,
+            status=args.status,
+            event_id=args.event_id,
+        )
+        session.expunge_all()
+
+    logger.info(f"Replaying {len(events)} webhook events")
+
+    try:
+        results = await replay_events(
+            client=CLIENTS.crcon, events=events, concurrency=args.concurrency
+        )
+    finally:
+        await CLIENTS.aclose()
+
+    failed = [event_id for event_id, ok in results.items() if not ok]
+    logger.info(f"Replayed {len(results) - len(failed)} events, {len(failed)} failed")
+    if failed:
+        logger.error(f"Failed event IDs: {failed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,226 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Iterable
+
+from loguru import logger
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.database.models import WebhookRetry, WebhookStatus, enter_session
+from hll_patreon_bot.database.utils import (
+    add_webhook_retry,
+    dead_letter_webhook_retry,
+    delete_webhook_retry,
+    get_due_webhook_retries,
+    reschedule_webhook_retry,
+    set_webhook_event_status,
+)
+from hll_patreon_bot.patreon_webhook.types import (
+    ChargeStatus,
+    PatreonMemberWH,
+    PatreonPledgeWH,
+    PatreonWebhook,
+    PatronStatus,
+)
+from hll_patreon_bot.patreon_webhook.utils import (
+    format_event_header,
+    parse_event_header,
+)
+
+MemberEvents = list[tuple[PatreonWebhook, PatreonMemberWH | PatreonPledgeWH]]
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    elif isinstance(value, Enum):
+        # the parsers look statuses up by name
+        return value.name
+    raise TypeError(f"Can't serialize {value!r}")
+
+
+def dump_member_events(
+    events: MemberEvents, journal_ids: list[int], completed: Iterable[str] = ()
+) -> str:
+    """Serialize parsed webhooks so a failed action can be retried without the raw body
+
+    `completed` are the players whose VIP was already extended, so retries skip them
+    """
+    return json.dumps(
+        {
+            "journal_ids": journal_ids,
+            "completed": sorted(completed),
+            "events": [
+                {"event": format_event_header(event), "data": data}
+                for event, data in events
+            ],
+        },
+        default=_encode,
+    )
+
+
+def load_member_events(payload: str) -> tuple[MemberEvents, list[int], set[str]]:
+    raw = json.loads(payload)
+
+    events: MemberEvents = []
+    for item in raw["events"]:
+        data = item["data"]
+        for key in ("last_charge_date", "next_charge_date"):
+            if data.get(key):
+                data[key] = datetime.fromisoformat(data[key])
+        data["last_charge_status"] = ChargeStatus[data["last_charge_status"]]
+        data["patron_status"] = PatronStatus[data["patron_status"]]
+        events.append((parse_event_header(item["event"]), data))
+
+    return events, raw["journal_ids"], set(raw.get("completed", []))
+
+
+def retry_delay(attempts: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff, 1 attempt waits `base_delay`, 2 waits double that etc."""
+    return min(max_delay, base_delay * 2 ** (attempts - 1))
+
+
+class RetryScheduler:
+    """Retry failed webhook actions on a backoff schedule
+
+    Failures are persisted to the webhook_retry table, this polls it for retries
+    that are due and runs at most `concurrency` of them at a time. Once
+    `max_attempts` is reached the retry is moved to the dead letter table where
+    it stays until requeued (e.g. from the Discord bot)
+
+    `process` adds every player it has finished with to the set it's given,
+    that is saved with the retry so the next attempt only does what's left
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, MemberEvents, list[int], set[str]], Awaitable[Any]],
+        max_attempts: int = 8,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        poll_interval: float = 5.0,
+        concurrency: int = 2,
+    ) -> None:
+        self.process = process
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def _next_attempt_at(self, attempts: int) -> datetime:
+        delay = retry_delay(attempts, self.base_delay, self.max_delay)
+        return datetime.now(tz=timezone.utc) + timedelta(seconds=delay)
+
+    def schedule(
+        self,
+        member_id: str,
+        events: MemberEvents,
+        journal_ids: list[int],
+        error: Exception,
+        completed: Iterable[str] = (),
+    ) -> int:
+        """Record a failed first attempt"""
+        with enter_session() as session:
+            retry_id = add_webhook_retry(
+                session=session,
+                member_id=member_id,
+                payload=dump_member_events(events, journal_ids, completed),
+                error=repr(error),
+                next_attempt_at=self._next_attempt_at(1),
+            )
+            self._mark_failed(session, journal_ids, error)
+
+        metrics.incr("webhook.retry.scheduled")
+        logger.warning(f"Scheduled retry {retry_id} for {member_id=}: {error!r}")
+        return retry_id
+
+    @staticmethod
+    def _mark_failed(session, journal_ids: list[int], error: Exception) -> None:
+        for journal_id in journal_ids:
+            set_webhook_event_status(
+                session=session,
+                event_id=journal_id,
+                status=WebhookStatus.failed,
+                error=repr(error),
+            )
+
+    async def _retry(self, retry: WebhookRetry) -> None:
+        events, journal_ids, completed = load_member_events(retry.payload)
+
+        async with self._semaphore:
+            try:
+                await self.process(retry.member_id, events, journal_ids, completed)
+            except Exception as e:
+                attempts = retry.attempts + 1
+                payload = dump_member_events(events, journal_ids, completed)
+                with enter_session() as session:
+                    if attempts >= self.max_attempts:
+                        dead_letter_webhook_retry(
+                            session=session,
+                            retry_id=retry.id,
+                            error=repr(e),
+                            payload=payload,
+                        )
+                    else:
+                        reschedule_webhook_retry(
+                            session=session,
+                            retry_id=retry.id,
+                            error=repr(e),
+                            next_attempt_at=self._next_attempt_at(attempts),
+                            payload=payload,
+                        )
+                    self._mark_failed(session, journal_ids, e)
+
+                if attempts >= self.max_attempts:
+                    metrics.incr("webhook.retry.dead_lettered")
+                    logger.error(f"Giving up on {retry} after {attempts=}: {e!r}")
+                else:
+                    metrics.incr("webhook.retry.failed")
+                    logger.warning(f"Retrying {retry} failed ({attempts=}): {e!r}")
+                return
+
+        with enter_session() as session:
+            delete_webhook_retry(session=session, retry_id=retry.id)
+        metrics.incr("webhook.retry.succeeded")
+        logger.info(f"Retried {retry}")
+
+    async def run_due(self) -> int:
+        """Run every retry that is due, returns how many were attempted"""
+        with enter_session() as session:
+            retries = get_due_webhook_retries(
+                session=session, now=datetime.now(tz=timezone.utc)
+            )
+            session.expunge_all()
+
+        await asyncio.gather(*(self._retry(retry) for retry in retries))
+        return len(retries)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.exception(f"Running webhook retries failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="webhook-retries")
+
+    async def stop(self) -> None:
+        """Let in progress retries finish, anything left is picked up on restart"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
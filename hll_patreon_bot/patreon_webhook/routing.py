@@ -0,0 +1,81 @@
+import enum
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import discord
+
+from hll_patreon_bot.patreon_webhook.actions import PARSERS
+from hll_patreon_bot.patreon_webhook.discord import EMBEDS
+from hll_patreon_bot.patreon_webhook.types import (
+    MEMBER_CREATE,
+    MEMBER_DELETE,
+    MEMBER_UPDATE,
+    PLEDGE_CREATE,
+    PLEDGE_DELETE,
+    PLEDGE_UPDATE,
+    PatreonMemberWH,
+    PatreonPledgeWH,
+    PatreonWebhook,
+)
+from hll_patreon_bot.patreon_webhook.utils import format_event_header
+
+
+class Stage(enum.Flag):
+    JOURNAL = enum.auto()
+    PARSE = enum.auto()
+    ACTION = enum.auto()
+    FORWARD = enum.auto()
+
+
+ALL_STAGES = Stage.JOURNAL | Stage.PARSE | Stage.ACTION | Stage.FORWARD
+
+EVENT_STAGES: dict[PatreonWebhook, Stage] = {
+    MEMBER_CREATE: ALL_STAGES,
+    MEMBER_UPDATE: ALL_STAGES,
+    PLEDGE_CREATE: ALL_STAGES,
+    PLEDGE_UPDATE: ALL_STAGES,
+    # The delete handlers are no-ops (VIP expires on its own), keep a record of
+    # them without ever deserializing the body
+    MEMBER_DELETE: Stage.JOURNAL,
+    PLEDGE_DELETE: Stage.JOURNAL,
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    event: PatreonWebhook
+    stages: Stage
+    parser: Callable[[dict[str, Any] | bytes], PatreonMemberWH | PatreonPledgeWH] | None
+    embed: Callable[[PatreonMemberWH | PatreonPledgeWH], discord.Embed] | None
+
+    @property
+    def journal_only(self) -> bool:
+        return self.stages == Stage.JOURNAL
+
+
+class WebhookRouter:
+    """Decide from the X-Patreon-Event header alone what an event needs
+
+    Built once from the event triples so routing a request is a single dict
+    lookup on the raw header, unknown events route to None
+    """
+
+    def __init__(self, event_stages: dict[PatreonWebhook, Stage] = EVENT_STAGES):
+        self._routes: dict[PatreonWebhook, Route] = {}
+        self._by_header: dict[str, Route] = {}
+
+        for event, stages in event_stages.items():
+            route = Route(
+                event=event,
+                stages=stages,
+                parser=PARSERS[event] if Stage.PARSE in stages else None,
+                embed=EMBEDS[event] if Stage.FORWARD in stages else None,
+            )
+            self._routes[event] = route
+            self._by_header[format_event_header(event)] = route
+
+    def route(self, event_header: str) -> Route | None:
+        return self._by_header.get(event_header)
+
+    def __getitem__(self, event: PatreonWebhook) -> Route:
+        return self._routes[event]
@@ -17,13 +17,39 @@ class PatreonTriggerAction(enum.Enum):
     DELETE = "delete"
 
 
-@dataclass
+@dataclass(frozen=True)
 class PatreonWebhook:
     resource: PatreonTriggerResource
     action: PatreonTriggerAction
     sub_resource: PatreonTriggerResource | None = None
 
 
+MEMBER_CREATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.CREATE
+)
+MEMBER_UPDATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.UPDATE
+)
+MEMBER_DELETE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.DELETE
+)
+PLEDGE_CREATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER,
+    sub_resource=PatreonTriggerResource.PLEDGE,
+    action=PatreonTriggerAction.CREATE,
+)
+PLEDGE_UPDATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER,
+    sub_resource=PatreonTriggerResource.PLEDGE,
+    action=PatreonTriggerAction.UPDATE,
+)
+PLEDGE_DELETE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER,
+    sub_resource=PatreonTriggerResource.PLEDGE,
+    action=PatreonTriggerAction.DELETE,
+)
+
+
 class PatreonMemberWH(TypedDict):
     id: str
     currently_entitled_amount_cents: int | None
@@ -31,6 +57,7 @@ class PatreonMemberWH(TypedDict):
     last_charge_date: datetime | None
     last_charge_status: ChargeStatus
     patron_status: PatronStatus
+    user_id: str | None
     discord_user_id: str | None
 
 
@@ -42,4 +69,5 @@ class PatreonPledgeWH(TypedDict):
     next_charge_date: datetime | None
     last_charge_status: ChargeStatus
     patron_status: PatronStatus
+    user_id: str | None
     discord_user_id: str | None
@@ -1,14 +1,63 @@
+import hashlib
+import hmac
 from datetime import datetime, timedelta, timezone
-from typing import Any, TypedDict
-
+from typing import Any
+
+from hll_patreon_bot.integrations.patreon.jsonapi import Resolver
+from hll_patreon_bot.integrations.patreon.schemas import (
+    MEMBER_WEBHOOK,
+    PLEDGE_WEBHOOK,
+    charge_status,
+    decode,
+    patron_status,
+)
+from hll_patreon_bot.patreon_webhook.constants import PATREON_TRIGGER_DELIMITER
 from hll_patreon_bot.patreon_webhook.types import (
-    ChargeStatus,
     PatreonMemberWH,
     PatreonPledgeWH,
+    PatreonTriggerAction,
+    PatreonTriggerResource,
+    PatreonWebhook,
     PatronStatus,
 )
 
 
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Check Patreons X-Patreon-Signature (HMAC-MD5 hex digest of the raw body)"""
+    expected = hmac.new(secret.encode(), body, hashlib.md5).hexdigest()
+    # compare as bytes, compare_digest refuses non ASCII strings
+    return hmac.compare_digest(expected.encode(), signature.lower().encode())
+
+
+def parse_event_header(event_header: str) -> PatreonWebhook:
+    """Turn a X-Patreon-Event header (members:pledge:create) into a PatreonWebhook"""
+    chunks = event_header.split(PATREON_TRIGGER_DELIMITER)
+
+    if len(chunks) == 2:
+        resource, action = chunks
+        return PatreonWebhook(
+            resource=PatreonTriggerResource(resource),
+            action=PatreonTriggerAction(action),
+        )
+    elif len(chunks) == 3:
+        resource, sub_resource, action = chunks
+        return PatreonWebhook(
+            resource=PatreonTriggerResource(resource),
+            sub_resource=PatreonTriggerResource(sub_resource),
+            action=PatreonTriggerAction(action),
+        )
+    else:
+        raise ValueError(f"Unknown Patreon event {event_header=}")
+
+
+def format_event_header(event: PatreonWebhook) -> str:
+    """The inverse of parse_event_header"""
+    chunks = [event.resource.value, event.action.value]
+    if event.sub_resource is not None:
+        chunks.insert(1, event.sub_resource.value)
+    return PATREON_TRIGGER_DELIMITER.join(chunks)
+
+
 def calc_vip_expiration_timestamp(
     earned: timedelta,
     current_expiration: datetime | None,
@@ -24,103 +73,44 @@ def calc_vip_expiration_timestamp(
     return current_expiration + earned
 
 
-def parse_patreon_pledge_webhook(data: dict[str, Any]) -> PatreonPledgeWH:
-    """Pull data out of Patreons JSON webhook"""
-    parsed: dict[str, Any] = {}
-
-    parsed["id"] = data["data"]["id"]
-    parsed["currently_entitled_amount_cents"] = data["data"]["attributes"].get(
-        "currently_entitled_amount_cents"
-    )
-
-    parsed["email"] = data["data"]["attributes"].get("email")
-    parsed["last_charge_date"] = data["data"]["attributes"]["last_charge_date"]
-    parsed["last_charge_status"] = data["data"]["attributes"]["last_charge_status"]
-    parsed["patron_status"] = data["data"]["attributes"]["patron_status"]
-    parsed["next_charge_date"] = data["data"]["attributes"].get("next_charge_date")
-
-    try:
-        for obj in data["included"]:
-            if obj["type"] == "user":
-                raw_discord = (
-                    obj["attributes"].get("social_connections", {}).get("discord", {})
-                )
-                parsed["discord_user_id"] = (
-                    raw_discord.get("user_id") if raw_discord else None
-                )
-    except KeyError:
-        parsed["discord_user_id"] = None
-
-    last_charge_status = ChargeStatus[
-        (parsed["last_charge_status"].lower() if parsed["last_charge_status"] else None)
-    ]  # type: ignore
+def parse_patreon_pledge_webhook(data: dict[str, Any] | bytes) -> PatreonPledgeWH:
+    """Pull data out of Patreons JSON webhook (the raw body or already decoded)"""
+    doc = decode(PLEDGE_WEBHOOK, data)
+    attributes = doc.data.attributes
+    user = Resolver(doc.included).one(doc.data.relationships.user)
 
     typed_data: PatreonPledgeWH = {
-        "id": parsed["id"],
+        "id": doc.data.id,  # type: ignore
         "currently_entitled_amount_cents": (
-            int(parsed["currently_entitled_amount_cents"])
-            if parsed["currently_entitled_amount_cents"]
-            else None
+            attributes.currently_entitled_amount_cents or None
         ),
-        "email": parsed["email"],
-        "last_charge_date": datetime.fromisoformat(parsed["last_charge_date"]),
-        "last_charge_status": last_charge_status,
-        "next_charge_date": (
-            datetime.fromisoformat(parsed["next_charge_date"])
-            if parsed["next_charge_date"]
-            else None
-        ),
-        "patron_status": PatronStatus[parsed["patron_status"]],
-        "discord_user_id": parsed["discord_user_id"],
+        "email": attributes.email,
+        "last_charge_date": attributes.last_charge_date,
+        "last_charge_status": charge_status(attributes.last_charge_status),
+        "next_charge_date": attributes.next_charge_date,
+        "patron_status": PatronStatus[attributes.patron_status],
+        "user_id": doc.data.relationships.user_id,
+        "discord_user_id": user.attributes.discord_user_id if user else None,
     }
 
     return typed_data
 
 
-def parse_patreon_member_webhook(data: dict[str, Any]) -> PatreonMemberWH:
-    """Pull data out of Patreons JSON webhook"""
-    parsed: dict[str, Any] = {}
-
-    parsed["id"] = data["data"]["id"]
-    parsed["currently_entitled_amount_cents"] = data["data"]["attributes"].get(
-        "currently_entitled_amount_cents"
-    )
-
-    parsed["email"] = data["data"]["attributes"]["email"]
-    parsed["last_charge_date"] = data["data"]["attributes"]["last_charge_date"]
-    parsed["last_charge_status"] = data["data"]["attributes"]["last_charge_status"]
-    parsed["patron_status"] = data["data"]["attributes"]["patron_status"]
-
-    try:
-        for obj in data["included"]:
-            if obj["type"] == "user":
-                raw_discord = (
-                    obj["attributes"].get("social_connections", {}).get("discord", {})
-                )
-                parsed["discord_user_id"] = (
-                    raw_discord.get("user_id") if raw_discord else None
-                )
-    except KeyError:
-        parsed["discord_user_id"] = None
-
-    last_charge_status = ChargeStatus[
-        (parsed["last_charge_status"].lower() if parsed["last_charge_status"] else None)
-    ]  # type: ignore
+def parse_patreon_member_webhook(data: dict[str, Any] | bytes) -> PatreonMemberWH:
+    """Pull data out of Patreons JSON webhook (the raw body or already decoded)"""
+    doc = decode(MEMBER_WEBHOOK, data)
+    attributes = doc.data.attributes
+    user = Resolver(doc.included).one(doc.data.relationships.user)
 
     typed_data: PatreonMemberWH = {
-        "id": parsed["id"],
-        "currently_entitled_amount_cents": int(
-            parsed["currently_entitled_amount_cents"]
-        ),
-        "email": parsed["email"],
-        "last_charge_date": (
-            datetime.fromisoformat(parsed["last_charge_date"])
-            if parsed["last_charge_date"]
-            else None
-        ),
-        "last_charge_status": last_charge_status,
-        "patron_status": PatronStatus[parsed["patron_status"]],
-        "discord_user_id": parsed["discord_user_id"],
+        "id": doc.data.id,  # type: ignore
+        "currently_entitled_amount_cents": attributes.currently_entitled_amount_cents,
+        "email": attributes.email,  # type: ignore
+        "last_charge_date": attributes.last_charge_date,
+        "last_charge_status": charge_status(attributes.last_charge_status),
+        "patron_status": patron_status(attributes.patron_status),
+        "user_id": doc.data.relationships.user_id,
+        "discord_user_id": user.attributes.discord_user_id if user else None,
     }
 
     return typed_data
@@ -1,27 +1,52 @@
-import json
+import hmac
 import os
 from contextlib import asynccontextmanager
 
-import aiohttp
 import discord
-import httpx
 from loguru import logger
+from sqlalchemy.exc import IntegrityError
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 from starlette.routing import Route
 
-from hll_patreon_bot.bot.constants import API_KEY_FORMAT, CRCON_API_KEY
-from hll_patreon_bot.patreon_webhook.actions import lookup_action, lookup_parser
-from hll_patreon_bot.patreon_webhook.constants import PATREON_TRIGGER_DELIMITER
-from hll_patreon_bot.patreon_webhook.discord import lookup_action_embed
-from hll_patreon_bot.patreon_webhook.types import (
-    PatreonTriggerAction,
-    PatreonTriggerResource,
-    PatreonWebhook,
+from hll_patreon_bot import metrics
+from hll_patreon_bot.bot.constants import CRCON_API_KEY, PATREON_WEBHOOK_SECRET
+from hll_patreon_bot.database.models import WebhookStatus, enter_session
+from hll_patreon_bot.database.utils import add_webhook_event, set_webhook_event_status
+from hll_patreon_bot.integrations.clients import CLIENTS
+from hll_patreon_bot.integrations.patreon.mirror import apply_webhooks
+from hll_patreon_bot.patreon_webhook.actions import handle_member_events
+from hll_patreon_bot.patreon_webhook.constants import (
+    DISCORD_FORWARD_INTERVAL,
+    DISCORD_FORWARD_MAX_BUFFERED,
+    WEBHOOK_COALESCE_WINDOW,
+    WEBHOOK_DEDUPE_CACHE_SIZE,
+    WEBHOOK_MAX_IN_FLIGHT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_RETRY_BASE_DELAY,
+    WEBHOOK_RETRY_CONCURRENCY,
+    WEBHOOK_RETRY_MAX_ATTEMPTS,
+    WEBHOOK_RETRY_MAX_DELAY,
+    WEBHOOK_RETRY_POLL_INTERVAL,
+    WEBHOOK_SHED_RETRY_AFTER,
+    WEBHOOK_STATS_TOKEN,
+    WEBHOOK_WORKERS,
+)
+from hll_patreon_bot.patreon_webhook.dedupe import WebhookDeduplicator, event_identity
+from hll_patreon_bot.patreon_webhook.discord import EmbedForwarder
+from hll_patreon_bot.patreon_webhook.retry import MemberEvents, RetryScheduler
+from hll_patreon_bot.patreon_webhook.routing import Stage, WebhookRouter
+from hll_patreon_bot.patreon_webhook.types import PatreonMemberWH, PatreonPledgeWH
+from hll_patreon_bot.patreon_webhook.utils import verify_signature
+from hll_patreon_bot.patreon_webhook.worker import (
+    Coalescer,
+    InFlightLimiter,
+    KeyedLock,
+    WebhookJob,
+    WebhookQueue,
 )
 
-CLIENT: httpx.AsyncClient | None = None
 WEBHOOK: discord.Webhook | None = None
 
 logger.add(
@@ -32,93 +57,254 @@ logger.add(
 )
 
 
-def get_client():
-    global CLIENT
+def get_webhook() -> discord.Webhook:
+    global WEBHOOK
 
-    if CLIENT is None:
-        headers = {"Authorization": API_KEY_FORMAT.format(api_key=CRCON_API_KEY)}
-        CLIENT = httpx.AsyncClient(
-            headers=headers, event_hooks={"response": [raise_on_4xx_5xx]}
+    session = CLIENTS.discord
+    if WEBHOOK is None or WEBHOOK.session is not session:
+        WEBHOOK = discord.Webhook.from_url(
+            url=os.getenv("FORWARD_WEBHOOK", ""), session=session
         )
 
-    return CLIENT
-
+    return WEBHOOK
 
-async def raise_on_4xx_5xx(response):
-    response.raise_for_status()
 
+async def process_webhook(job: WebhookJob):
+    """Parse a single accepted webhook and hand it off to be coalesced"""
+    try:
+        # log the body as received, the parsers decode straight from the bytes
+        logger.info(job.body.decode(errors="replace"))
+        parsed_data = ROUTER[job.event].parser(job.body)  # type: ignore
+    except Exception as e:
+        IN_FLIGHT.release()
+        if job.journal_id is not None:
+            with enter_session() as session:
+                set_webhook_event_status(
+                    session=session,
+                    event_id=job.journal_id,
+                    status=WebhookStatus.failed,
+                    error=repr(e),
+                )
+        raise
 
-@asynccontextmanager
-async def with_client():
-    client = get_client()
-    yield client
-    await client.aclose()
+    COALESCER.submit(parsed_data["id"], (job, parsed_data))
 
 
-def get_webhook() -> discord.Webhook:
-    global WEBHOOK
+async def act_on_member_events(
+    member_id: str, events: MemberEvents, journal_ids: list[int], completed: set[str]
+):
+    """Run the actions for a members events and forward them once they succeed
 
-    if WEBHOOK is None:
-        WEBHOOK = discord.Webhook.from_url(
-            url=os.getenv("FORWARD_WEBHOOK", ""),
-            session=aiohttp.ClientSession(),
+    Players whose VIP is extended are added to `completed`, see RetryScheduler
+    """
+    # Events for the same member must not interleave (e.g. both reading the
+    # same VIP expiration before either adds to it)
+    async with MEMBER_LOCKS.hold(member_id):
+        await handle_member_events(
+            client=CLIENTS.crcon,
+            events=[e for e in events if Stage.ACTION in ROUTER[e[0]].stages],
+            completed=completed,
         )
 
-    return WEBHOOK
+    # The actions are done, failing to record that must not retry them
+    try:
+        with enter_session() as session:
+            for journal_id in journal_ids:
+                set_webhook_event_status(
+                    session=session,
+                    event_id=journal_id,
+                    status=WebhookStatus.processed,
+                )
+    except Exception as e:
+        metrics.incr("webhook.journal.status_failed")
+        logger.exception(f"Failed to mark {journal_ids=} processed: {e}")
 
+    for event, parsed_data in events:
+        if create_embed := ROUTER[event].embed:
+            FORWARDER.forward(create_embed(parsed_data))
 
-async def webhook(request: Request):
-    wh = get_webhook()
 
-    if not CRCON_API_KEY:
-        raise ValueError(f"{CRCON_API_KEY} must be set")
-
-    event_header = request.headers["X-Patreon-Event"]
-    # TODO: check signature w/ webhook secret
-    signature = request.headers["X-Patreon-Signature"]
-
-    chunks = event_header.split(PATREON_TRIGGER_DELIMITER)
-
-    resource = None
-    sub_resource = None
-    action = None
-    if len(chunks) == 2:
-        resource, action = chunks
-        wh_type = PatreonWebhook(
-            resource=PatreonTriggerResource(resource),
-            action=PatreonTriggerAction(action),
+async def process_member_events(
+    member_id: str, items: list[tuple[WebhookJob, PatreonMemberWH | PatreonPledgeWH]]
+):
+    """Act once on every webhook received for a member within the window"""
+    events = [(job.event, parsed_data) for job, parsed_data in items]
+    journal_ids = [job.journal_id for job, _ in items if job.journal_id is not None]
+
+    try:
+        apply_webhooks(parsed_data for _, parsed_data in events)
+    except Exception as e:
+        # The next full sync will catch the mirror up
+        metrics.incr("patreon.mirror.delta_failed")
+        logger.exception(f"Failed to mirror webhooks for {member_id=}: {e}")
+
+    completed: set[str] = set()
+    try:
+        await act_on_member_events(
+            member_id=member_id,
+            events=events,
+            journal_ids=journal_ids,
+            completed=completed,
         )
-    elif len(chunks) == 3:
-        resource, sub_resource, action = chunks
-        wh_type = PatreonWebhook(
-            resource=PatreonTriggerResource(resource),
-            sub_resource=PatreonTriggerResource(sub_resource),
-            action=PatreonTriggerAction(action),
+    except Exception as e:
+        # CRCON being down etc. shouldn't cost anyone their VIP
+        RETRIES.schedule(
+            member_id=member_id,
+            events=events,
+            journal_ids=journal_ids,
+            error=e,
+            completed=completed,
         )
-    else:
+    finally:
+        IN_FLIGHT.release(len(items))
+
+
+FORWARDER = EmbedForwarder(
+    get_webhook=get_webhook,
+    flush_interval=DISCORD_FORWARD_INTERVAL,
+    max_buffered=DISCORD_FORWARD_MAX_BUFFERED,
+)
+QUEUE = WebhookQueue(
+    process=process_webhook, num_workers=WEBHOOK_WORKERS, maxsize=WEBHOOK_QUEUE_SIZE
+)
+IN_FLIGHT = InFlightLimiter(limit=WEBHOOK_MAX_IN_FLIGHT)
+MEMBER_LOCKS = KeyedLock(name="webhook.member_lock")
+COALESCER: Coalescer[tuple[WebhookJob, PatreonMemberWH | PatreonPledgeWH]] = Coalescer(
+    process=process_member_events,
+    window=WEBHOOK_COALESCE_WINDOW,
+    concurrency=WEBHOOK_WORKERS,
+)
+ROUTER = WebhookRouter()
+DEDUPE = WebhookDeduplicator(maxsize=WEBHOOK_DEDUPE_CACHE_SIZE)
+RETRIES = RetryScheduler(
+    process=act_on_member_events,
+    max_attempts=WEBHOOK_RETRY_MAX_ATTEMPTS,
+    base_delay=WEBHOOK_RETRY_BASE_DELAY,
+    max_delay=WEBHOOK_RETRY_MAX_DELAY,
+    poll_interval=WEBHOOK_RETRY_POLL_INTERVAL,
+    concurrency=WEBHOOK_RETRY_CONCURRENCY,
+)
+
+
+async def webhook(request: Request):
+    if not CRCON_API_KEY:
+        raise ValueError("CRCON_API_KEY must be set")
+    if not PATREON_WEBHOOK_SECRET:
+        raise ValueError("PATREON_WEBHOOK_SECRET must be set")
+
+    # Authenticate before doing any other work so junk requests are cheap
+    signature = request.headers.get("X-Patreon-Signature")
+    if not signature:
+        metrics.incr("webhook.rejected.missing_signature")
+        return Response(status_code=401)
+
+    body = await request.body()
+    if not verify_signature(
+        body=body, signature=signature, secret=PATREON_WEBHOOK_SECRET
+    ):
+        metrics.incr("webhook.rejected.bad_signature")
+        logger.warning(f"Rejecting webhook with invalid {signature=}")
+        return Response(status_code=401)
+
+    event_header = request.headers.get("X-Patreon-Event", "")
+    route = ROUTER.route(event_header)
+    if route is None:
+        metrics.incr("webhook.rejected.bad_event")
         logger.error(f"{event_header=}")
         return Response(status_code=400)
 
-    logger.info(f"{resource=} {sub_resource=} {action=}")
-    logger.info(f"{signature=}")
-    data = await request.json()
+    wh_type = route.event
+    logger.info(f"{wh_type=}")
 
-    logger.info(json.dumps(data))
+    # Patreon retries deliveries, acknowledge repeats without doing anything
+    identity = event_identity(event_header=event_header, body=body)
+    if DEDUPE.seen(identity):
+        logger.info(f"Dropping duplicate {wh_type=} {identity=}")
+        return Response(status_code=200)
+
+    # Shed load before journaling, otherwise Patreon's redelivery would be
+    # dropped as a duplicate
+    if not route.journal_only and (QUEUE.full() or not IN_FLIGHT.try_acquire()):
+        metrics.incr("webhook.rejected.shed")
+        logger.warning(f"Shedding {wh_type=}, {IN_FLIGHT.stats()} {QUEUE.stats()}")
+        return Response(
+            status_code=503,
+            headers={"Retry-After": str(WEBHOOK_SHED_RETRY_AFTER)},
+        )
 
-    async with with_client() as client:
-        parser = lookup_parser(event=wh_type)
-        parsed_data = parser(data)
-        await lookup_action(event=wh_type, client=client, data=parsed_data)
-        embed = lookup_action_embed(event=wh_type, data=parsed_data)
-        await wh.send(embed=embed)
+    try:
+        with enter_session() as session:
+            journal_id = add_webhook_event(
+                session=session,
+                event=event_header,
+                digest=identity,
+                signature=signature,
+                body=body,
+                status=(
+                    WebhookStatus.processed
+                    if route.journal_only
+                    else WebhookStatus.received
+                ),
+            )
+    except IntegrityError:
+        if not route.journal_only:
+            IN_FLIGHT.release()
+        metrics.incr("webhook.dedupe.journal_hit")
+        DEDUPE.add(identity)
+        logger.info(f"Dropping previously journaled {wh_type=} {identity=}")
+        return Response(status_code=200)
 
-        # TODO: execute wh embed
-        # return Response(status_code=400)
+    DEDUPE.add(identity)
 
-    return Response(status_code=200)
+    if route.journal_only:
+        metrics.incr("webhook.journal_only")
+        return Response(status_code=200)
 
+    QUEUE.enqueue(
+        WebhookJob(event=wh_type, body=body, signature=signature, journal_id=journal_id)
+    )
 
-app = Starlette(debug=True, routes=[Route("/", webhook, methods=["POST"])])
+    return Response(status_code=202)
+
+
+async def stats(request: Request):
+    # internal numbers, only for whoever holds the token
+    if not WEBHOOK_STATS_TOKEN:
+        return Response(status_code=404)
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(
+        authorization.encode(), f"Bearer {WEBHOOK_STATS_TOKEN}".encode()
+    ):
+        metrics.incr("webhook.rejected.stats")
+        return Response(status_code=401)
+
+    return JSONResponse(
+        {"queue": QUEUE.stats(), "load": IN_FLIGHT.stats()} | metrics.snapshot()
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    await CLIENTS.start()
+    await FORWARDER.start()
+    await QUEUE.start()
+    await RETRIES.start()
+    yield
+    await QUEUE.stop()
+    await COALESCER.stop()
+    await RETRIES.stop()
+    await FORWARDER.stop()
+    await CLIENTS.aclose()
+
+
+app = Starlette(
+    debug=True,
+    routes=[
+        Route("/", webhook, methods=["POST"]),
+        Route("/stats", stats, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
 
 if __name__ == "__main__":
     pass
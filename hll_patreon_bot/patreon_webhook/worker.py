@@ -0,0 +1,249 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Generic, TypeVar
+
+from loguru import logger
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.patreon_webhook.types import PatreonWebhook
+
+T = TypeVar("T")
+
+
+@dataclass
+class WebhookJob:
+    """An accepted webhook waiting to be parsed/acted on/forwarded"""
+
+    event: PatreonWebhook
+    body: bytes
+    signature: str | None = None
+    journal_id: int | None = None
+    received_at: float = field(default_factory=time.monotonic)
+
+
+class KeyedLock:
+    """One FIFO lock per key (Patreon member ID)
+
+    Work for the same key runs one at a time in the order it arrived while
+    different keys run in parallel, locks are dropped once nothing holds or
+    waits on them so the table only grows with concurrently active keys
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: Counter[str] = Counter()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncGenerator[None, None]:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] += 1
+
+        if lock.locked():
+            metrics.incr(f"{self.name}.contended")
+
+        start = time.monotonic()
+        try:
+            async with lock:
+                metrics.observe(f"{self.name}.wait", time.monotonic() - start)
+                metrics.set_gauge(f"{self.name}.active_keys", len(self._locks))
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+
+class Coalescer(Generic[T]):
+    """Debounce items per key and process each burst together
+
+    The first item for a key starts a `window` second timer, anything else
+    submitted for that key before it fires is processed in the same call
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, list[T]], Awaitable[Any]],
+        window: float = 2.0,
+        concurrency: int = 4,
+        name: str = "webhook.coalesce",
+    ) -> None:
+        self.process = process
+        self.window = window
+        self.name = name
+        self._pending: dict[str, list[T]] = {}
+        self._timers: dict[str, asyncio.Task] = {}
+        self._flushing: set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, key: str, item: T) -> None:
+        if key in self._pending:
+            self._pending[key].append(item)
+            metrics.incr(f"{self.name}.merged")
+            return
+
+        self._pending[key] = [item]
+        self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: str) -> None:
+        await asyncio.sleep(self.window)
+        task = self._timers.pop(key)
+        self._flushing.add(task)
+        try:
+            await self._flush(key)
+        finally:
+            self._flushing.discard(task)
+
+    async def _flush(self, key: str) -> None:
+        items = self._pending.pop(key)
+        metrics.incr(f"{self.name}.flushes")
+        metrics.set_gauge(f"{self.name}.pending_keys", len(self._pending))
+
+        async with self._semaphore:
+            try:
+                with metrics.timed(f"{self.name}.processing"):
+                    await self.process(key, items)
+            except Exception as e:
+                metrics.incr(f"{self.name}.failed")
+                logger.exception(f"Processing {len(items)} items for {key} failed: {e}")
+
+    async def stop(self) -> None:
+        """Process everything still waiting out its window immediately"""
+        timers = list(self._timers.values())
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        self._timers.clear()
+
+        await asyncio.gather(*self._flushing, return_exceptions=True)
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)))
+
+
+class WebhookQueue:
+    """In process job queue drained by a fixed pool of worker tasks
+
+    The request handler only enqueues so Patreon gets its response immediately
+    and slow CRCON/Discord calls happen in the background
+    """
+
+    def __init__(
+        self,
+        process: Callable[[WebhookJob], Awaitable[Any]],
+        num_workers: int = 4,
+        maxsize: int = 0,
+    ) -> None:
+        self.process = process
+        self.num_workers = num_workers
+        self._queue: asyncio.Queue[WebhookJob] = asyncio.Queue(maxsize=maxsize)
+        self._workers: list[asyncio.Task] = []
+        self.in_progress = 0
+        self.high_water = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def enqueue(self, job: WebhookJob) -> None:
+        """Raises asyncio.QueueFull once `maxsize` jobs are waiting"""
+        self._queue.put_nowait(job)
+        self.high_water = max(self.high_water, self.depth)
+        metrics.incr("webhook.enqueued")
+        metrics.set_gauge("webhook.queue_depth", self.depth)
+        metrics.set_gauge("webhook.queue_high_water", self.high_water)
+
+    async def start(self) -> None:
+        for worker_number in range(self.num_workers):
+            self._workers.append(
+                asyncio.create_task(
+                    self._worker(worker_number), name=f"webhook-worker-{worker_number}"
+                )
+            )
+        logger.info(f"Started {self.num_workers} webhook workers")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Give queued jobs a chance to finish before cancelling the workers"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping webhook workers with {self.depth} jobs queued")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _worker(self, worker_number: int) -> None:
+        while True:
+            job = await self._queue.get()
+            metrics.set_gauge("webhook.queue_depth", self.depth)
+            metrics.observe("webhook.queue_wait", time.monotonic() - job.received_at)
+            self.in_progress += 1
+            try:
+                with metrics.timed("webhook.processing"):
+                    await self.process(job)
+                metrics.incr("webhook.processed")
+            except Exception as e:
+                metrics.incr("webhook.failed")
+                logger.exception(f"worker {worker_number} failed {job.event}: {e}")
+            finally:
+                self.in_progress -= 1
+                metrics.observe("webhook.latency", time.monotonic() - job.received_at)
+                self._queue.task_done()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self.depth,
+            "queue_max_size": self._queue.maxsize,
+            "queue_high_water": self.high_water,
+            "in_progress": self.in_progress,
+        }
+
+
+class InFlightLimiter:
+    """Cap how many accepted webhooks can be in flight at once
+
+    An event counts from the moment it's accepted until its action has run (or
+    been handed to the retry scheduler), so it covers the queue, the coalescing
+    window and the CRCON calls. When full, callers should shed the request
+    """
+
+    def __init__(self, limit: int, name: str = "webhook.in_flight") -> None:
+        self.limit = limit
+        self.name = name
+        self.in_flight = 0
+        self.high_water = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+
+        self.in_flight += 1
+        self.high_water = max(self.high_water, self.in_flight)
+        metrics.set_gauge(self.name, self.in_flight)
+        metrics.set_gauge(f"{self.name}.high_water", self.high_water)
+        return True
+
+    def release(self, count: int = 1) -> None:
+        self.in_flight = max(0, self.in_flight - count)
+        metrics.set_gauge(self.name, self.in_flight)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "limit": self.limit,
+            "high_water": self.high_water,
+        }
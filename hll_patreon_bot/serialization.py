@@ -0,0 +1,30 @@
+"""JSON encoding/decoding for webhook and API payloads
+
+Backed by msgspec (already used for the Patreon schemas), which decodes straight
+from the raw bytes without going through str first
+"""
+
+from typing import Any, Callable
+
+import msgspec
+
+_decoder = msgspec.json.Decoder()
+_encoder = msgspec.json.Encoder()
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    return _decoder.decode(data)
+
+
+def dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+    """`default` is called for objects msgspec can't encode itself
+
+    Note datetimes, enums (by value) and dataclasses are encoded natively
+    """
+    if default is None:
+        return _encoder.encode(obj)
+    return msgspec.json.encode(obj, enc_hook=default)
+
+
+def dumps_str(obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+    return dumps(obj, default=default).decode()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+from hll_patreon_bot.integrations.crcon.crcon import fetch_current_vips, fetch_player
+
+CRCON_URL = "https://crcon.test/"
+
+PROFILE = {
+    "id": 1,
+    "player_id": "76561198000000000",
+    "created": "2024-01-01T00:00:00",
+    "names": [
+        {"id": 1, "name": "SniperX", "player_id": "76561198000000000"},
+        {"id": 2, "name": "Medic", "player_id": "76561198000000000"},
+    ],
+    "sessions": [{"id": 1, "start": None, "end": None}],
+    "received_actions": [],
+    "penalty_count": {"KICK": 0, "PUNISH": 1, "TEMPBAN": 0, "PERMABAN": 0},
+    "steaminfo": None,
+    "vips": [
+        {"server_number": 1, "expiration": "2024-03-01T00:00:00+00:00"},
+        {"server_number": 2, "expiration": "2024-04-01T00:00:00+00:00"},
+    ],
+}
+
+
+def client(routes: dict[str, object]) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, content=json.dumps({"result": routes[request.url.path]}).encode()
+        )
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_fetch_current_vips():
+    vips = [
+        {
+            "player_id": "1",
+            "name": "SniperX",
+            "vip_expiration": "2024-03-01T00:00:00+00:00",
+        },
+        {"player_id": "2", "name": "Medic", "vip_expiration": None},
+    ]
+
+    res = asyncio.run(
+        fetch_current_vips(
+            client=client({"/api/get_vip_ids": vips}), server_url=CRCON_URL
+        )
+    )
+
+    assert res["1"].name == "SniperX"
+    assert res["1"].expiration_date == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert res["2"].expiration_date is None
+
+
+def test_fetch_player():
+    routes = {"/api/get_player_profile": PROFILE}
+
+    player = asyncio.run(
+        fetch_player(client=client(routes), player_id="1", rcon_url=CRCON_URL)
+    )
+
+    assert player is not None
+    assert player.player_id == "76561198000000000"
+    assert [name.name for name in player.names] == ["SniperX", "Medic"]
+    assert player.vips[1].server_number == 2
+
+
+def test_fetch_player_missing():
+    routes = {"/api/get_player_profile": None}
+
+    player = asyncio.run(
+        fetch_player(client=client(routes), player_id="1", rcon_url=CRCON_URL)
+    )
+
+    assert player is None
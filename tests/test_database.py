@@ -1,10 +1,11 @@
 import sqlite3
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+import msgspec
 import pytest
 from freezegun import freeze_time
 from loguru import logger
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, select, text
 from sqlalchemy.exc import IntegrityError, PendingRollbackError
 from sqlalchemy.orm import Session
 
@@ -13,8 +14,40 @@ from hll_patreon_bot.database.models import (
     Discord,
     DiscordPlayers,
     Patreon,
+    PatreonPledgeEventMirror,
+    PatreonUserMirror,
     Player,
+    WebhookStatus,
 )
+from hll_patreon_bot.database.utils import (
+    add_webhook_event,
+    add_webhook_retry,
+    apply_patreon_member_delta,
+    checkpoint_patreon_full_sync,
+    dead_letter_webhook_retry,
+    finish_patreon_full_sync,
+    get_due_webhook_retries,
+    get_mirrored_members,
+    get_mirrored_pledge_events,
+    get_patreon_sync_state,
+    get_retrying_webhook_event_ids,
+    get_webhook_dead_letters,
+    get_webhook_events,
+    prune_patreon_mirror,
+    requeue_webhook_dead_letters,
+    reschedule_webhook_retry,
+    search_patreon_members,
+    set_webhook_event_status,
+    upsert_patreon_members,
+)
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatreonMember,
+    PatronStatus,
+    PledgeEventType,
+    PledgeHistory,
+)
+from hll_patreon_bot.patreon_webhook.retry import dump_member_events
 
 
 @pytest.fixture
@@ -156,3 +189,387 @@ def test_player_can_be_sponsored_by_multiple_discords(session: Session):
 
     session.add(d1_p1)
     session.add(d2_p1)
+
+
+def test_webhook_journal(session: Session):
+    first = add_webhook_event(
+        session=session,
+        event="members:create",
+        digest="1",
+        signature="abc",
+        body=b"{}",
+    )
+    second = add_webhook_event(
+        session=session,
+        event="members:update",
+        digest="2",
+        signature=None,
+        body=b'{"a": 1}',
+    )
+    set_webhook_event_status(
+        session=session, event_id=second, status=WebhookStatus.failed, error="boom"
+    )
+
+    assert [e.id for e in get_webhook_events(session=session)] == [first, second]
+
+    failed = get_webhook_events(session=session, status=WebhookStatus.failed)
+    assert len(failed) == 1
+    assert failed[0].body == b'{"a": 1}'
+    assert failed[0].error == "boom"
+    assert failed[0].processed_at is not None
+
+    assert get_webhook_events(session=session, event_id=first)[0].event == (
+        "members:create"
+    )
+
+
+def test_webhook_journal_rejects_duplicates(session_no_commit: Session):
+    add_webhook_event(
+        session=session_no_commit,
+        event="members:create",
+        digest="1",
+        signature=None,
+        body=b"{}",
+    )
+
+    with pytest.raises(IntegrityError):
+        add_webhook_event(
+            session=session_no_commit,
+            event="members:create",
+            digest="1",
+            signature=None,
+            body=b"{}",
+        )
+
+
+def test_webhook_retry_lifecycle(session: Session):
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    retry_id = add_webhook_retry(
+        session=session,
+        member_id="member-1",
+        payload="{}",
+        error="first",
+        next_attempt_at=now,
+    )
+    add_webhook_retry(
+        session=session,
+        member_id="member-2",
+        payload="{}",
+        error="later",
+        next_attempt_at=now + timedelta(hours=1),
+    )
+
+    assert [r.id for r in get_due_webhook_retries(session=session, now=now)] == [
+        retry_id
+    ]
+
+    reschedule_webhook_retry(
+        session=session,
+        retry_id=retry_id,
+        error="second",
+        next_attempt_at=now + timedelta(minutes=1),
+        payload='{"completed": ["player-1"]}',
+    )
+    assert get_due_webhook_retries(session=session, now=now) == []
+
+    retry = get_due_webhook_retries(session=session, now=now + timedelta(hours=2))[0]
+    assert retry.attempts == 2
+    assert retry.error == "second"
+    assert retry.payload == '{"completed": ["player-1"]}'
+
+    dead_letter_id = dead_letter_webhook_retry(
+        session=session,
+        retry_id=retry_id,
+        error="third",
+        payload='{"completed": ["player-1", "player-2"]}',
+    )
+    dead_letters = get_webhook_dead_letters(session=session)
+    assert [(d.id, d.member_id, d.attempts, d.error) for d in dead_letters] == [
+        (dead_letter_id, "member-1", 3, "third")
+    ]
+    assert dead_letters[0].payload == '{"completed": ["player-1", "player-2"]}'
+    assert (
+        len(get_due_webhook_retries(session=session, now=now + timedelta(hours=2))) == 1
+    )
+
+    (requeued_id,) = requeue_webhook_dead_letters(session=session)
+    assert get_webhook_dead_letters(session=session) == []
+    retries = get_due_webhook_retries(
+        session=session, now=datetime.now(tz=timezone.utc)
+    )
+    assert [(r.id, r.attempts) for r in retries if r.member_id == "member-1"] == [
+        (requeued_id, 0)
+    ]
+
+
+def test_get_retrying_webhook_event_ids(session: Session):
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for member_id, payload in [
+        ("member-1", dump_member_events([], journal_ids=[1, 2])),
+        ("member-2", dump_member_events([], journal_ids=[2, 5])),
+        # retried without being journaled
+        ("member-3", dump_member_events([], journal_ids=[])),
+    ]:
+        add_webhook_retry(
+            session=session,
+            member_id=member_id,
+            payload=payload,
+            error="boom",
+            next_attempt_at=now,
+        )
+
+    assert get_retrying_webhook_event_ids(session=session) == {1, 2, 5}
+
+
+def patreon_member(
+    member_id: str, user_id: str, pledge_ids: list[str]
+) -> PatreonMember:
+    return PatreonMember(
+        id=member_id,
+        user_id=user_id,
+        name="A Patron",
+        email=f"{member_id}@example.com",
+        currently_entitled_amount_cents=500,
+        last_charge_date=datetime(2024, 2, 1, tzinfo=timezone.utc),
+        last_charge_status=ChargeStatus.paid,
+        next_charge_date=None,
+        patron_status=PatronStatus.active_patron,
+        note="",
+        discord_user_id=1234,
+        thumb_url=None,
+        pledge_ids=set(pledge_ids),
+        pledge_history=[
+            PledgeHistory(
+                id=id_,
+                type=PledgeEventType.subscription,
+                amount_cents=500,
+                date=datetime(2024, 1, idx + 1, tzinfo=timezone.utc),
+                status=ChargeStatus.paid,
+                tier_id="1",
+            )
+            for idx, id_ in enumerate(pledge_ids)
+        ],
+    )
+
+
+def test_patreon_mirror_full_sync(session: Session):
+    first_sync = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    upsert_patreon_members(
+        session=session,
+        members=[
+            patreon_member("member-1", "user-1", ["subscription:1", "subscription:2"]),
+            patreon_member("member-2", "user-2", ["subscription:3"]),
+        ],
+        synced_at=first_sync,
+    )
+    finish_patreon_full_sync(
+        session=session, started_at=first_sync, finished_at=first_sync
+    )
+
+    assert get_patreon_sync_state(session=session).member_count == 2  # type: ignore
+    member, user = get_mirrored_members(session=session, member_id="member-1")[0]
+    assert member.email == "member-1@example.com"
+    assert user.discord_user_id == 1234  # type: ignore
+    assert [p.id for p in get_mirrored_pledge_events(session, "member-1")] == [
+        "subscription:2",
+        "subscription:1",
+    ]
+
+    # member-2 left the campaign and Patreon only sent member-1's newest pledge
+    second_sync = first_sync + timedelta(hours=1)
+    member = patreon_member("member-1", "user-1", ["subscription:3"])
+    member.pledge_history[0].date = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    upsert_patreon_members(session=session, members=[member], synced_at=second_sync)
+    assert prune_patreon_mirror(session=session, synced_before=second_sync) == [
+        "member-2"
+    ]
+    finish_patreon_full_sync(
+        session=session, started_at=second_sync, finished_at=second_sync
+    )
+
+    assert [m.member_id for m, _ in get_mirrored_members(session)] == ["member-1"]
+    # pledge history is kept and only ever added to
+    assert [p.id for p in get_mirrored_pledge_events(session)] == [
+        "subscription:3",
+        "subscription:2",
+        "subscription:1",
+    ]
+    assert [p.id for p in get_mirrored_pledge_events(session, "member-1", limit=1)] == [
+        "subscription:3"
+    ]
+    assert session.scalars(select(PatreonUserMirror.user_id)).all() == ["user-1"]
+    assert get_patreon_sync_state(session=session).member_count == 1  # type: ignore
+
+
+def test_pledge_history_is_an_index_range_scan(session: Session):
+    stmt = (
+        select(PatreonPledgeEventMirror)
+        .where(PatreonPledgeEventMirror.member_id == "member-1")
+        .order_by(PatreonPledgeEventMirror.date.desc())
+        .limit(5)
+    )
+    sql = stmt.compile(compile_kwargs={"literal_binds": True})
+    plan = " ".join(
+        row[-1] for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+    )
+
+    assert "USING INDEX pledge_event_member_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_patreon_mirror_delta(session: Session):
+    synced_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    upsert_patreon_members(
+        session=session,
+        members=[patreon_member("member-1", "user-1", ["subscription:1"])],
+        synced_at=synced_at,
+    )
+
+    delta_at = synced_at + timedelta(minutes=5)
+    apply_patreon_member_delta(
+        session=session,
+        data={
+            "id": "member-1",
+            "user_id": "user-1",
+            "email": "member-1@example.com",
+            "currently_entitled_amount_cents": 0,
+            "last_charge_date": None,
+            "last_charge_status": ChargeStatus.declined,
+            "patron_status": PatronStatus.declined_patron,
+            "discord_user_id": None,
+        },
+        synced_at=delta_at,
+    )
+    # a new member we haven't synced yet
+    apply_patreon_member_delta(
+        session=session,
+        data={
+            "id": "member-2",
+            "user_id": "user-2",
+            "email": "member-2@example.com",
+            "currently_entitled_amount_cents": 500,
+            "last_charge_date": synced_at,
+            "last_charge_status": ChargeStatus.paid,
+            "patron_status": PatronStatus.active_patron,
+            "discord_user_id": "5678",
+        },
+        synced_at=delta_at,
+    )
+
+    members = {m.member_id: (m, u) for m, u in get_mirrored_members(session)}
+    member, user = members["member-1"]
+    assert member.patron_status == PatronStatus.declined_patron
+    assert member.currently_entitled_amount_cents == 0
+    # fields webhooks don't carry are left alone
+    assert member.name == "A Patron"
+    assert member.last_charge_date == datetime(2024, 2, 1)
+    assert user.discord_user_id is None  # type: ignore
+    assert [p.id for p in get_mirrored_pledge_events(session, "member-1")] == [
+        "subscription:1"
+    ]
+
+    member, user = members["member-2"]
+    assert member.name is None
+    assert user.discord_user_id == 5678  # type: ignore
+
+    state = get_patreon_sync_state(session=session)
+    assert state.last_delta_at == datetime(2024, 3, 1, 0, 5)  # type: ignore
+    assert state.last_full_sync_at is None  # type: ignore
+
+
+@pytest.mark.parametrize("member_id", [None, ""])
+def test_apply_patreon_member_delta_without_id(session: Session, member_id):
+    applied = apply_patreon_member_delta(
+        session=session,
+        data={
+            "id": member_id,
+            "user_id": "user-1",
+            "email": "member-1@example.com",
+            "currently_entitled_amount_cents": 500,
+            "last_charge_date": None,
+            "last_charge_status": ChargeStatus.paid,
+            "patron_status": PatronStatus.active_patron,
+            "discord_user_id": "1234",
+        },
+        synced_at=datetime(2024, 3, 1, tzinfo=timezone.utc),
+    )
+
+    assert not applied
+    assert list(get_mirrored_members(session)) == []
+    assert session.scalars(select(PatreonUserMirror)).all() == []
+    assert get_patreon_sync_state(session=session) is None
+
+
+def test_search_patreon_members(session: Session):
+    synced_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    members = [
+        patreon_member("member-1", "user-1", []),
+        patreon_member("member-2", "user-2", []),
+        patreon_member("member-3", "user-3", []),
+    ]
+    members[0] = msgspec.structs.replace(
+        members[0], name="Johnathan Smith", note="clan leader of 82AD"
+    )
+    members[1] = msgspec.structs.replace(
+        members[1], name="Jane Doe", email="jane.doe@example.com"
+    )
+    members[2].name = "Bob"
+    upsert_patreon_members(session=session, members=members, synced_at=synced_at)
+
+    def search(query: str) -> list[str]:
+        return [m.member_id for m in search_patreon_members(session, query)]
+
+    assert search("jonathan smith")[0] == "member-1"
+    assert search("jane.doe@exmaple.com")[0] == "member-2"
+    assert search("82ad") == ["member-1"]
+    assert search("Bo") == ["member-3"]
+    assert search("zzzz") == []
+    assert search(" ") == []
+
+    # linked CRCON player names are searchable too
+    discord = Discord(discord_name="bob#0")
+    session.add_all(
+        [
+            Patreon(patreon_id="member-3", discord=discord),
+            DiscordPlayers(
+                main=True,
+                discord=discord,
+                player=Player(player_id="1234", name="xXSniperXx"),
+            ),
+        ]
+    )
+    session.flush()
+    assert search("sniperx") == ["member-3"]
+
+    player = session.scalars(select(Player)).one()
+    player.name = "Medic"
+    session.flush()
+    assert search("sniperx") == []
+    assert search("medic") == ["member-3"]
+
+    # the search follows the mirror as members change or leave
+    members[1].name = "Jane Smith"
+    upsert_patreon_members(session=session, members=members[:2], synced_at=synced_at)
+    assert search("jane smith")[0] == "member-2"
+    prune_patreon_mirror(session=session, synced_before=synced_at + timedelta(hours=1))
+    assert search("jane") == []
+
+
+def test_patreon_full_sync_checkpoint(session: Session):
+    started_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    checkpoint_patreon_full_sync(
+        session=session, started_at=started_at, cursor="https://patreon/next"
+    )
+
+    state = get_patreon_sync_state(session=session)
+    assert state.resume_cursor == "https://patreon/next"  # type: ignore
+    assert state.resume_started_at == datetime(2024, 3, 1)  # type: ignore
+
+    finish_patreon_full_sync(
+        session=session,
+        started_at=started_at,
+        finished_at=started_at + timedelta(minutes=1),
+    )
+    assert state.resume_cursor is None  # type: ignore
+    assert state.resume_started_at is None  # type: ignore
+    assert state.last_full_sync_seconds == 60  # type: ignore
@@ -0,0 +1,189 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.integrations.crcon.crcon import fetch_player
+from hll_patreon_bot.integrations.httpcache import (
+    CachingTransport,
+    endpoint,
+    parse_cached,
+)
+
+PROFILE = {
+    "id": 1,
+    "player_id": "76561198000000000",
+    "created": "2024-01-01T00:00:00",
+    "names": [{"id": 1, "name": "SniperX", "player_id": "76561198000000000"}],
+    "vips": [{"server_number": 1, "expiration": "2024-03-01T00:00:00+00:00"}],
+}
+
+
+class Server:
+    """Answers with `body` and an ETag, or a 304 when asked with a matching one"""
+
+    def __init__(self, body: bytes, etag: str | None = '"v1"', **headers: str):
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = dict(self.headers)
+        if self.etag:
+            headers["ETag"] = self.etag
+            if request.headers.get("If-None-Match") == self.etag:
+                return httpx.Response(304, headers=headers)
+        return httpx.Response(200, headers=headers, content=self.body)
+
+
+def client(server: Server, max_bytes: int = 1024) -> httpx.AsyncClient:
+    transport = CachingTransport(
+        httpx.MockTransport(server), name="test", max_bytes=max_bytes
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+def test_revalidates_with_etag():
+    metrics.reset()
+    server = Server(b'{"result": 1}')
+
+    async def main():
+        async with client(server) as c:
+            first = await c.get(
+                "https://api.test/members/0c2a1a9e-4e3b-4a5f-9d3e-2f6b1c7d8e90"
+            )
+            second = await c.get(
+                "https://api.test/members/0c2a1a9e-4e3b-4a5f-9d3e-2f6b1c7d8e90"
+            )
+            return first, second
+
+    first, second = asyncio.run(main())
+
+    assert "If-None-Match" not in server.requests[0].headers
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    # callers never see the 304
+    assert second.status_code == 200
+    assert second.content == first.content == b'{"result": 1}'
+    assert metrics.COUNTERS["test.cache./members/{id}.hits"] == 1
+    assert metrics.COUNTERS["test.cache./members/{id}.misses"] == 1
+    assert metrics.COUNTERS["test.cache./members/{id}.bytes_saved"] == 13
+
+
+def test_changed_body_replaces_cached_one():
+    server = Server(b"old")
+
+    async def main():
+        async with client(server) as c:
+            await c.get("https://api.test/a")
+            server.body, server.etag = b"new", '"v2"'
+            changed = await c.get("https://api.test/a")
+            cached = await c.get("https://api.test/a")
+            return changed, cached
+
+    changed, cached = asyncio.run(main())
+
+    assert changed.content == cached.content == b"new"
+    assert server.requests[2].headers["If-None-Match"] == '"v2"'
+
+
+def test_uncacheable_responses_are_not_stored():
+    async def main(server: Server):
+        async with client(server) as c:
+            await c.get("https://api.test/a")
+            await c.get("https://api.test/a")
+            await c.post("https://api.test/a")
+        return server.requests
+
+    for server in (
+        Server(b"{}", etag=None),
+        Server(b"{}", **{"Cache-Control": "no-store"}),
+    ):
+        requests = asyncio.run(main(server))
+        assert all("If-None-Match" not in r.headers for r in requests)
+
+
+def test_last_modified_and_gzip():
+    stamp = "Wed, 21 Oct 2015 07:28:00 GMT"
+    body = b'{"result": "x"}'
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-Modified-Since") == stamp:
+            return httpx.Response(304)
+        return httpx.Response(
+            200,
+            headers={"Last-Modified": stamp, "Content-Encoding": "gzip"},
+            content=gzip.compress(body),
+        )
+
+    async def main():
+        transport = CachingTransport(
+            httpx.MockTransport(handler), name="test", max_bytes=1024
+        )
+        async with httpx.AsyncClient(transport=transport) as c:
+            return [(await c.get("https://api.test/a")).content for _ in range(2)]
+
+    assert asyncio.run(main()) == [body, body]
+
+
+def test_least_recently_used_is_evicted():
+    server = Server(b"x" * 40)
+
+    async def main():
+        async with client(server, max_bytes=100) as c:
+            for path in ("a", "b", "a", "c"):
+                await c.get(f"https://api.test/{path}")
+            # "b" was dropped to make room for "c"
+            await c.get("https://api.test/b")
+            return len(c._transport)  # type: ignore
+
+    assert asyncio.run(main()) == 2
+    assert [bool(r.headers.get("If-None-Match")) for r in server.requests] == [
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_parse_cached_reuses_parsed_body():
+    server = Server(json.dumps({"result": PROFILE}).encode())
+    calls: list[bytes] = []
+
+    def parse(body: bytes) -> dict:
+        calls.append(body)
+        return json.loads(body)
+
+    async def main():
+        async with client(server) as c:
+            results = [
+                parse_cached(await c.get("https://api.test/a"), parse) for _ in range(3)
+            ]
+            profiles = [
+                await fetch_player(c, "76561198000000000", rcon_url="https://api.test/")
+                for _ in range(2)
+            ]
+            return results, profiles
+
+    results, profiles = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert results[0] is results[1] is results[2]
+    assert profiles[0] is profiles[1]
+    assert profiles[0] is not None and profiles[0].names[0].name == "SniperX"
+
+
+def test_endpoint():
+    assert (
+        endpoint(
+            httpx.URL("https://www.patreon.com/api/oauth2/v2/campaigns/123/members")
+        )
+        == "/api/oauth2/v2/campaigns/{id}/members"
+    )
+    assert endpoint(httpx.URL("https://crcon.test/api/get_player_profile?a=1")) == (
+        "/api/get_player_profile"
+    )
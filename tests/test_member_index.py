@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+
+from hll_patreon_bot.integrations.patreon.search import MemberIndex
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatreonMember,
+    PatronStatus,
+)
+
+
+def member(
+    member_id: str,
+    name: str = "",
+    email: str = "",
+    discord_user_id: int | None = None,
+    note: str = "",
+    active: bool = True,
+    last_charged: int = 1,
+) -> PatreonMember:
+    return PatreonMember(
+        id=member_id,
+        name=name,
+        email=email,
+        currently_entitled_amount_cents=500,
+        last_charge_date=datetime(2024, 1, last_charged, tzinfo=timezone.utc),
+        last_charge_status=ChargeStatus.paid,
+        next_charge_date=None,
+        patron_status=(
+            PatronStatus.active_patron if active else PatronStatus.former_patron
+        ),
+        discord_user_id=discord_user_id,
+        note=note,
+        user_id=None,
+        thumb_url=None,
+        pledge_ids=set(),
+        pledge_history=[],
+    )
+
+
+def test_exact_lookups():
+    index = MemberIndex(
+        [
+            member("1", email="patron@example.com", discord_user_id=1234),
+            member("2", email="other@example.com"),
+        ]
+    )
+
+    assert len(index) == 2
+    assert "1" in index
+    assert index.get("2").id == "2"  # type: ignore
+    assert index.find_email("Patron@Example.com").id == "1"  # type: ignore
+    assert index.find_email("missing@example.com") is None
+    assert index.find_discord_user(1234).id == "1"  # type: ignore
+    assert index.find_discord_user(4321) is None
+
+
+def test_exact_lookups_prefer_active_patrons():
+    index = MemberIndex(
+        [
+            member("old", discord_user_id=1234, active=False, last_charged=20),
+            member("current", discord_user_id=1234, last_charged=10),
+        ]
+    )
+
+    assert index.find_discord_user(1234).id == "current"  # type: ignore
+
+
+def test_search_name():
+    index = MemberIndex(
+        [
+            member("1", name="John Smith"),
+            member("2", name="Johnny Smithers", last_charged=2),
+            member("3", name="Jane Doe"),
+            member("4", name=None),  # type: ignore
+        ]
+    )
+
+    assert [m.id for m in index.search_name("john smith")] == ["1", "2"]
+    assert [m.id for m in index.search_name("smith")] == ["1", "2"]
+    assert [m.id for m in index.search_name("JO")] == ["2", "1"]
+    assert [m.id for m in index.search_name("jo", limit=1)] == ["2"]
+    assert index.search_name("nobody") == []
+    assert index.search_name("") == []
+
+
+def test_search_notes():
+    index = MemberIndex(
+        [
+            member("1", note="Paid by PayPal, ask about the clan tag"),
+            member("2", note="clan leader"),
+            member("3"),
+        ]
+    )
+
+    assert [m.id for m in index.search_notes("Clan")] == ["1", "2"]
+    assert [m.id for m in index.search_notes("clan t")] == ["1"]
+    assert [m.id for m in index.search_notes("by")] == ["1"]
+    assert index.search_notes("clam") == []
+    assert index.search_notes("") == []
+
+
+def test_incremental_updates():
+    index = MemberIndex(
+        [member("1", name="John Smith", email="john@example.com", note="clan tag")]
+    )
+
+    index.add(
+        member("1", name="Jane Smith", email="jane@example.com", discord_user_id=99)
+    )
+    assert len(index) == 1
+    assert index.find_email("john@example.com") is None
+    assert index.find_email("jane@example.com").id == "1"  # type: ignore
+    assert index.find_discord_user(99).id == "1"  # type: ignore
+    assert index.search_name("john") == []
+    assert [m.id for m in index.search_name("jane")] == ["1"]
+    assert index.search_notes("clan") == []
+
+    assert index.remove("1").name == "Jane Smith"  # type: ignore
+    assert index.remove("1") is None
+    assert len(index) == 0
+    assert index.find_discord_user(99) is None
+    assert index.search_name("smith") == []
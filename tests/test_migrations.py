@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC = Path(__file__).parent.parent / "alembic"
+
+
+def alembic_config(url: str) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def test_upgrade_existing_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        # as an earlier version of the bot created them
+        connection.exec_driver_sql(
+            "CREATE TABLE player (id INTEGER PRIMARY KEY, player_id VARCHAR UNIQUE)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE patreon_pledge_event_mirror "
+            "(id VARCHAR PRIMARY KEY, member_id VARCHAR, date DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "CREATE INDEX ix_patreon_pledge_event_mirror_member_id "
+            "ON patreon_pledge_event_mirror (member_id)"
+        )
+
+    command.upgrade(alembic_config(url), "head")
+
+    inspector = inspect(engine)
+    assert "name" in {c["name"] for c in inspector.get_columns("player")}
+    assert {
+        i["name"] for i in inspector.get_indexes("patreon_pledge_event_mirror")
+    } == {"pledge_event_member_date"}
+    # created by the models later, complete
+    assert not inspector.has_table("patreon_sync_state")
+
+    command.downgrade(alembic_config(url), "base")
+
+    inspector = inspect(engine)
+    assert "name" not in {c["name"] for c in inspector.get_columns("player")}
+    assert {
+        i["name"] for i in inspector.get_indexes("patreon_pledge_event_mirror")
+    } == {"ix_patreon_pledge_event_mirror_member_id"}
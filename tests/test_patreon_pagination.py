@@ -0,0 +1,200 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from hll_patreon_bot.integrations.patreon import parsers
+from hll_patreon_bot.integrations.patreon.patreon import (
+    get_campaign_members,
+    iter_campaign_member_pages,
+    stream_campaign_members,
+)
+
+URL = "https://patreon.test/campaigns/{campaign_id}/members"
+
+
+def page(idx: int, pages: int) -> bytes:
+    member = {
+        "attributes": {
+            "currently_entitled_amount_cents": 500,
+            "email": f"member-{idx}@example.com",
+            "full_name": "A Patron",
+            "last_charge_date": None,
+            "last_charge_status": None,
+            "note": "",
+            "patron_status": "active_patron",
+        },
+        "id": f"member-{idx}",
+        "type": "member",
+    }
+    next_link = (
+        f"https://patreon.test/next?cursor={idx + 1}" if idx + 1 < pages else None
+    )
+    return json.dumps(
+        {"data": [member], "included": [], "links": {"next": next_link}}
+    ).encode()
+
+
+def client(pages: int, requests: list[httpx.Request]) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        idx = int(request.url.params.get("cursor", 0))
+        return httpx.Response(200, content=page(idx, pages))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_iter_campaign_member_pages():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        pages = []
+        async for members, next_link in iter_campaign_member_pages(
+            client=client(3, requests), campaign_id="1", url=URL, page_size=100
+        ):
+            pages.append((list(members), next_link))
+        return pages
+
+    assert asyncio.run(main()) == [
+        (["member-0"], "https://patreon.test/next?cursor=1"),
+        (["member-1"], "https://patreon.test/next?cursor=2"),
+        (["member-2"], None),
+    ]
+    assert requests[0].url.path == "/campaigns/1/members"
+    assert all(r.url.params["page[count]"] == "100" for r in requests)
+
+
+def test_iter_campaign_member_pages_prefetches():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        async for _, _ in iter_campaign_member_pages(
+            client=client(3, requests), campaign_id="1", url=URL
+        ):
+            # the next page is already on its way while we handle this one
+            await asyncio.sleep(0.05)
+            break
+        return len(requests)
+
+    assert asyncio.run(main()) == 2
+
+
+def test_iter_campaign_member_pages_resumes():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        return [
+            next_link
+            async for _, next_link in iter_campaign_member_pages(
+                client=client(3, requests),
+                cursor="https://patreon.test/next?cursor=2",
+                url=URL,
+            )
+        ]
+
+    assert asyncio.run(main()) == [None]
+    assert len(requests) == 1
+
+
+def test_iter_campaign_member_pages_raises():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"errors": []})
+
+    async def main():
+        async for _ in iter_campaign_member_pages(
+            client=httpx.AsyncClient(transport=httpx.MockTransport(handler)), url=URL
+        ):
+            pass
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
+
+
+def test_get_campaign_members_stops_at_member():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        results = []
+        async for members in get_campaign_members(
+            client=client(5, requests), member_id="member-1", url=URL
+        ):
+            results.append(set(members))
+        return results
+
+    assert asyncio.run(main()) == [{"member-0"}, {"member-0", "member-1"}]
+    # the third page was already prefetched but nothing after it
+    assert len(requests) == 3
+
+
+def test_stream_campaign_members():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        return [
+            member.id
+            async for member in stream_campaign_members(
+                client=client(3, requests), campaign_id="1", url=URL, page_size=100
+            )
+        ]
+
+    assert asyncio.run(main()) == ["member-0", "member-1", "member-2"]
+    assert requests[0].url.path == "/campaigns/1/members"
+    assert all(r.url.params["page[count]"] == "100" for r in requests)
+
+
+def test_stream_campaign_members_stops_early():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        members = stream_campaign_members(client=client(5, requests), url=URL)
+        async for _ in members:
+            # the next page is already on its way
+            await asyncio.sleep(0.05)
+            break
+        await members.aclose()
+        # nothing is fetched after the caller stops
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert len(requests) == 2
+
+
+def test_stream_campaign_members_stops_during_prefetch():
+    requests: list[httpx.Request] = []
+
+    async def main():
+        members = stream_campaign_members(client=client(5, requests), url=URL)
+        async for _ in members:
+            # the next page is still being fetched
+            break
+        await members.aclose()
+        return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(main()) == set()
+    assert len(requests) <= 2
+
+
+def test_stream_campaign_members_decodes_off_the_event_loop(monkeypatch):
+    requests: list[httpx.Request] = []
+    threads: set[int] = set()
+    parse_page_member = parsers._parse_page_member
+
+    def decode_member(data, resolver):
+        threads.add(threading.get_ident())
+        return parse_page_member(data=data, resolver=resolver)
+
+    monkeypatch.setattr(parsers, "_parse_page_member", decode_member)
+
+    async def main():
+        return [
+            member.id
+            async for member in stream_campaign_members(
+                client=client(2, requests), url=URL
+            )
+        ]
+
+    assert asyncio.run(main()) == ["member-0", "member-1"]
+    assert threads and threading.get_ident() not in threads
@@ -0,0 +1,254 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import msgspec
+import pytest
+
+from hll_patreon_bot.integrations.patreon.constants import FIELD_PROFILES, FieldProfile
+from hll_patreon_bot.integrations.patreon.jsonapi import Resolver
+from hll_patreon_bot.integrations.patreon.parsers import (
+    iter_campaign_members_page,
+    parse_campaign_members_page,
+    parse_member,
+)
+from hll_patreon_bot.integrations.patreon.schemas import (
+    IncludedAttributes,
+    MemberAttributes,
+    Resource,
+    ResourceId,
+    ToMany,
+    ToOne,
+)
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatronStatus,
+    PledgeEventType,
+)
+from hll_patreon_bot.patreon_webhook.utils import (
+    parse_patreon_member_webhook,
+    parse_patreon_pledge_webhook,
+)
+
+SAMPLE_DATA = Path(__file__).parent.parent / "sample_data"
+
+
+def member_data(member_id: str, user_id: str, pledge_ids: list[str]) -> dict:
+    return {
+        "attributes": {
+            "currently_entitled_amount_cents": 500,
+            "email": "patron@example.com",
+            "full_name": "A Patron",
+            "last_charge_date": "2024-02-01T00:00:00.000+00:00",
+            "last_charge_status": "Paid",
+            "next_charge_date": None,
+            "note": "",
+            "patron_status": "active_patron",
+        },
+        "id": member_id,
+        "relationships": {
+            "pledge_history": {
+                "data": [{"id": id_, "type": "pledge-event"} for id_ in pledge_ids]
+            },
+            "user": {"data": {"id": user_id, "type": "user"}},
+        },
+        "type": "member",
+    }
+
+
+def user(user_id: str, discord_user_id: str | None) -> dict:
+    return {
+        "attributes": {
+            "social_connections": {
+                "discord": (
+                    {"user_id": discord_user_id, "url": None}
+                    if discord_user_id
+                    else None
+                ),
+                "twitch": None,
+            },
+            "thumb_url": f"https://example.com/{user_id}.png",
+        },
+        "id": user_id,
+        "type": "user",
+    }
+
+
+def pledge_event(id_: str, date: str, payment_status: str | None) -> dict:
+    return {
+        "attributes": {
+            "amount_cents": 500,
+            "date": date,
+            "payment_status": payment_status,
+            "tier_id": "1",
+            "type": id_.split(":")[0],
+        },
+        "id": id_,
+        "type": "pledge-event",
+    }
+
+
+@pytest.mark.parametrize(
+    "parser, sample",
+    [
+        (parse_patreon_member_webhook, "members-update-real.json"),
+        (parse_patreon_member_webhook, "members-update-real-2.json"),
+        (parse_patreon_pledge_webhook, "members-pledge-create-real.json"),
+    ],
+)
+def test_webhook_parsers_accept_raw_body(parser, sample):
+    body = (SAMPLE_DATA / sample).read_bytes()
+
+    assert parser(body) == parser(json.loads(body))
+
+
+def test_parse_member():
+    doc = {
+        "data": member_data("member-1", "user-1", ["subscription:1", "pledge_start:2"]),
+        "included": [
+            {"attributes": {"name": "campaign"}, "id": "1", "type": "campaign"},
+            user("user-1", "1234"),
+            pledge_event("subscription:1", "2024-02-01T00:00:00.000+00:00", "Paid"),
+            pledge_event("pledge_start:2", "2024-01-01T00:00:00.000+00:00", None),
+        ],
+    }
+
+    res = parse_member(json.dumps(doc).encode())
+
+    assert res == parse_member(doc)
+    assert res.discord_user_id == 1234
+    assert res.thumb_url == "https://example.com/user-1.png"
+    assert res.patron_status == PatronStatus.active_patron
+    assert res.last_charge_status == ChargeStatus.paid
+    assert res.last_charge_date == datetime(2024, 2, 1, tzinfo=timezone.utc)
+    assert res.pledge_ids == {"subscription:1", "pledge_start:2"}
+    assert [p.type for p in res.pledge_history] == [
+        PledgeEventType.subscription,
+        PledgeEventType.start,
+    ]
+    assert res.pledge_history[1].status == ChargeStatus.none
+
+
+def test_parse_campaign_members_page():
+    doc = {
+        "data": [
+            member_data("member-1", "user-1", ["subscription:1", "subscription:2"]),
+            member_data("member-2", "user-2", ["pledge_start:3"]),
+        ],
+        "included": [
+            user("user-1", "1234"),
+            user("user-2", None),
+            pledge_event("subscription:1", "2024-01-01T00:00:00.000+00:00", "Paid"),
+            pledge_event("subscription:2", "2024-02-01T00:00:00.000+00:00", "Paid"),
+            pledge_event("pledge_start:3", "2024-01-01T00:00:00.000+00:00", None),
+        ],
+        "links": {"next": "https://www.patreon.com/api/oauth2/v2/next"},
+    }
+
+    members, next_link = parse_campaign_members_page(json.dumps(doc).encode())
+
+    assert next_link == "https://www.patreon.com/api/oauth2/v2/next"
+    assert members["member-1"].discord_user_id == 1234
+    assert members["member-2"].discord_user_id is None
+    # pledges without a payment status are dropped
+    assert [p.id for p in members["member-1"].pledge_history] == [
+        "subscription:1",
+        "subscription:2",
+    ]
+    assert members["member-2"].pledge_history == []
+    assert members["member-1"].pledge_ids == {"subscription:1", "subscription:2"}
+
+
+def test_iter_campaign_members_page():
+    doc = {
+        "data": [
+            member_data("member-1", "user-1", ["subscription:1"]),
+            member_data("member-2", "user-2", []),
+        ],
+        "included": [
+            user("user-1", "1234"),
+            pledge_event("subscription:1", "2024-01-01T00:00:00.000+00:00", "Paid"),
+        ],
+        "links": {"next": "https://www.patreon.com/api/oauth2/v2/next"},
+    }
+    body = json.dumps(doc).encode()
+
+    members, next_link = iter_campaign_members_page(body)
+
+    assert next_link == "https://www.patreon.com/api/oauth2/v2/next"
+    assert list(members) == list(parse_campaign_members_page(body)[0].values())
+
+
+def test_parse_campaign_members_page_missing_includes():
+    doc = {
+        "data": [member_data("member-1", "user-1", ["subscription:1"])],
+        "included": [],
+    }
+
+    members, next_link = parse_campaign_members_page(doc)
+
+    assert next_link is None
+    assert members["member-1"].discord_user_id is None
+    assert members["member-1"].thumb_url is None
+    assert members["member-1"].pledge_history == []
+
+
+def test_resolver():
+    user_ = Resource(type="user", id="1")
+    pledges = [Resource(type="pledge-event", id=str(idx)) for idx in range(3)]
+    resolver = Resolver([user_, *pledges])
+
+    assert len(resolver) == 4
+    assert resolver.get("user", "1") is user_
+    assert resolver.get("pledge-event", "1") is pledges[1]
+    # ids are only unique per type
+    assert resolver.get("member", "1") is None
+    assert resolver.of_type("pledge-event") == pledges
+    assert resolver.of_type("tier") == []
+
+    assert resolver.one(ToOne(data=ResourceId(id="1", type="user"))) is user_
+    assert resolver.one(ToOne(data=None)) is None
+    assert resolver.one(None) is None
+
+    refs = [ResourceId(id=id_, type="pledge-event") for id_ in ("2", "missing", "0")]
+    assert resolver.many(ToMany(data=refs)) == [pledges[2], pledges[0]]
+    assert resolver.many(None) == []
+
+
+@pytest.mark.parametrize("data", [{}, b"{}", b'{"data": {"id": "1"}}'])
+def test_parse_member_exceptions(data):
+    with pytest.raises(KeyError):
+        parse_member(data)
+
+
+@pytest.mark.parametrize("profile", list(FieldProfile))
+def test_field_profiles_only_ask_for_parsed_fields(profile):
+    params = FIELD_PROFILES[profile]
+    member_fields = {f.name for f in msgspec.structs.fields(MemberAttributes)}
+    included_fields = {f.name for f in msgspec.structs.fields(IncludedAttributes)}
+
+    assert set(params["fields[member]"].split(",")) <= member_fields
+    for key, fields in params.items():
+        if key.startswith("fields[") and key != "fields[member]":
+            assert set(fields.split(",")) <= included_fields
+    assert set(params["include"].split(",")) <= {"user", "pledge_history"}
+
+
+def test_parse_member_sparse_fieldset():
+    doc = {
+        "data": {
+            "attributes": {"patron_status": "active_patron"},
+            "id": "member-1",
+            "relationships": {"user": {"data": {"id": "user-1", "type": "user"}}},
+            "type": "member",
+        },
+        "included": [user("user-1", "1234")],
+    }
+
+    res = parse_member(doc)
+
+    assert res.patron_status == PatronStatus.active_patron
+    assert res.discord_user_id == 1234
+    assert res.email is None
+    assert res.last_charge_status == ChargeStatus.none
+    assert res.pledge_history == []
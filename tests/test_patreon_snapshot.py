@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import msgspec
+from freezegun import freeze_time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from hll_patreon_bot.database.models import Base
+from hll_patreon_bot.database.utils import apply_patreon_member_delta
+from hll_patreon_bot.integrations.patreon import mirror
+from hll_patreon_bot.integrations.patreon.types import (
+    ChargeStatus,
+    PatreonMember,
+    PatronStatus,
+)
+
+
+def member(member_id: str, name: str) -> PatreonMember:
+    return PatreonMember(
+        id=member_id,
+        name=name,
+        email=f"{member_id}@example.com",
+        currently_entitled_amount_cents=500,
+        last_charge_date=None,
+        last_charge_status=None,
+        next_charge_date=None,
+        patron_status=None,
+        note="",
+        user_id=None,
+        discord_user_id=None,
+        thumb_url=None,
+        pledge_ids=set(),
+        pledge_history=[],
+    )
+
+
+def test_warm_loads_last_sync(monkeypatch):
+    synced_at = datetime.now(tz=timezone.utc) - timedelta(minutes=5)
+    monkeypatch.setattr(mirror, "last_full_sync_at", lambda: synced_at)
+    monkeypatch.setattr(
+        mirror,
+        "load_members",
+        lambda: {"1": member("1", "Old Name"), "2": member("2", "Medic")},
+    )
+    patreon_mirror = mirror.PatreonMirror()
+    # already indexed by a sync running alongside, so newer than the mirror
+    patreon_mirror.index.add(member("1", "New Name"))
+
+    assert patreon_mirror.snapshot() is None
+    asyncio.run(patreon_mirror.warm())
+    snapshot = patreon_mirror.snapshot()
+
+    assert snapshot is not None
+    index, snapshot_synced_at = snapshot
+    assert snapshot_synced_at == synced_at
+    assert len(index) == 2
+    assert index.get("1").name == "New Name"  # type: ignore
+
+
+def test_warm_before_first_sync(monkeypatch):
+    monkeypatch.setattr(mirror, "last_full_sync_at", lambda: None)
+    patreon_mirror = mirror.PatreonMirror()
+
+    asyncio.run(patreon_mirror.warm())
+
+    assert patreon_mirror.snapshot() is None
+
+
+def test_stale_snapshot_is_served_while_syncing():
+    patreon_mirror = mirror.PatreonMirror(interval=60)
+    patreon_mirror.index.add(member("1", "Medic"))
+
+    patreon_mirror.synced_at = datetime.now(tz=timezone.utc)
+    assert patreon_mirror.snapshot() is not None
+    assert not patreon_mirror._wakeup.is_set()
+
+    patreon_mirror.synced_at -= timedelta(minutes=5)
+    snapshot = patreon_mirror.snapshot()
+
+    assert snapshot is not None and len(snapshot[0]) == 1
+    assert patreon_mirror._wakeup.is_set()
+
+
+def test_refresh_follows_full_syncs_only(monkeypatch):
+    full_sync_at: datetime | None = None
+    monkeypatch.setattr(mirror, "last_full_sync_at", lambda: full_sync_at)
+    monkeypatch.setattr(
+        mirror, "load_members", lambda synced_since: {"1": member("1", "Medic")}
+    )
+    patreon_mirror = mirror.PatreonMirror()
+
+    # only webhooks mirrored so far, the index is partial
+    asyncio.run(patreon_mirror.refresh_index())
+    assert len(patreon_mirror.index) == 1
+    assert patreon_mirror.snapshot() is None
+
+    full_sync_at = datetime.now(tz=timezone.utc)
+    asyncio.run(patreon_mirror.refresh_index())
+    snapshot = patreon_mirror.snapshot()
+
+    assert snapshot is not None and snapshot[1] == full_sync_at
+
+
+def test_load_member_synced_at_is_per_member(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+
+    @contextmanager
+    def enter_session():
+        with Session(engine) as session, session.begin():
+            yield session
+
+    monkeypatch.setattr(mirror, "enter_session", enter_session)
+    stored_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    delta_at = stored_at + timedelta(hours=1)
+
+    assert mirror.load_member_synced_at(member_id="1") is None
+    with freeze_time(stored_at):
+        for member_id, name in [("1", "Medic"), ("2", "Sniper")]:
+            mirror.store_member(
+                msgspec.structs.replace(
+                    member(member_id, name),
+                    last_charge_status=ChargeStatus.paid,
+                    patron_status=PatronStatus.active_patron,
+                )
+            )
+    with enter_session() as session:
+        apply_patreon_member_delta(
+            session=session,
+            data={
+                "id": "2",
+                "currently_entitled_amount_cents": 0,
+                "last_charge_date": None,
+                "last_charge_status": ChargeStatus.declined,
+                "patron_status": PatronStatus.declined_patron,
+            },
+            synced_at=delta_at,
+        )
+
+    loaded = {
+        member_id: mirror.load_member_synced_at(member_id=member_id)
+        for member_id in ("1", "2")
+    }
+
+    assert loaded["1"] is not None and loaded["1"][1] == stored_at
+    assert loaded["2"] is not None and loaded["2"][1] == delta_at
+    assert loaded["1"][0] == mirror.load_member(member_id="1")
@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import httpx
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.integrations.ratelimit import (
+    Priority,
+    RateLimitedTransport,
+    TokenBucket,
+    background,
+    retry_after,
+)
+
+
+def test_token_bucket_bursts_then_waits():
+    async def main():
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        waits = [await bucket.acquire() for _ in range(4)]
+        return waits, time.monotonic() - start
+
+    waits, elapsed = asyncio.run(main())
+
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    # two tokens at 50 a second
+    assert elapsed >= 0.035
+
+
+def test_token_bucket_serves_interactive_first():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+
+        order: list[str] = []
+
+        async def take(name: str, priority: Priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(
+            take("crawl-1", Priority.background),
+            take("crawl-2", Priority.background),
+            take("command", Priority.interactive),
+        )
+        return order
+
+    assert asyncio.run(main()) == ["command", "crawl-1", "crawl-2"]
+
+
+def test_token_bucket_pause():
+    async def main():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.045
+
+
+def test_token_bucket_cancelled_waiter():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+
+        cancelled = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        # the cancelled waiter doesn't hold up the next one
+        await asyncio.wait_for(bucket.acquire(), timeout=0.2)
+
+    asyncio.run(main())
+
+
+def client(responses: list[httpx.Response], requests: list[httpx.Request], **kwargs):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses.pop(0)
+
+    transport = RateLimitedTransport(
+        httpx.MockTransport(handler),
+        bucket=TokenBucket(rate=100, capacity=10),
+        name="test",
+        max_retries=2,
+        base_delay=0.01,
+        **kwargs,
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+def test_rate_limited_transport_retries_after_throttling():
+    metrics.reset()
+    requests: list[httpx.Request] = []
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.05"}),
+        httpx.Response(503),
+        httpx.Response(200, json={"data": []}),
+    ]
+
+    async def main():
+        start = time.monotonic()
+        res = await client(responses, requests).get("https://patreon.test/")
+        return res, time.monotonic() - start
+
+    res, elapsed = asyncio.run(main())
+
+    assert res.status_code == 200
+    assert len(requests) == 3
+    assert elapsed >= 0.05
+    assert metrics.COUNTERS["test.throttled"] == 2
+    assert metrics.TIMINGS["test.throttle_wait.interactive"].count == 2
+
+
+def test_rate_limited_transport_gives_up():
+    requests: list[httpx.Request] = []
+    responses = [httpx.Response(429, headers={"Retry-After": "0"}) for _ in range(3)]
+
+    async def main():
+        return await client(responses, requests).get("https://patreon.test/")
+
+    assert asyncio.run(main()).status_code == 429
+    assert len(requests) == 3
+
+
+def test_rate_limited_transport_only_retries_safe_methods():
+    requests: list[httpx.Request] = []
+    responses = [httpx.Response(429, headers={"Retry-After": "0"})]
+
+    async def main():
+        return await client(responses, requests).post("https://patreon.test/")
+
+    assert asyncio.run(main()).status_code == 429
+    assert len(requests) == 1
+
+
+def test_background_priority():
+    metrics.reset()
+    responses = [httpx.Response(429, headers={"Retry-After": "0.01"})]
+    responses.append(httpx.Response(200))
+
+    async def main():
+        with background():
+            await client(responses, []).get("https://patreon.test/")
+
+    asyncio.run(main())
+
+    assert "test.throttle_wait.background" in metrics.TIMINGS
+
+
+def test_long_retry_after_is_capped_and_handed_back_to_interactive_callers():
+    metrics.reset()
+    requests: list[httpx.Request] = []
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "3600"}),
+        httpx.Response(200),
+    ]
+
+    async def main():
+        c = client(responses, requests, max_delay=0.1, max_interactive_wait=0.05)
+        throttled = await c.get("https://patreon.test/")
+        # the bucket is paused for longer than an interactive caller may wait
+        paused = await c.get("https://patreon.test/")
+        start = time.monotonic()
+        with background():
+            res = await c.get("https://patreon.test/")
+        return throttled, paused, res, time.monotonic() - start
+
+    throttled, paused, res, elapsed = asyncio.run(main())
+
+    assert throttled.status_code == paused.status_code == 429
+    assert paused.headers["Retry-After"] == "1"
+    assert res.status_code == 200
+    assert len(requests) == 2
+    # waited out the capped 0.1s, not the hour asked for
+    assert elapsed < 1
+    assert metrics.COUNTERS["test.throttled.interactive"] == 2
+
+
+def test_retry_after():
+    assert retry_after(httpx.Response(429, headers={"Retry-After": "12"})) == 12
+    assert retry_after(httpx.Response(429)) is None
+    assert retry_after(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    past = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert retry_after(httpx.Response(429, headers={"Retry-After": past})) == 0
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from hll_patreon_bot import serialization
+
+SAMPLE = Path(__file__).parent.parent / "sample_data" / "members-update-real.json"
+
+
+def test_loads_from_bytes():
+    body = SAMPLE.read_bytes()
+
+    data = serialization.loads(body)
+
+    assert data == serialization.loads(body.decode())
+    assert data == serialization.loads(memoryview(body))
+    assert data["data"]["type"] == "member"
+
+
+def test_dumps_round_trips():
+    data = {"id": "1", "included": [{"type": "user", "attributes": {}}], "n": None}
+
+    assert isinstance(serialization.dumps(data), bytes)
+    assert serialization.loads(serialization.dumps_str(data)) == data
+
+
+def test_dumps_default():
+    class Cents:
+        def __init__(self, amount: int) -> None:
+            self.amount = amount
+
+    data = {"at": datetime(2024, 1, 1, tzinfo=timezone.utc), "price": Cents(500)}
+
+    assert serialization.loads(
+        serialization.dumps(data, default=lambda value: value.amount)
+    ) == {"at": "2024-01-01T00:00:00Z", "price": 500}
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from hll_patreon_bot.bot.utils import raise_on_4xx_5xx
+from hll_patreon_bot.integrations.patreon.types import ChargeStatus, PatronStatus
+from hll_patreon_bot.patreon_webhook import actions
+from hll_patreon_bot.patreon_webhook.actions import (
+    handle_pledge_update,
+    merge_member_events,
+)
+from hll_patreon_bot.patreon_webhook.types import (
+    PatreonTriggerAction,
+    PatreonTriggerResource,
+    PatreonWebhook,
+)
+
+MEMBER_CREATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.CREATE
+)
+MEMBER_UPDATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.UPDATE
+)
+PLEDGE_CREATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER,
+    sub_resource=PatreonTriggerResource.PLEDGE,
+    action=PatreonTriggerAction.CREATE,
+)
+PLEDGE_DELETE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER,
+    sub_resource=PatreonTriggerResource.PLEDGE,
+    action=PatreonTriggerAction.DELETE,
+)
+
+
+def make_data(discord_user_id: str | None, last_charge_date: datetime):
+    return {
+        "id": "member-1",
+        "currently_entitled_amount_cents": 500,
+        "email": "patron@example.com",
+        "last_charge_date": last_charge_date,
+        "next_charge_date": None,
+        "last_charge_status": ChargeStatus.paid,
+        "patron_status": PatronStatus.active_patron,
+        "discord_user_id": discord_user_id,
+    }
+
+
+def test_merge_member_events_signup_burst():
+    earlier = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    later = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+    member_create = make_data(discord_user_id=None, last_charge_date=earlier)
+    pledge_create = make_data(discord_user_id=None, last_charge_date=later)
+    member_update = make_data(discord_user_id="12345", last_charge_date=later)
+    pledge_delete = make_data(discord_user_id=None, last_charge_date=later)
+
+    link_data, pledge_data = merge_member_events(
+        [
+            (MEMBER_CREATE, member_create),
+            (PLEDGE_CREATE, pledge_create),
+            (MEMBER_UPDATE, member_update),
+            (PLEDGE_DELETE, pledge_delete),
+        ]
+    )
+
+    assert link_data is member_update
+    assert pledge_data is pledge_create
+
+
+def test_merge_member_events_nothing_to_do():
+    data = make_data(discord_user_id=None, last_charge_date=datetime.now())
+
+    assert merge_member_events([(MEMBER_UPDATE, data)]) == (None, None)
+
+
+def test_pledge_update_retry_skips_players_already_extended(monkeypatch):
+    record = SimpleNamespace(
+        discord=SimpleNamespace(
+            players=[
+                SimpleNamespace(player=SimpleNamespace(player_id=player_id))
+                for player_id in ("player-1", "player-2")
+            ]
+        )
+    )
+    monkeypatch.setattr(actions, "enter_session", nullcontext)
+    monkeypatch.setattr(actions, "get_patreon_record", lambda **_: record)
+
+    added: list[str] = []
+    failing = {"player-2"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("get_vip_ids"):
+            result: object = []
+        elif request.url.path.endswith("get_player_profile"):
+            result = None
+        else:
+            player_id = dict(httpx.QueryParams(request.content.decode()))["player_id"]
+            if player_id in failing:
+                return httpx.Response(502)
+            added.append(player_id)
+            result = True
+        return httpx.Response(200, content=json.dumps({"result": result}).encode())
+
+    data = make_data(discord_user_id=None, last_charge_date=datetime.now(timezone.utc))
+    data["next_charge_date"] = datetime.now(timezone.utc) + timedelta(days=30)
+    completed: set[str] = set()
+
+    async def update():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler),
+            base_url="https://crcon.test/",
+            event_hooks={"response": [raise_on_4xx_5xx]},
+        ) as client:
+            await handle_pledge_update(client=client, data=data, completed=completed)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(update())
+    assert added == ["player-1"]
+    assert completed == {"player-1"}
+
+    failing.clear()
+    asyncio.run(update())
+
+    assert added == ["player-1", "player-2"]
+    assert completed == {"player-1", "player-2"}
@@ -0,0 +1,33 @@
+from hll_patreon_bot import metrics
+from hll_patreon_bot.patreon_webhook.dedupe import WebhookDeduplicator, event_identity
+
+
+def test_event_identity():
+    body = b'{"data": {"id": "1234"}}'
+
+    assert event_identity("members:update", body) == event_identity(
+        "members:update", body
+    )
+    assert event_identity("members:update", body) != event_identity(
+        "members:create", body
+    )
+    assert event_identity("members:update", body) != event_identity(
+        "members:update", body.replace(b"1234", b"4321")
+    )
+
+
+def test_deduplicator_counts_hits_and_misses():
+    metrics.reset()
+    dedupe = WebhookDeduplicator(maxsize=2)
+
+    assert not dedupe.seen("a")
+    dedupe.add("a")
+    assert dedupe.seen("a")
+
+    dedupe.add("b")
+    dedupe.add("c")
+    # evicted, the journal index is what catches this one
+    assert not dedupe.seen("a")
+
+    assert metrics.COUNTERS["webhook.dedupe.hit"] == 1
+    assert metrics.COUNTERS["webhook.dedupe.miss"] == 2
@@ -0,0 +1,139 @@
+import asyncio
+
+import aiohttp
+import discord
+import pytest
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.patreon_webhook.discord import DISCORD_MAX_EMBEDS, EmbedForwarder
+
+
+class FakeWebhook:
+    def __init__(self, failures: int = 0, error: Exception | None = None) -> None:
+        self.failures = failures
+        self.error = error or aiohttp.ClientConnectionError("connection reset")
+        self.sent: list[list[discord.Embed]] = []
+
+    async def send(self, embeds: list[discord.Embed]):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        self.sent.append(embeds)
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    delays: list[float] = []
+    original_sleep = asyncio.sleep
+
+    async def no_backoff(delay):
+        delays.append(delay)
+        await original_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", no_backoff)
+    return delays
+
+
+def test_forwarder_packs_embeds_into_messages():
+    webhook = FakeWebhook()
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=lambda: webhook, flush_interval=60)
+        await forwarder.start()
+        for n in range(DISCORD_MAX_EMBEDS * 2 + 3):
+            forwarder.forward(discord.Embed(title=str(n)))
+        await forwarder.stop()
+
+    asyncio.run(run())
+
+    assert [len(batch) for batch in webhook.sent] == [10, 10, 3]
+    assert [e.title for batch in webhook.sent for e in batch] == [
+        str(n) for n in range(23)
+    ]
+
+
+def test_forwarder_respects_embed_character_limit():
+    webhook = FakeWebhook()
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=lambda: webhook)
+        for _ in range(3):
+            forwarder.forward(discord.Embed(description="x" * 2500))
+        await forwarder.flush()
+
+    asyncio.run(run())
+
+    assert [len(batch) for batch in webhook.sent] == [2, 1]
+
+
+def test_forwarder_retries_failed_sends(sleeps):
+    webhook = FakeWebhook(failures=1)
+    metrics.reset()
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=lambda: webhook, max_attempts=2)
+        forwarder.forward(discord.Embed(title="retried"))
+        await forwarder.flush()
+
+    asyncio.run(run())
+
+    assert [e.title for batch in webhook.sent for e in batch] == ["retried"]
+    assert metrics.COUNTERS["discord.forward.retries"] == 1
+
+
+def test_forwarder_retries_timeouts_without_sleeping_after_the_last(sleeps):
+    webhook = FakeWebhook(failures=2, error=asyncio.TimeoutError())
+    metrics.reset()
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=lambda: webhook, max_attempts=2)
+        forwarder.forward(discord.Embed(title="timed out"))
+        await forwarder.flush()
+
+    asyncio.run(run())
+
+    assert webhook.sent == []
+    assert sleeps == [2]
+    assert metrics.COUNTERS["discord.forward.dropped"] == 1
+
+
+def test_forwarder_keeps_running_after_unexpected_errors(sleeps):
+    webhook = FakeWebhook()
+    metrics.reset()
+    calls = 0
+
+    def get_webhook() -> FakeWebhook:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ValueError("FORWARD_WEBHOOK is not set")
+        return webhook
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=get_webhook, flush_interval=60)
+        await forwarder.start()
+        forwarder.forward(discord.Embed(title="dropped"))
+        await forwarder.flush()
+        forwarder.forward(discord.Embed(title="sent"))
+        await forwarder.stop()
+
+    asyncio.run(run())
+
+    assert [e.title for batch in webhook.sent for e in batch] == ["sent"]
+    assert metrics.COUNTERS["discord.forward.dropped"] == 1
+
+
+def test_forwarder_drops_oldest_embeds_once_full():
+    webhook = FakeWebhook()
+    metrics.reset()
+
+    async def run():
+        forwarder = EmbedForwarder(get_webhook=lambda: webhook, max_buffered=3)
+        for n in range(5):
+            forwarder.forward(discord.Embed(title=str(n)))
+        await forwarder.flush()
+
+    asyncio.run(run())
+
+    assert [e.title for batch in webhook.sent for e in batch] == ["2", "3", "4"]
+    assert metrics.COUNTERS["discord.forward.overflowed"] == 2
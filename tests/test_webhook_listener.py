@@ -0,0 +1,170 @@
+import hashlib
+import hmac
+from contextlib import nullcontext
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from starlette.testclient import TestClient
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.database.models import WebhookStatus
+from hll_patreon_bot.patreon_webhook import webhook_listener
+from hll_patreon_bot.patreon_webhook.dedupe import WebhookDeduplicator
+from hll_patreon_bot.patreon_webhook.worker import InFlightLimiter, WebhookQueue
+
+SECRET = "webhook-secret"
+BODY = b'{"data": {"id": "52c7b310-8d73-4ce8-bfba-ef1caa58eb4e"}}'
+SIGNATURE = hmac.new(SECRET.encode(), BODY, hashlib.md5).hexdigest()
+
+
+async def process(job):
+    pass
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    """The listener with its own queue and limits, journaling to a list"""
+    monkeypatch.setattr(webhook_listener, "CRCON_API_KEY", "crcon-key")
+    monkeypatch.setattr(webhook_listener, "PATREON_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(webhook_listener, "DEDUPE", WebhookDeduplicator())
+    monkeypatch.setattr(webhook_listener, "QUEUE", WebhookQueue(process=process))
+    monkeypatch.setattr(webhook_listener, "IN_FLIGHT", InFlightLimiter(limit=1))
+    monkeypatch.setattr(webhook_listener, "enter_session", nullcontext)
+
+    journaled: list[dict] = []
+
+    def add_webhook_event(session, **kwargs) -> int:
+        journaled.append(kwargs)
+        return len(journaled)
+
+    monkeypatch.setattr(webhook_listener, "add_webhook_event", add_webhook_event)
+    metrics.reset()
+    return journaled
+
+
+@pytest.fixture
+def client():
+    # not entered, the lifespan would start the real clients and workers
+    return TestClient(webhook_listener.app)
+
+
+def post(client, event="members:pledge:create", body=BODY, signature=SIGNATURE):
+    headers = {"X-Patreon-Event": event}
+    if signature is not None:
+        headers["X-Patreon-Signature"] = signature
+    return client.post("/", content=body, headers=headers)
+
+
+@pytest.mark.parametrize("setting", ["CRCON_API_KEY", "PATREON_WEBHOOK_SECRET"])
+def test_webhook_requires_settings(journal, client, monkeypatch, setting):
+    monkeypatch.setattr(webhook_listener, setting, "")
+
+    with pytest.raises(ValueError, match=setting):
+        post(client)
+    assert journal == []
+
+
+@pytest.mark.parametrize(
+    "signature,counter",
+    [
+        (None, "webhook.rejected.missing_signature"),
+        ("0" * 32, "webhook.rejected.bad_signature"),
+    ],
+)
+def test_webhook_rejects_signature(journal, client, signature, counter):
+    assert post(client, signature=signature).status_code == 401
+    assert metrics.COUNTERS[counter] == 1
+    assert journal == []
+
+
+def test_webhook_rejects_unknown_event(journal, client):
+    assert post(client, event="members:unknown").status_code == 400
+    assert metrics.COUNTERS["webhook.rejected.bad_event"] == 1
+    assert journal == []
+
+
+def test_webhook_accepts_and_enqueues(journal, client):
+    response = post(client)
+
+    assert response.status_code == 202
+    assert [entry["status"] for entry in journal] == [WebhookStatus.received]
+    assert webhook_listener.QUEUE.depth == 1
+    assert webhook_listener.IN_FLIGHT.in_flight == 1
+
+
+def test_webhook_drops_duplicates(journal, client):
+    assert post(client).status_code == 202
+
+    assert post(client).status_code == 200
+    assert len(journal) == 1
+    assert webhook_listener.QUEUE.depth == 1
+    assert webhook_listener.IN_FLIGHT.in_flight == 1
+
+
+def test_webhook_sheds_load(journal, client):
+    assert webhook_listener.IN_FLIGHT.try_acquire()
+
+    response = post(client)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(
+        webhook_listener.WEBHOOK_SHED_RETRY_AFTER
+    )
+    assert metrics.COUNTERS["webhook.rejected.shed"] == 1
+    assert journal == []
+    # the shed request holds no slot
+    assert webhook_listener.IN_FLIGHT.in_flight == 1
+    # not counted as seen, Patreon's redelivery must get through
+    webhook_listener.IN_FLIGHT.release()
+    assert post(client).status_code == 202
+
+
+def test_webhook_already_journaled(journal, client, monkeypatch):
+    def add_webhook_event(session, **kwargs):
+        raise IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+
+    monkeypatch.setattr(webhook_listener, "add_webhook_event", add_webhook_event)
+
+    assert post(client).status_code == 200
+    assert metrics.COUNTERS["webhook.dedupe.journal_hit"] == 1
+    assert webhook_listener.QUEUE.depth == 0
+    # the slot taken before journaling is given back
+    assert webhook_listener.IN_FLIGHT.in_flight == 0
+    # and later deliveries don't touch the database
+    assert post(client).status_code == 200
+    assert metrics.COUNTERS["webhook.dedupe.journal_hit"] == 1
+
+
+def test_webhook_journal_only(journal, client):
+    assert webhook_listener.IN_FLIGHT.try_acquire()
+
+    # recorded even while the actionable events are being shed
+    response = post(client, event="members:pledge:delete")
+
+    assert response.status_code == 200
+    assert metrics.COUNTERS["webhook.journal_only"] == 1
+    assert [entry["status"] for entry in journal] == [WebhookStatus.processed]
+    assert webhook_listener.QUEUE.depth == 0
+    assert webhook_listener.IN_FLIGHT.in_flight == 1
+
+
+@pytest.mark.parametrize(
+    "token,authorization,status_code",
+    [
+        ("", "Bearer ", 404),
+        ("stats-token", None, 401),
+        ("stats-token", "Bearer wrong", 401),
+        ("stats-token", "Bearer stats-token", 200),
+    ],
+)
+def test_stats_requires_token(
+    journal, client, monkeypatch, token, authorization, status_code
+):
+    monkeypatch.setattr(webhook_listener, "WEBHOOK_STATS_TOKEN", token)
+    headers = {"Authorization": authorization} if authorization is not None else {}
+
+    response = client.get("/stats", headers=headers)
+
+    assert response.status_code == status_code
+    if status_code == 200:
+        assert response.json()["load"]["limit"] == 1
@@ -0,0 +1,158 @@
+import asyncio
+import json
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from hll_patreon_bot.database.models import Base, WebhookStatus
+from hll_patreon_bot.database.utils import (
+    add_webhook_event,
+    add_webhook_retry,
+    dead_letter_webhook_retry,
+    set_webhook_event_status,
+)
+from hll_patreon_bot.patreon_webhook import replay
+from hll_patreon_bot.patreon_webhook.retry import dump_member_events
+
+RECEIVED_AT = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def session():
+    # in memory database
+    engine = create_engine("sqlite://")
+
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.begin()
+        yield session
+
+
+def journal_entry(event_id: int, member_id: str, minutes: int = 0):
+    return SimpleNamespace(
+        id=event_id,
+        event="members:pledge:update",
+        body=json.dumps({"data": {"id": member_id}}).encode(),
+        received_at=RECEIVED_AT + timedelta(minutes=minutes),
+    )
+
+
+def test_replay_event_records_outcome(monkeypatch):
+    async def process_event(event, client, data):
+        if data == b"bad":
+            raise ValueError("boom")
+
+    statuses = []
+    monkeypatch.setattr(replay, "process_event", process_event)
+    monkeypatch.setattr(replay, "enter_session", nullcontext)
+    monkeypatch.setattr(
+        replay,
+        "set_webhook_event_status",
+        lambda session, event_id, status, error=None: statuses.append(
+            (event_id, status, error)
+        ),
+    )
+
+    good = SimpleNamespace(id=1, event="members:pledge:update", body=b"good")
+    bad = SimpleNamespace(id=2, event="members:pledge:update", body=b"bad")
+
+    assert asyncio.run(replay.replay_event(client=None, event=good))
+    assert not asyncio.run(replay.replay_event(client=None, event=bad))
+    assert statuses == [
+        (1, WebhookStatus.processed, None),
+        (2, WebhookStatus.failed, "ValueError('boom')"),
+    ]
+
+
+def test_replay_events_serializes_each_members_events(monkeypatch):
+    running: set[str] = set()
+    overlapped = []
+    order: list[int] = []
+
+    async def replay_event(client, event):
+        member_id = json.loads(event.body)["data"]["id"]
+        assert member_id not in running, "member's events ran concurrently"
+        running.add(member_id)
+        overlapped.append(len(running) > 1)
+        await asyncio.sleep(0.01)
+        running.discard(member_id)
+        order.append(event.id)
+        return event.id != 3
+
+    monkeypatch.setattr(replay, "replay_event", replay_event)
+    events = [
+        journal_entry(1, "member-1", minutes=2),
+        journal_entry(2, "member-1", minutes=0),
+        journal_entry(3, "member-2", minutes=1),
+        journal_entry(4, "member-1", minutes=1),
+    ]
+
+    results = asyncio.run(replay.replay_events(client=None, events=events))
+
+    assert results == {1: True, 2: True, 3: False, 4: True}
+    # oldest first within a member
+    assert [i for i in order if i != 3] == [2, 4, 1]
+    # while different members still run side by side
+    assert any(overlapped)
+
+
+def test_get_replayable_events(session: Session):
+    ids = {}
+    for name, status in [
+        ("processed", WebhookStatus.processed),
+        ("failed", WebhookStatus.failed),
+        ("retrying", WebhookStatus.failed),
+        ("dead_lettered", WebhookStatus.failed),
+    ]:
+        ids[name] = add_webhook_event(
+            session=session,
+            event="members:update",
+            digest=name,
+            signature=None,
+            body=b"{}",
+        )
+        set_webhook_event_status(session=session, event_id=ids[name], status=status)
+
+    now = datetime.now(tz=timezone.utc)
+    add_webhook_retry(
+        session=session,
+        member_id="member-1",
+        payload=dump_member_events([], journal_ids=[ids["retrying"]]),
+        error="boom",
+        next_attempt_at=now,
+    )
+    dead_letter_webhook_retry(
+        session=session,
+        retry_id=add_webhook_retry(
+            session=session,
+            member_id="member-2",
+            payload=dump_member_events([], journal_ids=[ids["dead_lettered"]]),
+            error="boom",
+            next_attempt_at=now,
+        ),
+        error="boom",
+    )
+
+    assert [e.id for e in replay.get_replayable_events(session=session)] == [
+        ids["failed"]
+    ]
+    assert [
+        e.id
+        for e in replay.get_replayable_events(
+            session=session, status=WebhookStatus.processed
+        )
+    ] == [ids["processed"]]
+
+
+def test_replaying_processed_events_needs_flag(monkeypatch):
+    monkeypatch.setattr(
+        "sys.argv", ["replay", "--start", "2024-02-01", "--status", "processed"]
+    )
+
+    with pytest.raises(SystemExit):
+        asyncio.run(replay.main())
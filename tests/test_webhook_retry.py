@@ -0,0 +1,171 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.database.models import (
+    Base,
+    WebhookDeadLetter,
+    WebhookRetry,
+    WebhookStatus,
+)
+from hll_patreon_bot.database.utils import add_webhook_event, get_webhook_events
+from hll_patreon_bot.integrations.patreon.types import ChargeStatus, PatronStatus
+from hll_patreon_bot.patreon_webhook import retry
+from hll_patreon_bot.patreon_webhook.retry import (
+    RetryScheduler,
+    dump_member_events,
+    load_member_events,
+    retry_delay,
+)
+from hll_patreon_bot.patreon_webhook.utils import (
+    format_event_header,
+    parse_event_header,
+)
+
+
+def test_format_event_header_round_trips():
+    for header in ("members:create", "members:pledge:update"):
+        assert format_event_header(parse_event_header(header)) == header
+
+
+def test_member_events_round_trip():
+    events = [
+        (
+            parse_event_header("members:pledge:create"),
+            {
+                "id": "member-1",
+                "currently_entitled_amount_cents": 500,
+                "email": None,
+                "last_charge_date": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                "next_charge_date": None,
+                "last_charge_status": ChargeStatus.paid,
+                "patron_status": PatronStatus.active_patron,
+                "discord_user_id": "12345",
+            },
+        )
+    ]
+
+    assert load_member_events(
+        dump_member_events(events, journal_ids=[1, 2], completed={"player-1"})
+    ) == (events, [1, 2], {"player-1"})
+    # retries saved before progress was recorded
+    assert load_member_events('{"journal_ids": [], "events": []}') == ([], [], set())
+
+
+def test_retry_delay_backs_off_exponentially():
+    delays = [retry_delay(n, base_delay=30, max_delay=300) for n in range(1, 6)]
+
+    assert delays == [30, 60, 120, 240, 300]
+
+
+@pytest.fixture
+def enter_session(monkeypatch):
+    """Point the scheduler at an in memory database"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+
+    @contextmanager
+    def enter_session():
+        with Session(engine) as session:
+            session.begin()
+            try:
+                yield session
+            except:
+                session.rollback()
+                raise
+            else:
+                session.commit()
+
+    monkeypatch.setattr(retry, "enter_session", enter_session)
+    metrics.reset()
+    return enter_session
+
+
+def test_retry_scheduler_persists_progress_and_dead_letters(enter_session):
+    with enter_session() as session:
+        journal_id = add_webhook_event(
+            session=session,
+            event="members:pledge:update",
+            digest="1",
+            signature=None,
+            body=b"{}",
+        )
+
+    calls: list[set[str]] = []
+
+    async def process(member_id, events, journal_ids, completed):
+        assert (member_id, events, journal_ids) == ("member-1", [], [journal_id])
+        calls.append(set(completed))
+        # one more player gets their VIP before CRCON fails again
+        completed.add(f"player-{len(calls)}")
+        raise ConnectionError("CRCON is down")
+
+    scheduler = RetryScheduler(process=process, max_attempts=3, base_delay=0)
+    retry_id = scheduler.schedule(
+        member_id="member-1",
+        events=[],
+        journal_ids=[journal_id],
+        error=ConnectionError("CRCON is down"),
+    )
+
+    def stored_retry() -> tuple[int, set[str]] | None:
+        with enter_session() as session:
+            row = session.get(WebhookRetry, retry_id)
+            if row is None:
+                return None
+            return row.attempts, load_member_events(row.payload)[2]
+
+    assert stored_retry() == (1, set())
+
+    assert asyncio.run(scheduler.run_due()) == 1
+    assert stored_retry() == (2, {"player-1"})
+
+    assert asyncio.run(scheduler.run_due()) == 1
+    # the players already extended are handed back in
+    assert calls == [set(), {"player-1"}]
+    assert stored_retry() is None
+
+    with enter_session() as session:
+        (dead_letter,) = session.scalars(select(WebhookDeadLetter))
+        assert (dead_letter.member_id, dead_letter.attempts) == ("member-1", 3)
+        assert load_member_events(dead_letter.payload)[1:] == (
+            [journal_id],
+            {"player-1", "player-2"},
+        )
+        (event,) = get_webhook_events(session=session)
+        assert event.status == WebhookStatus.failed
+        assert event.error == "ConnectionError('CRCON is down')"
+
+    assert metrics.COUNTERS["webhook.retry.failed"] == 1
+    assert metrics.COUNTERS["webhook.retry.dead_lettered"] == 1
+
+
+def test_retry_scheduler_deletes_succeeded_retries(enter_session):
+    completed_with: list[set[str]] = []
+
+    async def process(member_id, events, journal_ids, completed):
+        completed_with.append(set(completed))
+
+    scheduler = RetryScheduler(process=process, base_delay=0)
+    scheduler.schedule(
+        member_id="member-1",
+        events=[],
+        journal_ids=[],
+        error=ConnectionError("CRCON is down"),
+        completed={"player-1"},
+    )
+
+    assert asyncio.run(scheduler.run_due()) == 1
+    assert completed_with == [{"player-1"}]
+    assert asyncio.run(scheduler.run_due()) == 0
+    with enter_session() as session:
+        assert session.scalars(select(WebhookRetry)).all() == []
+    assert metrics.COUNTERS["webhook.retry.succeeded"] == 1
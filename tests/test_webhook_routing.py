@@ -0,0 +1,53 @@
+import pytest
+
+from hll_patreon_bot.patreon_webhook.actions import lookup_parser
+from hll_patreon_bot.patreon_webhook.discord import (
+    create_member_update_embed,
+    lookup_action_embed,
+)
+from hll_patreon_bot.patreon_webhook.routing import Stage, WebhookRouter
+from hll_patreon_bot.patreon_webhook.types import (
+    MEMBER_DELETE,
+    PLEDGE_DELETE,
+    PLEDGE_UPDATE,
+)
+from hll_patreon_bot.patreon_webhook.utils import (
+    parse_patreon_member_webhook,
+    parse_patreon_pledge_webhook,
+)
+
+
+def test_router_routes_from_header():
+    router = WebhookRouter()
+
+    route = router.route("members:pledge:update")
+    assert route is router[PLEDGE_UPDATE]
+    assert route.event == PLEDGE_UPDATE
+    assert Stage.ACTION in route.stages
+    assert route.parser is parse_patreon_pledge_webhook
+    assert not route.journal_only
+
+    assert router.route("members:update").embed is create_member_update_embed
+
+
+@pytest.mark.parametrize("header", ["members:delete", "members:pledge:delete"])
+def test_router_only_journals_deletes(header: str):
+    route = WebhookRouter().route(header)
+
+    assert route is not None
+    assert route.journal_only
+    assert route.parser is None
+    assert route.embed is None
+
+
+@pytest.mark.parametrize("header", ["", "members", "posts:publish", "pledge:create"])
+def test_router_rejects_unknown_events(header: str):
+    assert WebhookRouter().route(header) is None
+
+
+def test_lookups_still_cover_every_event():
+    assert lookup_parser(MEMBER_DELETE) is parse_patreon_member_webhook
+    assert lookup_parser(PLEDGE_DELETE) is parse_patreon_pledge_webhook
+
+    with pytest.raises(ValueError):
+        lookup_action_embed(event=None, data={})  # type: ignore
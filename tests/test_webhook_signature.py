@@ -0,0 +1,28 @@
+import hashlib
+import hmac
+
+import pytest
+
+from hll_patreon_bot.patreon_webhook.utils import verify_signature
+
+SECRET = "webhook-secret"
+BODY = b'{"data": {"id": "52c7b310-8d73-4ce8-bfba-ef1caa58eb4e"}}'
+SIGNATURE = hmac.new(SECRET.encode(), BODY, hashlib.md5).hexdigest()
+
+
+def test_verify_signature():
+    assert verify_signature(body=BODY, signature=SIGNATURE, secret=SECRET)
+    assert verify_signature(body=BODY, signature=SIGNATURE.upper(), secret=SECRET)
+
+
+@pytest.mark.parametrize(
+    "body, signature, secret",
+    [
+        (BODY + b" ", SIGNATURE, SECRET),
+        (BODY, SIGNATURE, "wrong-secret"),
+        (BODY, "garbage", SECRET),
+        (BODY, "ünicode", SECRET),
+    ],
+)
+def test_verify_signature_rejects(body, signature, secret):
+    assert not verify_signature(body=body, signature=signature, secret=secret)
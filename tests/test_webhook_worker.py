@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from hll_patreon_bot import metrics
+from hll_patreon_bot.patreon_webhook.types import (
+    PatreonTriggerAction,
+    PatreonTriggerResource,
+    PatreonWebhook,
+)
+from hll_patreon_bot.patreon_webhook.worker import (
+    Coalescer,
+    InFlightLimiter,
+    KeyedLock,
+    WebhookJob,
+    WebhookQueue,
+)
+
+MEMBER_UPDATE = PatreonWebhook(
+    resource=PatreonTriggerResource.MEMBER, action=PatreonTriggerAction.UPDATE
+)
+
+
+def test_queue_processes_jobs_in_background():
+    processed: list[bytes] = []
+
+    async def process(job: WebhookJob):
+        await asyncio.sleep(0)
+        processed.append(job.body)
+
+    async def run():
+        queue = WebhookQueue(process=process, num_workers=2)
+        await queue.start()
+        for n in range(5):
+            queue.enqueue(WebhookJob(event=MEMBER_UPDATE, body=str(n).encode()))
+        await queue.stop()
+        return queue
+
+    metrics.reset()
+    queue = asyncio.run(run())
+
+    assert sorted(processed) == [str(n).encode() for n in range(5)]
+    assert queue.stats()["queue_depth"] == 0
+    assert metrics.COUNTERS["webhook.processed"] == 5
+    assert metrics.TIMINGS["webhook.latency"].count == 5
+
+
+def test_queue_survives_failed_jobs():
+    async def process(job: WebhookJob):
+        raise ValueError("CRCON is down")
+
+    async def run():
+        queue = WebhookQueue(process=process, num_workers=1)
+        await queue.start()
+        queue.enqueue(WebhookJob(event=MEMBER_UPDATE, body=b"{}"))
+        queue.enqueue(WebhookJob(event=MEMBER_UPDATE, body=b"{}"))
+        await queue.stop()
+
+    metrics.reset()
+    asyncio.run(run())
+
+    assert metrics.COUNTERS["webhook.failed"] == 2
+
+
+def test_keyed_lock_serializes_per_key():
+    events: list[str] = []
+
+    async def work(lock: KeyedLock, key: str, name: str):
+        async with lock.hold(key):
+            events.append(f"start {name}")
+            await asyncio.sleep(0.01)
+            events.append(f"end {name}")
+
+    async def run():
+        lock = KeyedLock(name="test_lock")
+        await asyncio.gather(
+            work(lock, "member-1", "a"),
+            work(lock, "member-1", "b"),
+            work(lock, "member-2", "c"),
+        )
+        return lock
+
+    metrics.reset()
+    lock = asyncio.run(run())
+
+    # same member in arrival order, the other member ran alongside them
+    assert events.index("end a") < events.index("start b")
+    assert events.index("start c") < events.index("end a")
+    assert metrics.COUNTERS["test_lock.contended"] == 1
+    assert metrics.TIMINGS["test_lock.wait"].count == 3
+    assert len(lock) == 0
+
+
+def test_coalescer_merges_bursts_per_key():
+    batches: list[tuple[str, list[int]]] = []
+
+    async def process(key: str, items: list[int]):
+        batches.append((key, items))
+
+    async def run():
+        coalescer: Coalescer[int] = Coalescer(process=process, window=0.01)
+        coalescer.submit("member-1", 1)
+        coalescer.submit("member-2", 2)
+        coalescer.submit("member-1", 3)
+        await asyncio.sleep(0.05)
+        coalescer.submit("member-1", 4)
+        await coalescer.stop()
+
+    metrics.reset()
+    asyncio.run(run())
+
+    assert sorted(batches) == [
+        ("member-1", [1, 3]),
+        ("member-1", [4]),
+        ("member-2", [2]),
+    ]
+    assert metrics.COUNTERS["webhook.coalesce.merged"] == 1
+    assert metrics.COUNTERS["webhook.coalesce.flushes"] == 3
+
+
+def test_in_flight_limiter_sheds_past_limit():
+    metrics.reset()
+    limiter = InFlightLimiter(limit=2, name="test_in_flight")
+
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release(2)
+    assert limiter.try_acquire()
+    assert limiter.stats() == {"in_flight": 1, "limit": 2, "high_water": 2}
+    assert metrics.GAUGES["test_in_flight.high_water"] == 2
+
+
+def test_queue_rejects_jobs_when_full():
+    async def run():
+        queue = WebhookQueue(process=lambda job: asyncio.sleep(0), maxsize=1)
+        queue.enqueue(WebhookJob(event=MEMBER_UPDATE, body=b"{}"))
+        assert queue.full()
+        with pytest.raises(asyncio.QueueFull):
+            queue.enqueue(WebhookJob(event=MEMBER_UPDATE, body=b"{}"))
+        return queue
+
+    queue = asyncio.run(run())
+
+    assert queue.stats()["queue_high_water"] == 1